@@ -0,0 +1,222 @@
+"""
+Process-wide data context sharing the loaded model, index, syllable info and syllable DataFrames across widgets.
+"""
+
+import warnings
+from copy import deepcopy
+from collections import OrderedDict
+from os.path import abspath, exists, getmtime
+from moseq2_viz.util import read_yaml
+from moseq2_app.model import load_model_labels
+from moseq2_app.viz.util import (get_position_heatmap_path, compute_position_heatmaps, save_position_heatmaps,
+                                 load_position_heatmaps)
+from moseq2_app.util import (get_sorted_index, merge_labels_with_scalars, get_syllable_stats_fingerprint,
+                             read_syllable_stats, write_syllable_stats, filter_syllable_df)
+
+# data contexts keyed by their (model, index) paths, ordered from least to most recently used
+_contexts = OrderedDict()
+
+
+class DataContext:
+
+    def __init__(self, model_path=None, index_path=None):
+        """
+        Load each of the notebook's data artifacts once, and reuse it until one of the files it was loaded from is modified.
+
+        Args:
+        model_path (str): Path to trained model file.
+        index_path (str): Path to index file.
+        """
+
+        self.model_path = model_path
+        self.index_path = index_path
+
+        # artifact names mapped to (file modification times, loaded value)
+        self._cache = {}
+
+    def _load(self, name, paths, loader):
+        """
+        Get a cached artifact, reloading it if any of the files it depends on changed.
+
+        Args:
+        name (str): artifact name.
+        paths (list): paths to the files the artifact is loaded from.
+        loader (function): function loading the artifact.
+
+        Returns:
+        value (any): loaded artifact.
+        """
+
+        stamp = tuple((p, getmtime(p) if exists(p) else None) for p in paths)
+
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        value = loader()
+        self._cache[name] = (stamp, value)
+
+        return value
+
+    def invalidate(self, name=None):
+        """
+        Drop one or all of the cached artifacts.
+
+        Args:
+        name (str): name of the artifact to drop, None drops all of them.
+        """
+
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+    def get_model_labels(self):
+        """
+        Get the model label store.
+
+        Returns:
+        store (ModelLabelStore): label store of the model's sessions.
+        """
+
+        return load_model_labels(self.model_path)
+
+    def get_sorted_index(self):
+        """
+        Get a copy of the sorted index dict.
+
+        Returns:
+        sorted_index (dict): sorted index of the modeled sessions.
+        """
+
+        return get_sorted_index(self.index_path)
+
+    def get_syll_info(self, info_path):
+        """
+        Get a copy of a syllable information dict.
+
+        Args:
+        info_path (str): Path to syllable information file.
+
+        Returns:
+        syll_info (dict): syllable numbers mapped to their label, description and crowd movie path.
+        """
+
+        return deepcopy(self._load(f'syll_info:{abspath(info_path)}', [info_path], lambda: read_yaml(info_path)))
+
+    def get_syllable_dataframes(self, df_path=None, load_scalars=True, columns=None, max_syllable=None, groups=None,
+                                report=None):
+        """
+        Get the session-level syllable statistics and the frame-level scalar DataFrames.
+        When df_path is given, up-to-date materialized parquet files are read instead of recomputing the statistics,
+         only reading the selected columns, syllables and groups of the session-level statistics.
+        Out-of-date or missing files are (re)written after computing the statistics.
+        The frame-level DataFrame is shared between widgets and must not be modified in place.
+
+        Args:
+        df_path (str): path to the materialized syllable statistics parquet file.
+        load_scalars (bool): indicates to also get the frame-level DataFrame when reading materialized files.
+        columns (list): session-level statistics columns to get, None gets all of them.
+        max_syllable (int): get the syllables < max_syllable, None gets all of them.
+        groups (list): groups to get, None gets all of them.
+        report (function): called with the progress and message of each stage, e.g. a background job's report().
+         Statistics computed before the report raises are kept, so the next call only writes them.
+
+        Returns:
+        df (pd.DataFrame): copy of the selected per-session mean syllable statistics.
+        scalar_df (pd.DataFrame): frame-level scalar and label data, None if it was not requested.
+        """
+
+        def compute():
+            return merge_labels_with_scalars(self.get_sorted_index(), self.model_path, report=report)
+
+        query = dict(columns=columns, max_syllable=max_syllable, groups=groups)
+
+        if df_path is None:
+            df, scalar_df = self._load('syllable_dataframes', [self.model_path, self.index_path], compute)
+            return filter_syllable_df(df, **query), scalar_df
+
+        def materialize():
+            fingerprint = get_syllable_stats_fingerprint(self.get_sorted_index(), self.model_path)
+            df, scalar_df = read_syllable_stats(df_path, fingerprint, load_scalars=load_scalars, **query)
+            if df is None:
+                df, scalar_df = self._load('syllable_dataframes', [self.model_path, self.index_path], compute)
+                try:
+                    write_syllable_stats(df, scalar_df, df_path, fingerprint, report=report)
+                except OSError as e:
+                    warnings.warn(f'Could not write the syllable statistics to {df_path}: {e}')
+                df = filter_syllable_df(df, **query)
+            return df, scalar_df if load_scalars else None
+
+        key = (abspath(df_path), load_scalars, None if columns is None else tuple(columns), max_syllable,
+               None if groups is None else tuple(groups))
+        df, scalar_df = self._load(f'materialized:{key}', [self.model_path, self.index_path, df_path], materialize)
+
+        return df.copy(), scalar_df
+
+    def get_position_heatmaps(self, max_syllable, bins=20, scalar_df=None):
+        """
+        Get the position heatmaps of every (syllable, session) pair. Up-to-date heatmaps cached next to the model
+         are reused, otherwise they are computed from the frame-level DataFrame and cached.
+
+        Args:
+        max_syllable (int): heatmaps are computed for the syllables < max_syllable.
+        bins (int): number of bins along each axis.
+        scalar_df (pd.DataFrame): frame-level scalar and label data, loaded from the context if None.
+
+        Returns:
+        heatmaps (dict): heatmaps returned by compute_position_heatmaps().
+        """
+
+        def load():
+            path = get_position_heatmap_path(self.model_path)
+            fingerprint = get_syllable_stats_fingerprint(self.get_sorted_index(), self.model_path)
+            heatmaps = load_position_heatmaps(path, fingerprint, max_syllable, bins=bins)
+            if heatmaps is None:
+                frames = scalar_df if scalar_df is not None else self.get_syllable_dataframes()[1]
+                heatmaps = compute_position_heatmaps(frames, max_syllable, bins=bins)
+                try:
+                    save_position_heatmaps(path, heatmaps, fingerprint)
+                except OSError as e:
+                    warnings.warn(f'Could not write the position heatmaps to {path}: {e}')
+            return heatmaps
+
+        return self._load(f'position_heatmaps:{max_syllable}:{bins}', [self.model_path, self.index_path], load)
+
+
+def get_data_context(progress_paths, max_contexts=1):
+    """
+    Get the data context shared by all the widgets opened with the same model and index files.
+    Only the max_contexts most recently used contexts are kept, the artifacts of older contexts are released.
+
+    Args:
+    progress_paths (dict): dictionary of notebook progress paths.
+    max_contexts (int): maximum number of contexts holding loaded artifacts.
+
+    Returns:
+    context (DataContext): shared data context.
+    """
+
+    paths = tuple(progress_paths.get(k) for k in ('model_path', 'index_file'))
+    key = tuple(abspath(p) if p is not None else None for p in paths)
+
+    if key in _contexts:
+        _contexts.move_to_end(key)
+    else:
+        _contexts[key] = DataContext(*paths)
+
+    # widgets still holding an evicted context reload its artifacts on their next request
+    while len(_contexts) > max(int(max_contexts), 1):
+        _contexts.popitem(last=False)[1].invalidate()
+
+    return _contexts[key]
+
+
+def clear_data_contexts():
+    """
+    Release the artifacts loaded by all the data contexts, e.g. to free memory once the widgets are closed.
+    """
+
+    for context in _contexts.values():
+        context.invalidate()
+    _contexts.clear()
@@ -6,6 +6,7 @@ import cv2
 import h5py
 import joblib
 import warnings
+import threading
 import numpy as np
 from copy import deepcopy
 from tqdm.auto import tqdm
@@ -19,6 +20,7 @@ from moseq2_app.roi.view import bokeh_plot_helper
 from moseq2_extract.util import gen_batch_sequence
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
+from moseq2_app.flip.util import SessionFrameCache, sample_selected_frames
 from moseq2_app.gui.progress import get_session_paths
 from moseq2_extract.io.video import write_frames_preview
 from moseq2_app.flip.widgets import FlipClassifierWidgets
@@ -27,7 +29,7 @@ from moseq2_extract.extract.proc import clean_frames, get_flips
 class FlipRangeTool(FlipClassifierWidgets):
 
     def __init__(self, input_dir, max_frames, output_file, clean_parameters,
-                 launch_gui=True, continuous_slider_update=True):
+                 launch_gui=True, continuous_slider_update=True, max_open_sessions=4):
         """
         Find all the extracted sessions within the given input path, and prepare for GUI display.
 
@@ -38,7 +40,7 @@ class FlipRangeTool(FlipClassifierWidgets):
         clean_parameters (dict): Parameters passed to moseq2_extract.extract.proc.clean_frames 
         launch_gui (bool): Indicates whether to launch the labeling gui or just create the FlipClassifier instance.
         continuous_slider_update (bool): Indicates whether to continuously update the view upon slider edits.
-        
+        max_open_sessions (int): Maximum number of session frame caches kept open at once.
         """
 
         with warnings.catch_warnings():
@@ -48,6 +50,15 @@ class FlipRangeTool(FlipClassifierWidgets):
             self.output_file = output_file
             self.clf = None
 
+            # open frame caches keyed by session name, used to serve slider updates.
+            # ordered from least to most recently used, the least recently used caches are closed first
+            self.frame_caches = OrderedDict()
+            self.max_open_sessions = max(int(max_open_sessions), 1)
+
+            # guards the frame caches, which are closed by the (background) flip while the widget may reopen them
+            self.frame_cache_lock = threading.Lock()
+            self.flipping = False
+
             # get input session paths
             self.sessions = get_session_paths(input_dir, extracted=True, flipped=False)
             if len(self.sessions) == 0:
@@ -101,6 +112,52 @@ class FlipRangeTool(FlipClassifierWidgets):
 
         return path_dict
 
+    def get_frame_cache(self, session):
+        """
+        Return the frame cache for the given session, opening it on first access.
+        At most self.max_open_sessions caches are kept open, the least recently used ones are closed.
+        Caches cannot be opened while the flip classifier is being applied to the sessions.
+
+        Args:
+        session (str): session name in self.path_dict.
+
+        Returns:
+        cache (SessionFrameCache): cache that serves the session's cleaned frames.
+        """
+
+        with self.frame_cache_lock:
+            if self.flipping:
+                raise RuntimeError('Frames cannot be read while the flip classifier is being applied to the sessions.')
+
+            if session in self.frame_caches:
+                self.frame_caches.move_to_end(session)
+            else:
+                while len(self.frame_caches) >= self.max_open_sessions:
+                    self.frame_caches.popitem(last=False)[1].close()
+                self.frame_caches[session] = SessionFrameCache(self.path_dict[session], self.clean_parameters)
+            return self.frame_caches[session]
+
+    def close_frame_caches(self):
+        """
+        Close all open session frame caches and their h5 file handles.
+        """
+
+        with self.frame_cache_lock:
+            for cache in self.frame_caches.values():
+                cache.close()
+            self.frame_caches = OrderedDict()
+
+    def clear_on_click(self, b=None):
+        """
+        Clear the output and release the open frame caches.
+
+        Args:
+        b (button click): user click the button
+        """
+
+        self.close_frame_caches()
+        super().clear_on_click(b)
+
     def interactive_launch_frame_selector(self):
         """
         display the frame to display with the selected data box.
@@ -115,8 +172,12 @@ class FlipRangeTool(FlipClassifierWidgets):
                         tools=tools,
                         output_backend="webgl")
 
-        with h5py.File(self.path_dict[self.session_select_dropdown.label], mode='r') as f:
-            displayed_frame = clean_frames(np.array([f['frames'][num]]), **self.clean_parameters)[0]
+        # read the frame from the session cache; neighboring frames are prefetched in the background
+        try:
+            displayed_frame = self.get_frame_cache(self.session_select_dropdown.label).get_frame(num)
+        except RuntimeError as e:
+            print(e)
+            return
 
         data = dict(image=[displayed_frame],
                     x=[0],
@@ -135,45 +196,34 @@ class FlipRangeTool(FlipClassifierWidgets):
         # Display centered grid plot
         display(self.clear_button, self.session_select_dropdown, output_box, self.button_box)
 
-    def get_corrected_data(self):
+    def get_corrected_data(self, random_state=0):
         """
         Apply the selected flip orientation ranges to the entire dataset to correct the incorrectly oriented frames.
+        At most self.max_frames frames are sampled, stratified across sessions and directions, before reading the h5 files.
+
+        Args:
+        random_state (int): Seed value used to sample the selected frames.
         """
 
+        # sample the frame indices to include before any frames are read
+        sampled_frames = sample_selected_frames(self.selected_frame_ranges_dict, self.max_frames,
+                                                random_state=random_state)
+
         corrected_dataset = []
         # Get corrected frame ranges
-        for session, frs in tqdm(self.selected_frame_ranges_dict.items(), desc='Computing Corrected Dataset'):
-            if len(frs) > 0:
-                # get the indicated directions
-                directions = [f[0] for f in frs]
-                
-                # get the separate lists of flip ranges to correct
-                correct_flips = [f[1] for f, d in zip(frs, directions) if d is False]
-                incorrect_flips = [f[1] for f, d in zip(frs, directions) if d is True]
-                
-                # handle frames that are indicated as correctly flipped
-                if len(correct_flips) > 0:
-                    # remove frames possibly selected twice
-                    correct_idx = sorted(set(np.concatenate([list(flip) for flip in correct_flips])))
-
-                    # get the session and load only the selected frame range and apply filtering
-                    with h5py.File(self.path_dict[session], mode='r') as f:
-                        correct_cleaned_data = clean_frames(f['frames'][correct_idx], **self.clean_parameters)
-                    
-                    # add the data to the dataset
-                    corrected_dataset.append(deepcopy(correct_cleaned_data))
-                
-                # handle frames indicated incorrectly flipped
-                if len(incorrect_flips) > 0:
-                    incorrect_idx = sorted(set(np.concatenate([list(flip) for flip in incorrect_flips])))
-                    with h5py.File(self.path_dict[session], mode='r') as f:
-                        incorrect_cleaned_data = clean_frames(f['frames'][incorrect_idx], **self.clean_parameters)
-                    
-                    # flip the data that is facing left
-                    flip_corrected_data = np.flip(incorrect_cleaned_data, axis=2)
+        for session, directions in tqdm(sampled_frames.items(), desc='Computing Corrected Dataset'):
+            # get the session and load only the sampled frames
+            with h5py.File(self.path_dict[session], mode='r') as f:
+                for left, idx in directions.items():
+                    # apply filtering to the sampled frames
+                    cleaned_data = clean_frames(f['frames'][idx], **self.clean_parameters)
+
+                    if left:
+                        # flip the data that is facing left
+                        cleaned_data = np.flip(cleaned_data, axis=2)
 
                     # add the data to the dataset
-                    corrected_dataset.append(deepcopy(flip_corrected_data))
+                    corrected_dataset.append(deepcopy(cleaned_data))
 
         self.corrected_dataset = np.concatenate(corrected_dataset, axis=0)
 
@@ -248,12 +298,12 @@ class FlipRangeTool(FlipClassifierWidgets):
 
         Args:
         test_size (int): Test dataset percent split size
-        random_state (int): Seed value to randomly sort the split data
+        random_state (int): Seed value to sample the selected frames and randomly sort the split data
         plot_examples (bool): Indicates whether to display the 2x2 preview grid of dataset examples
         """
 
         # Correct flips
-        self.get_corrected_data()
+        self.get_corrected_data(random_state=random_state)
 
         # Augment the data
         self.augment_dataset(plot_examples=plot_examples)
@@ -345,7 +395,7 @@ class FlipRangeTool(FlipClassifierWidgets):
 
     def apply_flip_classifier(self, chunk_size=4000, chunk_overlap=0,
                               smoothing=51, frame_path='frames', fps=30,
-                              write_movie=False, verbose=True):
+                              write_movie=False, verbose=True, job=None):
         """
         Apply a trained flip classifier on previously extracted data to flip the mice to the correct orientation.
 
@@ -354,6 +404,8 @@ class FlipRangeTool(FlipClassifierWidgets):
         chunk_overlap (int): number of frames to overlap between chunks to improve classification precision between chunks.
         smoothing (int): kernel size of the applied median filter on the flip classifier results
         verbose (bool): displays the tqdm progress bars for each session.
+        job (moseq2_app.gui.jobs.Job): background job running this function. Jobs are cancelled between batches,
+         and resumed jobs skip the sessions and batches they already flipped.
         """
 
         if self.clf is None:
@@ -363,48 +415,102 @@ class FlipRangeTool(FlipClassifierWidgets):
                 print('Could not load provided classifier.')
                 return
 
+        # release the read-only handles held by the frame caches, and keep the widget from reopening them,
+        # before writing to the h5 files
+        with self.frame_cache_lock:
+            if self.flipping:
+                raise RuntimeError('The flip classifier is already being applied to the sessions.')
+            self.flipping = True
+            for cache in self.frame_caches.values():
+                cache.close()
+            self.frame_caches = OrderedDict()
+
+        try:
+            self._flip_sessions(chunk_size, chunk_overlap, smoothing, frame_path, fps, write_movie, verbose, job)
+        finally:
+            with self.frame_cache_lock:
+                self.flipping = False
+
+    def _flip_sessions(self, chunk_size, chunk_overlap, smoothing, frame_path, fps, write_movie, verbose, job):
+        """
+        Flip the frames and angles of each session in place, batch by batch. The number of batches written for each
+         session is recorded in the job's state, so resumed jobs never flip the same batch twice.
+
+        Args:
+        chunk_size (int): size of frame chunks to process in batches.
+        chunk_overlap (int): number of frames to overlap between chunks.
+        smoothing (int): kernel size of the applied median filter on the flip classifier results
+        frame_path (str): path to the frames within the h5 files.
+        fps (int): frame rate of the flipped movies.
+        write_movie (bool): indicates to write a movie of each session's flipped frames.
+        verbose (bool): displays the tqdm progress bars for each session.
+        job (moseq2_app.gui.jobs.Job): background job running this function, None when run in the foreground.
+        """
+
+        state = job.state if job is not None else {}
+        flipped = state.setdefault('flipped', [])
+        written_batches = state.setdefault('written_batches', {})
+
         video_pipe = None
         with warnings.catch_warnings():
             warnings.simplefilter('ignore', UserWarning)
-            for key, path in tqdm(self.path_dict.items(), desc='Flipping extracted sessions...'):
+            for i, (key, path) in enumerate(tqdm(self.path_dict.items(), desc='Flipping extracted sessions...')):
+                if key in flipped:
+                    continue
+
                 # Open h5 file to stream and correct/update stored frames and scalar angles.
                 with h5py.File(path, mode='a') as f:
                     output_movie = path.replace('.h5', '_flipped.mp4')
-
+                    # resumed sessions rewrite their movie from the first batch, reading the already flipped batches
+                    write_session_movie = write_movie
                     frames = f[frame_path]
-                    frame_batches = gen_batch_sequence(len(frames)-1, chunk_size, chunk_overlap)
-
-                    for batch in tqdm(frame_batches, desc=f'Adjusting flips: {key}', disable=not verbose):
-                        frame_batch = frames[batch]
-
-                        # apply flip classifier on each batch to find which frames to flip
-                        flips = get_flips(frame_batch.copy(), flip_file=self.output_file, smoothing=smoothing)
-                        flip_indices = np.where(flips)
-
-                        # rewrite the frames with the newly classified orientation
-                        frame_batch[flip_indices] = np.rot90(f[frame_path][batch][flip_indices], k=2, axes=(1, 2))
-                        f[frame_path][batch] = frame_batch
-
-                        # augment recorded scalar value to reflect orientation switches
-                        f['scalars/angle'][flip_indices] += np.pi
-
-                        if write_movie:
-                            try:
-                                # Writing frame batch to mp4 file
-                                video_pipe = write_frames_preview(output_movie,
-                                                                  frame_batch,
-                                                                  pipe=video_pipe,
-                                                                  close_pipe=False,
-                                                                  depth_min=0,
-                                                                  depth_max=100,
-                                                                  fps=fps,
-                                                                  progress_bar=verbose)
-                            except AttributeError as e:
-                                warnings.warn(f'Could not generate flipped movie for {key}:{path}. Skipping...')
-                                print(e)
-                                print(e.__traceback__)
-                                break
-                    # Check if video is done writing. If not, wait.
-                    if video_pipe is not None:
-                        video_pipe.communicate()
-                        video_pipe = None
+                    frame_batches = list(gen_batch_sequence(len(frames)-1, chunk_size, chunk_overlap))
+
+                    try:
+                        batches = tqdm(frame_batches, desc=f'Adjusting flips: {key}', disable=not verbose)
+                        for j, batch in enumerate(batches):
+                            if job is not None:
+                                job.report(progress=(i + j / len(frame_batches)) / len(self.path_dict),
+                                           message=f'Flipping {key}')
+
+                            frame_batch = frames[batch]
+
+                            # batches written before the job was interrupted are already flipped
+                            if j >= written_batches.get(key, 0):
+                                # apply flip classifier on each batch to find which frames to flip
+                                flips = get_flips(frame_batch.copy(), flip_file=self.output_file, smoothing=smoothing)
+                                flip_indices = np.where(flips)
+
+                                # rewrite the frames with the newly classified orientation
+                                frame_batch[flip_indices] = np.rot90(f[frame_path][batch][flip_indices], k=2,
+                                                                     axes=(1, 2))
+                                f[frame_path][batch] = frame_batch
+
+                                # augment recorded scalar value to reflect orientation switches
+                                f['scalars/angle'][flip_indices] += np.pi
+
+                                f.flush()
+                                written_batches[key] = j + 1
+
+                            if write_session_movie:
+                                try:
+                                    # Writing frame batch to mp4 file
+                                    video_pipe = write_frames_preview(output_movie,
+                                                                      frame_batch,
+                                                                      pipe=video_pipe,
+                                                                      close_pipe=False,
+                                                                      depth_min=0,
+                                                                      depth_max=100,
+                                                                      fps=fps,
+                                                                      progress_bar=verbose)
+                                except AttributeError as e:
+                                    warnings.warn(f'Could not generate flipped movie for {key}:{path}. Skipping...')
+                                    print(e)
+                                    print(e.__traceback__)
+                                    write_session_movie = False
+                    finally:
+                        # Check if video is done writing. If not, wait.
+                        if video_pipe is not None:
+                            video_pipe.communicate()
+                            video_pipe = None
+                flipped.append(key)
@@ -0,0 +1,197 @@
+"""
+Frame access helpers for the flip classifier frame selection GUI.
+"""
+
+import h5py
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from moseq2_extract.extract.proc import clean_frames
+
+
+class SessionFrameCache:
+
+    def __init__(self, h5_path, clean_parameters, window=30, max_size=300, frame_path='frames'):
+        """
+        Keep a session's h5 file open and serve cleaned frames from an in-memory LRU cache.
+        Frames surrounding the most recently requested frame are read and cleaned in a background thread.
+
+        Args:
+        h5_path (str): Path to the session's extraction h5 file (results_00.h5).
+        clean_parameters (dict): Parameters passed to moseq2_extract.extract.proc.clean_frames
+        window (int): Number of frames to prefetch on each side of the requested frame.
+        max_size (int): Maximum number of cleaned frames to hold in memory.
+        frame_path (str): Path to the frames dataset within the h5 file.
+        """
+
+        self.h5_path = h5_path
+        self.clean_parameters = clean_parameters
+        self.window = window
+        self.max_size = max(max_size, 2 * window + 1)
+
+        self._h5 = h5py.File(h5_path, mode='r')
+        self._frames = self._h5[frame_path]
+        self.nframes = self._frames.shape[0]
+
+        self._cache = OrderedDict()
+        # h5py handles are not safe to read from several threads at once
+        self._io_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._prefetch_future = None
+        # incremented on every request so stale prefetch jobs stop early
+        self._generation = 0
+
+    def _store(self, num, frame):
+        """
+        Insert a cleaned frame into the cache and evict the least recently used frames.
+
+        Args:
+        num (int): frame index.
+        frame (np.ndarray): cleaned frame.
+        """
+
+        with self._cache_lock:
+            self._cache[num] = frame
+            self._cache.move_to_end(num)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def _lookup(self, num):
+        """
+        Return a cached frame and mark it as recently used.
+
+        Args:
+        num (int): frame index.
+
+        Returns:
+        frame (np.ndarray or None): cleaned frame, or None if it is not cached.
+        """
+
+        with self._cache_lock:
+            frame = self._cache.get(num)
+            if frame is not None:
+                self._cache.move_to_end(num)
+            return frame
+
+    def _read(self, start, stop):
+        """
+        Read a contiguous block of frames and clean each one of them.
+
+        Args:
+        start (int): first frame index to read.
+        stop (int): frame index to stop reading at (exclusive).
+
+        Returns:
+        cleaned (list): list of (index, cleaned frame) tuples.
+        """
+
+        with self._io_lock:
+            raw = self._frames[start:stop]
+
+        # frames are cleaned one at a time to match the single-frame display exactly
+        return [(start + i, clean_frames(raw[i:i + 1], **self.clean_parameters)[0]) for i in range(len(raw))]
+
+    def _prefetch(self, num, generation):
+        """
+        Read and clean the missing frames within the window around num.
+
+        Args:
+        num (int): frame index the window is centered on.
+        generation (int): request counter value when the prefetch was scheduled.
+        """
+
+        lo = max(0, num - self.window)
+        hi = min(self.nframes, num + self.window + 1)
+
+        # read outward from the cursor so the closest frames are ready first
+        for idx in sorted(range(lo, hi), key=lambda i: abs(i - num)):
+            if generation != self._generation:
+                return
+            if idx in self._cache:
+                continue
+            for i, frame in self._read(idx, idx + 1):
+                self._store(i, frame)
+
+    def get_frame(self, num):
+        """
+        Return the cleaned frame at index num, and prefetch its neighbors in the background.
+
+        Args:
+        num (int): frame index.
+
+        Returns:
+        frame (np.ndarray): cleaned frame.
+        """
+
+        num = int(np.clip(num, 0, self.nframes - 1))
+        self._generation += 1
+
+        frame = self._lookup(num)
+        if frame is None:
+            frame = self._read(num, num + 1)[0][1]
+            self._store(num, frame)
+
+        self._prefetch_future = self._executor.submit(self._prefetch, num, self._generation)
+
+        return frame
+
+    def close(self):
+        """
+        Stop prefetching, and close the h5 file handle.
+        """
+
+        self._generation += 1
+        self._executor.shutdown(wait=True)
+        with self._io_lock:
+            if self._h5.id.valid:
+                self._h5.close()
+        with self._cache_lock:
+            self._cache.clear()
+
+
+def sample_selected_frames(selected_frame_ranges_dict, max_frames, random_state=0):
+    """
+    Sample at most max_frames frame indices from the selected frame ranges, stratified across sessions and facing directions.
+    Each (session, direction) stratum keeps a share of max_frames proportional to its number of selected frames.
+
+    Args:
+    selected_frame_ranges_dict (dict): session names mapped to lists of (facing left (bool), frame range) tuples.
+    max_frames (int): Maximum number of frames to include in the dataset.
+    random_state (int): Seed value used to sample the frames.
+
+    Returns:
+    sampled (dict): session names mapped to dicts of facing direction (bool) -> sorted numpy array of frame indices.
+    """
+
+    # collect the unique selected frame indices within each stratum
+    strata = OrderedDict()
+    for session, frs in selected_frame_ranges_dict.items():
+        for left, frame_range in frs:
+            strata.setdefault((session, left), set()).update(frame_range)
+    strata = OrderedDict((k, np.array(sorted(v), dtype='int64')) for k, v in strata.items() if len(v) > 0)
+
+    sizes = np.array([len(v) for v in strata.values()], dtype='int64')
+    total = sizes.sum()
+    max_frames = int(max_frames)
+
+    if total > max_frames:
+        # proportional allocation, distributing the leftover frames by largest remainder
+        quotas = sizes * max_frames / total
+        counts = np.floor(quotas).astype('int64')
+        leftover = max_frames - counts.sum()
+        counts[np.argsort(-(quotas - counts), kind='stable')[:leftover]] += 1
+    else:
+        counts = sizes
+
+    rng = np.random.default_rng(random_state)
+
+    sampled = OrderedDict()
+    for ((session, left), idx), n in zip(strata.items(), counts):
+        if n < len(idx):
+            idx = np.sort(rng.choice(idx, size=n, replace=False))
+        if n > 0:
+            sampled.setdefault(session, OrderedDict())[left] = idx
+
+    return sampled
@@ -0,0 +1,443 @@
+"""
+In-process background job runner, used to run long notebook operations without blocking the kernel.
+"""
+
+import os
+import sys
+import uuid
+import inspect
+import threading
+import traceback
+import ipywidgets as widgets
+from os.path import exists, splitext
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# job runner shared by all the notebook entry points
+_runner = None
+
+# output widget of the job running in each worker thread, written to by the job streams
+_job_outputs = threading.local()
+_streams_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """
+    Raised within a job's function, from Job.report(), once the job is cancelled.
+    """
+
+
+class JobStream:
+
+    def __init__(self, stream, name):
+        """
+        Wrap sys.stdout or sys.stderr to send the text written from a job's worker thread to the job's output widget,
+         and the text written from any other thread to the wrapped stream.
+        Widgets are appended to rather than used as context managers, which only capture the kernel's main thread.
+
+        Args:
+        stream (file-like): wrapped stream.
+        name (str): name of the stream, 'stdout' or 'stderr'.
+        """
+
+        self.stream = stream
+        self.name = name
+
+    def write(self, text):
+        """
+        Write text to the output widget of the current thread's job, or to the wrapped stream.
+
+        Args:
+        text (str): text to write.
+
+        Returns:
+        n (int): number of characters written.
+        """
+
+        output = getattr(_job_outputs, 'output', None)
+        if output is None:
+            return self.stream.write(text)
+
+        if len(text) > 0:
+            getattr(output, f'append_{self.name}')(text)
+
+        return len(text)
+
+    def flush(self):
+        """
+        Flush the wrapped stream.
+        """
+
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def capture_job_output(output):
+    """
+    Send the text printed from the current thread to an output widget, installing the job streams on first use.
+
+    Args:
+    output (ipywidgets.Output): widget receiving the printed text.
+    """
+
+    with _streams_lock:
+        if not isinstance(sys.stdout, JobStream):
+            sys.stdout = JobStream(sys.stdout, 'stdout')
+        if not isinstance(sys.stderr, JobStream):
+            sys.stderr = JobStream(sys.stderr, 'stderr')
+
+    _job_outputs.output = output
+    try:
+        yield
+    finally:
+        _job_outputs.output = None
+
+
+class Job:
+
+    def __init__(self, name, func, args=(), kwargs=None):
+        """
+        Hold a function run in the background along with its status, progress and result.
+        Functions with a `job` argument are passed the job, to report their progress with job.report(),
+         write their outputs with job.atomic_output(), and keep resumable state in job.state.
+
+        Args:
+        name (str): name of the job displayed in the status panel.
+        func (function): function to run.
+        args (tuple): positional arguments of the function.
+        kwargs (dict): keyword arguments of the function.
+        """
+
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+
+        self.status = 'pending'
+        self.progress = 0.
+        self.message = ''
+        self.result = None
+        self.error = None
+
+        # state kept when the job is resumed, e.g. the items that were already processed
+        self.state = {}
+
+        # printed output of the job
+        self.output = widgets.Output()
+
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._callbacks = []
+
+    def on_update(self, callback):
+        """
+        Register a function called with the job whenever its status or progress changes.
+
+        Args:
+        callback (function): function called with the job.
+        """
+
+        self._callbacks.append(callback)
+
+    def _notify(self):
+        """
+        Call the registered update callbacks.
+        """
+
+        for callback in self._callbacks:
+            callback(self)
+
+    @property
+    def cancel_requested(self):
+        """
+        Indicates whether the job was asked to stop.
+        """
+
+        return self._cancel_event.is_set()
+
+    def report(self, progress=None, message=None):
+        """
+        Report the job's progress. Also serves as a cancellation point: raises JobCancelled if the job was cancelled,
+         so functions should only call it where stopping leaves no partial outputs behind.
+
+        Args:
+        progress (float): fraction of the job that is done, in [0, 1].
+        message (str): current step of the job.
+        """
+
+        if self.cancel_requested:
+            raise JobCancelled()
+
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.), 1.)
+        if message is not None:
+            self.message = message
+
+        self._notify()
+
+    @contextmanager
+    def atomic_output(self, path):
+        """
+        Write an output file atomically: the body writes to the yielded temporary path, which replaces path
+         only if the body completes. Cancelled or failed writes leave no partial file behind.
+
+        Args:
+        path (str): path to the output file.
+
+        Returns:
+        tmp_path (str): temporary path to write to, with the same extension as path.
+        """
+
+        root, ext = splitext(path)
+        tmp_path = f'{root}.{self.id}.tmp{ext}'
+        try:
+            yield tmp_path
+            os.replace(tmp_path, path)
+        finally:
+            if exists(tmp_path):
+                os.remove(tmp_path)
+
+    def cancel(self):
+        """
+        Ask the job to stop. Pending jobs are cancelled right away, running jobs stop at their next report() call.
+        """
+
+        self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self.status = 'cancelled'
+        self._notify()
+
+    def run(self):
+        """
+        Run the job's function, recording its result or error. Called from the runner's worker threads.
+
+        Returns:
+        result (any): value returned by the job's function.
+        """
+
+        if self.cancel_requested:
+            self.status = 'cancelled'
+            self._notify()
+            return None
+
+        self.status = 'running'
+        self._notify()
+
+        kwargs = dict(self.kwargs)
+        if 'job' in inspect.signature(self.func).parameters:
+            kwargs['job'] = self
+
+        try:
+            with capture_job_output(self.output):
+                self.result = self.func(*self.args, **kwargs)
+            self.status = 'done'
+            self.progress = 1.
+        except JobCancelled:
+            self.status = 'cancelled'
+        except Exception as e:
+            self.status = 'failed'
+            self.message = str(e)
+            self.error = traceback.format_exc()
+        self._notify()
+
+        return self.result
+
+
+class JobRunner:
+
+    def __init__(self, max_workers=2):
+        """
+        Run jobs on a pool of worker threads, and keep a registry of all the submitted jobs.
+        Threads share the kernel's memory and widgets; the heavy numpy, h5py and ffmpeg work done by the jobs
+         releases the GIL.
+
+        Args:
+        max_workers (int): maximum number of jobs running at once.
+        """
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.jobs = OrderedDict()
+        self._listeners = []
+        self._panel = None
+
+    def on_submit(self, callback):
+        """
+        Register a function called with each newly submitted job.
+
+        Args:
+        callback (function): function called with the job.
+        """
+
+        self._listeners.append(callback)
+
+    def get_status_panel(self):
+        """
+        Get the status panel of the runner's jobs, creating it on first use. The same panel is displayed again
+         by every entry point, so the callbacks it registers are not duplicated.
+
+        Returns:
+        panel (JobStatusPanel): job status panel.
+        """
+
+        if self._panel is None:
+            self._panel = JobStatusPanel(self)
+
+        return self._panel
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        Submit a function to run in the background.
+
+        Args:
+        name (str): name of the job displayed in the status panel.
+        func (function): function to run.
+        args (tuple): positional arguments of the function.
+        kwargs (dict): keyword arguments of the function.
+
+        Returns:
+        job (Job): submitted job.
+        """
+
+        job = Job(name, func, args, kwargs)
+        self.jobs[job.id] = job
+        for callback in self._listeners:
+            callback(job)
+
+        job.future = self.executor.submit(job.run)
+
+        return job
+
+    def resume(self, job_id):
+        """
+        Run a cancelled or failed job again, keeping the state it recorded to skip the work it already finished.
+
+        Args:
+        job_id (str): id of the job.
+
+        Returns:
+        job (Job): resumed job.
+        """
+
+        job = self.jobs[job_id]
+        if job.status not in ('cancelled', 'failed'):
+            return job
+
+        job._cancel_event.clear()
+        job.status, job.message, job.error = 'pending', '', None
+        job._notify()
+        job.future = self.executor.submit(job.run)
+
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job.
+
+        Args:
+        job_id (str): id of the job.
+        """
+
+        self.jobs[job_id].cancel()
+
+    def wait(self, job_id, timeout=None):
+        """
+        Wait for a job to finish.
+
+        Args:
+        job_id (str): id of the job.
+        timeout (float): maximum number of seconds to wait.
+
+        Returns:
+        result (any): value returned by the job's function.
+        """
+
+        return self.jobs[job_id].future.result(timeout=timeout)
+
+
+class JobStatusPanel:
+
+    def __init__(self, runner):
+        """
+        Display the status and progress of a runner's jobs, with buttons to cancel or resume each of them.
+
+        Args:
+        runner (JobRunner): job runner to display.
+        """
+
+        self.runner = runner
+        self.rows = OrderedDict()
+        self.panel = widgets.VBox([])
+
+        for job in runner.jobs.values():
+            self.add_job(job)
+        runner.on_submit(self.add_job)
+
+    def add_job(self, job):
+        """
+        Add a row displaying a job to the panel.
+
+        Args:
+        job (Job): job to display.
+        """
+
+        name = widgets.Label(value=job.name, layout=widgets.Layout(width='30%'))
+        progress = widgets.FloatProgress(value=0, min=0, max=1, layout=widgets.Layout(width='30%'))
+        status = widgets.Label(layout=widgets.Layout(width='25%'))
+        button = widgets.Button(layout=widgets.Layout(width='15%'))
+
+        def on_click(b=None):
+            if job.status in ('pending', 'running'):
+                self.runner.cancel(job.id)
+            else:
+                self.runner.resume(job.id)
+
+        button.on_click(on_click)
+
+        self.rows[job.id] = (progress, status, button)
+        self.panel.children = list(self.panel.children) + [widgets.HBox([name, progress, status, button]),
+                                                           job.output]
+
+        job.on_update(self.update_row)
+        self.update_row(job)
+
+    def update_row(self, job):
+        """
+        Update the row of a job with its current status.
+
+        Args:
+        job (Job): updated job.
+        """
+
+        progress, status, button = self.rows[job.id]
+
+        progress.value = job.progress
+        progress.bar_style = {'done': 'success', 'failed': 'danger', 'cancelled': 'warning'}.get(job.status, 'info')
+        status.value = f'{job.status}: {job.message}' if len(job.message) > 0 else job.status
+
+        if job.status in ('pending', 'running'):
+            button.description, button.disabled = 'Cancel', job.cancel_requested
+        else:
+            button.description, button.disabled = 'Resume', job.status == 'done'
+
+
+def get_job_runner(max_workers=2):
+    """
+    Get the job runner shared by all the notebook entry points, creating it on first use.
+
+    Args:
+    max_workers (int): maximum number of jobs running at once, used when creating the runner.
+
+    Returns:
+    runner (JobRunner): shared job runner.
+    """
+
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(max_workers=max_workers)
+
+    return _runner
@@ -6,6 +6,7 @@ import os
 import uuid
 import json
 from glob import glob
+from copy import deepcopy
 import ruamel.yaml as yaml
 from operator import add
 from functools import reduce
@@ -14,6 +15,9 @@ from moseq2_viz.util import read_yaml
 from os.path import dirname, basename, exists, join, abspath
 from moseq2_extract.helpers.data import check_completion_status
 
+# loaded progress files keyed by absolute path, holding their (mtime, size) stamp and contents
+_progress_cache = {}
+
 
 def generate_missing_metadata(sess_dir, sess_name):
     """
@@ -174,46 +178,115 @@ def get_session_paths(data_dir, extracted=False, flipped=False, exts=['dat', 'mk
 
     return path_dict
 
-def update_progress(progress_file, varK, varV):
+def _get_stamp(path):
     """
-    Update progress file with new notebook variable
+    Get the modification time and size of a file, used to check whether its cached contents are still valid.
+
+    Args:
+    path (str): path to the file.
+
+    Returns:
+    stamp (tuple): (mtime, size) of the file.
+    """
+
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def read_progress(progress_file):
+    """
+    Read a progress file, reusing its cached contents until the file is modified.
 
     Args:
     progress_file (str): path to progress file
-    varK (str): key in progress file to update
-    varV (str): updated value to write
 
     Returns:
-    progress (dict): Loaded path dict from the progress yaml file.
+    progress (dict): copy of the progress file variables.
+    """
+
+    path = abspath(progress_file)
+    stamp = _get_stamp(path)
+
+    cached = _progress_cache.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, read_yaml(path))
+        _progress_cache[path] = cached
+
+    return deepcopy(cached[1])
+
+def write_progress(progress_file, progress):
+    """
+    Atomically write the progress variables, replacing the progress file with a fully written temporary file.
+
+    Args:
+    progress_file (str): path to progress file
+    progress (dict): progress variables to write.
     """
 
     yml = yaml.YAML()
     yml.indent(mapping=2, offset=2)
 
-    progress = read_yaml(progress_file)
+    path = abspath(progress_file)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        yml.dump(progress, f)
+    os.replace(tmp_path, path)
 
-    if isinstance(varV, str):
-        old_value = progress.get(varK, '') # get previous variable to print        
+    _progress_cache[path] = (_get_stamp(path), deepcopy(progress))
 
-        if old_value == varV:
-            print('Variables are the same. No update necessary.')
-            return progress
+def update_progress_vars(progress_file, updates):
+    """
+    Update several progress file variables at once, reading and writing the progress file a single time.
+    The file is only written if at least one of the variables changed.
 
-        progress[varK] = varV
+    Args:
+    progress_file (str): path to progress file
+    updates (dict): keys in progress file mapped to their updated (string) values.
 
-        # update snapshot variable
-        progress['snapshot'] = str(uuid.uuid4())
+    Returns:
+    progress (dict): Loaded path dict from the progress yaml file.
+    """
 
-        with open(progress_file, 'w') as f:
-            yml.dump(progress, f)
+    progress = read_progress(progress_file)
 
-        print(f'Successfully updated progress file with {varK} -> {varV}')
-    else:
-        print('Entered path is invalid.')
-        print('Ensure you are updating the progress file with string paths only.')
+    changed = []
+    for varK, varV in updates.items():
+        if not isinstance(varV, str):
+            print('Entered path is invalid.')
+            print('Ensure you are updating the progress file with string paths only.')
+        elif progress.get(varK, '') != varV:
+            progress[varK] = varV
+            changed.append(varK)
+
+    if len(changed) == 0:
+        if any(isinstance(v, str) for v in updates.values()):
+            print('Variables are the same. No update necessary.')
+        return progress
+
+    # update snapshot variable
+    progress['snapshot'] = str(uuid.uuid4())
+
+    write_progress(progress_file, progress)
+
+    for varK in changed:
+        print(f'Successfully updated progress file with {varK} -> {progress[varK]}')
 
     return progress
 
+def update_progress(progress_file, varK, varV):
+    """
+    Update progress file with new notebook variable
+
+    Args:
+    progress_file (str): path to progress file
+    varK (str): key in progress file to update
+    varV (str): updated value to write
+
+    Returns:
+    progress (dict): Loaded path dict from the progress yaml file.
+    """
+
+    return update_progress_vars(progress_file, {varK: varV})
+
 def find_progress(base_progress):
     """
     Search for paths to all existing MosSeq2-Notebook dependencies and updates the progress paths dictionary.
@@ -310,9 +383,6 @@ def generate_intital_progressfile(filename='progress.yaml'):
     base_progress_vars (dict): Loaded/Found progress variables
     """
 
-    yml = yaml.YAML()
-    yml.indent(mapping=2, offset=2)
-
     base_dir = dirname(filename)
 
     print(f'Generating progress path at: {filename}')
@@ -336,8 +406,7 @@ def generate_intital_progressfile(filename='progress.yaml'):
     # Find progress in given base directory
     base_progress_vars = find_progress(base_progress_vars)
 
-    with open(filename, 'w') as f:
-        yml.dump(base_progress_vars, f)
+    write_progress(filename, base_progress_vars)
 
     return base_progress_vars
 
@@ -354,7 +423,7 @@ def load_progress(progress_file):
 
     if exists(progress_file):
         print('Updating notebook variables...')
-        progress_vars = read_yaml(progress_file)
+        progress_vars = read_progress(progress_file)
     else:
         print('Progress file not found. To generate a new one, set restore_progress_vars(progress_file, init=True)')
         progress_vars = None
@@ -502,7 +571,7 @@ def check_progress(progress_filepath=abspath('./progress.yaml'), exts=['dat', 'm
 
     # Check if progress file exists
     if exists(progress_filepath):
-        progress_vars = read_yaml(progress_filepath)
+        progress_vars = read_progress(progress_filepath)
 
         print('Found progress file, displaying progress...\n')
         # Display progress bars
@@ -2,12 +2,12 @@
 This module contains the widget components that comprise the group setting table functionality.
 """
 
+import os
 import qgrid
-import pandas as pd
 import ruamel.yaml as yaml
 import ipywidgets as widgets
 from IPython.display import clear_output
-from moseq2_app.util import index_to_dataframe
+from moseq2_app.util import index_to_dataframe, load_index
 
 class GroupSettingWidgets:
 
@@ -46,7 +46,8 @@ class GroupSettingWidgets:
         self.group_set = widgets.HBox([self.group_input, self.save_button, self.update_index_button])
 
         self.index_dict, self.df = index_to_dataframe(self.index_filepath)
-        self.qgrid_widget = qgrid.show_grid(self.df[['SessionName', 'SubjectName', 'group', 'uuid', 'filename']],
+        self.grid_cols = ['SessionName', 'SubjectName', 'group', 'uuid', 'filename']
+        self.qgrid_widget = qgrid.show_grid(self.df[self.grid_cols],
                                             column_options=self.col_opts,
                                             column_definitions=self.col_defs,
                                             show_toolbar=False)
@@ -61,9 +62,18 @@ class GroupSettingWidgets:
         self.update_index_button.on_click(self.update_clicked)
         self.save_button.on_click(self.update_table)
 
+    def sync_grid_edits(self):
+        """
+        Copy the group names edited directly in the table into the session DataFrame.
+        """
+
+        latest_df = self.qgrid_widget.get_changed_df()
+        self.df.loc[latest_df.index, 'group'] = latest_df['group']
+
     def update_table(self, b=None):
         """
-        Update table upon "Set Button" click
+        Update table upon "Set Button" click, setting the group name of all the selected rows at once
+         and refreshing the table a single time.
 
         Args:
         b (button click)
@@ -72,33 +82,40 @@ class GroupSettingWidgets:
         self.update_index_button.button_style = 'info'
         self.update_index_button.icon = 'none'
 
-        selected_rows = self.qgrid_widget.get_selected_df()
-        x = selected_rows.index
+        selected = self.qgrid_widget.get_selected_df().index
+
+        self.sync_grid_edits()
+        self.df.loc[selected, 'group'] = self.group_input.value
 
-        for i in x:
-            self.qgrid_widget.edit_cell(i, 'group', self.group_input.value)
+        self.qgrid_widget.df = self.df[self.grid_cols]
+        self.qgrid_widget.change_selection(list(selected))
 
     def update_clicked(self, b=None):
         """
         Update the index file with the current table state upon Save button click.
+        Only the group names that differ from the index file are changed, and the file is replaced atomically.
 
         Args:
         b (button click)
         """
 
-        files = self.index_dict['files']
-        meta = [f['metadata'] for f in files]
-        meta_cols = pd.DataFrame(meta).columns
+        self.sync_grid_edits()
+        groups = dict(zip(self.df['uuid'], self.df['group']))
 
-        latest_df = self.qgrid_widget.get_changed_df()
-        self.df.drop('filename', axis=1)
-        self.df.update(latest_df)
+        # reload the index so that changes made to it since the table was opened are kept
+        index_dict = load_index(self.index_filepath)
+        changed = [f for f in index_dict['files'] if f['uuid'] in groups and f.get('group') != groups[f['uuid']]]
+
+        if len(changed) > 0:
+            for f in changed:
+                f['group'] = groups[f['uuid']]
 
-        updated_index = {'files': list(self.df.drop(meta_cols, axis=1).to_dict(orient='index').values()),
-                         'pca_path': self.index_dict['pca_path']}
+            tmp_path = f'{self.index_filepath}.tmp'
+            with open(tmp_path, 'w') as f:
+                yaml.safe_dump(index_dict, f)
+            os.replace(tmp_path, self.index_filepath)
 
-        with open(self.index_filepath, 'w') as f:
-            yaml.safe_dump(updated_index, f)
+        self.index_dict = index_dict
 
         self.update_index_button.button_style = 'success'
         self.update_index_button.icon = 'check'
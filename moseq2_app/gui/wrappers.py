@@ -9,8 +9,8 @@ from moseq2_viz.util import read_yaml
 from ipywidgets import interactive_output
 from IPython.display import display, clear_output
 from moseq2_app.gui.progress import get_session_paths
-from moseq2_viz.model.util import (relabel_by_usage, parse_model_results,
-                                   compute_syllable_explained_variance)
+from moseq2_app.context import get_data_context
+from moseq2_viz.model.util import compute_syllable_explained_variance
 from moseq2_app.viz.controller import SyllableLabeler, CrowdMovieComparison
 from moseq2_app.stat.controller import InteractiveTransitionGraph
 from moseq2_app.roi.validation import (make_session_status_dicts, get_scalar_anomaly_sessions,
@@ -57,11 +57,8 @@ def interactive_syllable_labeler_wrapper(model_path, config_file, index_file, cr
     if os.path.dirname(index_file) != os.path.dirname(new_index_path):
         shutil.copy2(index_file, new_index_path)
 
-    # Load the model
-    model = parse_model_results(model_path)
-
-    # Compute the sorted labels
-    model['labels'] = relabel_by_usage(model['labels'], count='usage')[0]
+    # Load the model labels, sorted by usage
+    model = get_data_context({'model_path': model_path, 'index_file': index_file}).get_model_labels().to_model_dict()
 
     # Get Maximum number of syllables to include
     if max_syllables is None:
@@ -116,7 +113,7 @@ def interactive_crowd_movie_comparison_preview_wrapper(config_filepath, index_pa
     """
 
     config_data = read_yaml(config_filepath)
-    syll_info = read_yaml(syll_info_path)
+    syll_info = get_data_context({'model_path': model_path, 'index_file': index_path}).get_syll_info(syll_info_path)
 
     cm_compare = CrowdMovieComparison(config_data=config_data, index_path=index_path, df_path=df_path,
                                       model_path=model_path, syll_info=syll_info, output_dir=output_dir,
@@ -129,7 +126,8 @@ def interactive_crowd_movie_comparison_preview_wrapper(config_filepath, index_pa
 
 
 def interactive_plot_transition_graph_wrapper(model_path, index_path, info_path, df_path=None, 
-                                              max_syllables=None, plot_vertically=False, load_parquet=False):
+                                              max_syllables=None, plot_vertically=False, load_parquet=False,
+                                              client_side=False, difference_pairs=None):
     """
     prepare the data for the interactive graphing function.
 
@@ -140,20 +138,21 @@ def interactive_plot_transition_graph_wrapper(model_path, index_path, info_path,
     df_path (str): Path to pre-saved syllable information.
     max_syllables (int or None): Limit maximum number of displayed syllables.
     load_parquet (bool): Indicates to load previously saved data.
+    client_side (bool): Indicates to threshold the graphs in the browser instead of the Python kernel.
+    difference_pairs (list or None): (group, group) name pairs to display difference graphs for, None displays all pairs.
     """
 
     # Initialize Transition Graph data structure
     i_trans_graph = InteractiveTransitionGraph(model_path=model_path, index_path=index_path,
                                                info_path=info_path, df_path=df_path,
                                                max_sylls=max_syllables, plot_vertically=plot_vertically,
-                                               load_parquet=load_parquet)
+                                               load_parquet=load_parquet, client_side=client_side,
+                                               difference_pairs=difference_pairs)
 
-    # Make graphs
+    # Make graphs, the threshold sliders update the displayed graphs in place
     out = interactive_output(i_trans_graph.interactive_transition_graph_helper,
                              {'layout': i_trans_graph.graph_layout_dropdown,
                               # 'scalar_color': i_trans_graph.color_nodes_dropdown,
-                              'edge_threshold': i_trans_graph.edge_thresholder,
-                              'usage_threshold': i_trans_graph.usage_thresholder,
                               })
 
     # Display widgets and bokeh network plots
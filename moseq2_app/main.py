@@ -1,7 +1,7 @@
 """
 Main functions that facilitate all jupyter notebook functionality.
 """
-from os.path import exists
+from os.path import exists, join, dirname
 import ipywidgets as widgets
 from IPython.display import display
 from bokeh.io import output_notebook
@@ -13,6 +13,8 @@ from moseq2_app.scalars.controller import InteractiveScalarViewer
 from moseq2_app.stat.controller import InteractiveSyllableStats
 from moseq2_app.stat.view import plot_dendrogram
 from moseq2_app.roi.controller import InteractiveExtractionViewer
+from moseq2_app.context import get_data_context
+from moseq2_app.gui.jobs import get_job_runner
 from moseq2_app.gui.wrappers import validate_extractions_wrapper, \
     interactive_syllable_labeler_wrapper, interactive_crowd_movie_comparison_preview_wrapper, \
     interactive_plot_transition_graph_wrapper
@@ -38,6 +40,20 @@ def validate_inputs(inputs, progress_paths):
 
     return error
 
+def show_jobs():
+    """
+    display the status of the background jobs, with buttons to cancel or resume them.
+    The job runner's single status panel is displayed again on each call.
+
+    Returns:
+    panel (JobStatusPanel): background job status panel.
+    """
+
+    panel = get_job_runner().get_status_panel()
+    display(panel.panel)
+
+    return panel
+
 @filter_warnings
 def flip_classifier_tool(input_dir,
                          output_file,
@@ -70,6 +86,29 @@ def flip_classifier_tool(input_dir,
 
     return flip_finder
 
+@filter_warnings
+def apply_flip_classifier(flip_finder, background=True, **kwargs):
+    """
+    apply a trained flip classifier to the extracted sessions, optionally in the background.
+
+    Args:
+    flip_finder (FlipRangeTool): Flip Classifier training widget holding the trained classifier.
+    background (bool): indicates to run the classifier as a background job that can be cancelled and resumed.
+    kwargs (dict): parameters passed to FlipRangeTool.apply_flip_classifier().
+
+    Returns:
+    job (Job): background job applying the classifier, None if background is False.
+    """
+
+    if not background:
+        flip_finder.apply_flip_classifier(**kwargs)
+        return
+
+    job = get_job_runner().submit('Apply flip classifier', flip_finder.apply_flip_classifier, **kwargs)
+    show_jobs()
+
+    return job
+
 @filter_warnings
 def view_extraction(extractions, default=0):
     """
@@ -115,15 +154,63 @@ def preview_extractions(input_dir, flipped=False):
     display(viewer.clear_button, viewer.sess_select, selout)
 
 @filter_warnings
-def validate_extractions(input_dir):
+def validate_extractions(input_dir, background=False):
     """
     validate extracted sessions and print validation results.
 
     Args:
     input_dir (str): Path to parent directory containing extracted sessions folders
+    background (bool): indicates to validate the sessions in a background job, printing the results in the job panel.
+
+    Returns:
+    job (Job): background validation job, None if background is False.
     """
 
-    validate_extractions_wrapper(input_dir)
+    if not background:
+        validate_extractions_wrapper(input_dir)
+        return
+
+    job = get_job_runner().submit('Validate extractions', validate_extractions_wrapper, input_dir)
+    show_jobs()
+
+    return job
+
+@filter_warnings
+def compute_syllable_statistics(progress_paths, background=True):
+    """
+    compute the syllable statistics shared by the syllable labeler, statistics and crowd movie tools, and save them
+     to parquet files, optionally in the background.
+
+    Args:
+    progress_paths (dict): dictionary of notebook progress paths.
+    background (bool): indicates to compute the statistics in a background job.
+
+    Returns:
+    job (Job): background job computing the statistics, None if background is False.
+    """
+
+    if validate_inputs(['model_path', 'index_file'], progress_paths):
+        print('Set the correct paths to the missing variables and run the function again.')
+        return
+
+    df_path = progress_paths.get('df_info_path') or join(dirname(progress_paths['model_path']), 'syll_df.parquet')
+
+    def compute(job=None):
+        # the job can be cancelled between the scalar loading, merging and writing stages, and resumed jobs reuse
+        # the statistics merged before they were cancelled. the parquet files are written to temporary files and
+        # renamed once complete
+        get_data_context(progress_paths).get_syllable_dataframes(df_path=df_path, load_scalars=False,
+                                                                 report=job.report if job is not None else None)
+        return df_path
+
+    if not background:
+        compute()
+        return
+
+    job = get_job_runner().submit('Compute syllable statistics', compute)
+    show_jobs()
+
+    return job
 
 @filter_warnings
 def interactive_group_setting(index_file):
@@ -273,7 +360,8 @@ def interactive_crowd_movie_comparison(progress_paths, group_movie_dir, get_pdfs
                                                get_pdfs=get_pdfs, load_parquet=load_parquet)
 
 @filter_warnings
-def interactive_transition_graph(progress_paths, max_syllables=None, plot_vertically=False, load_parquet=False):
+def interactive_transition_graph(progress_paths, max_syllables=None, plot_vertically=False, load_parquet=False,
+                                 client_side=False, difference_pairs=None):
     """
     Display group transition graphs with a configurable number of syllables.
 
@@ -281,6 +369,9 @@ def interactive_transition_graph(progress_paths, max_syllables=None, plot_vertic
     progress_paths (dict): dictionary of notebook progress paths.
     max_syllables (int or None): manual maximum number of syllables to label.
     load_parquet (bool): Indicates to load previously saved data.
+    client_side (bool): Indicates to threshold the graphs in the browser, which does not depend on the kernel's latency.
+    difference_pairs (list or None): (group, group) name pairs to display "group2 - group1" difference graphs for,
+     None displays all pairs.
     """
 
     # Get proper input paths
@@ -303,4 +394,6 @@ def interactive_transition_graph(progress_paths, max_syllables=None, plot_vertic
                                               syll_info_df_path,
                                               max_syllables=max_syllables,
                                               load_parquet=load_parquet,
-                                              plot_vertically=plot_vertically)
+                                              plot_vertically=plot_vertically,
+                                              client_side=client_side,
+                                              difference_pairs=difference_pairs)
@@ -0,0 +1,307 @@
+"""
+Numpy-backed model label store, shared by the syllable labeler, stat and transition graph controllers.
+"""
+
+import os
+import zipfile
+import warnings
+import numpy as np
+from os.path import abspath, exists, getmtime, splitext
+from moseq2_viz.model.util import parse_model_results
+
+# loaded label stores keyed by (model path, model file modification time)
+_store_cache = {}
+
+
+def _memmap_npz_member(npz_path, name):
+    """
+    Memory-map an array stored uncompressed within an .npz file.
+
+    Args:
+    npz_path (str): path to the .npz file.
+    name (str): name of the array within the file.
+
+    Returns:
+    arr (np.memmap): read-only memory-mapped array.
+    """
+
+    with zipfile.ZipFile(npz_path) as zf:
+        info = zf.getinfo(f'{name}.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f'{name} is compressed and cannot be memory-mapped.')
+        header_offset = info.header_offset
+
+    with open(npz_path, 'rb') as f:
+        # skip the zip local file header, whose name and extra field lengths are stored at bytes 26-30
+        f.seek(header_offset + 26)
+        name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+        f.seek(header_offset + 30 + int(name_len) + int(extra_len))
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+
+    return np.memmap(npz_path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def get_usage_mapping(labels, offsets):
+    """
+    Compute the mapping from syllable labels to their rank when sorted by descending usage,
+     counting each syllable instance (run of repeated labels within a session) once.
+
+    Args:
+    labels (1d numpy array): concatenated syllable labels of all sessions.
+    offsets (1d numpy array): start index of each session's labels, followed by the total number of labels.
+
+    Returns:
+    mapping (1d numpy array): usage rank of each syllable label.
+    """
+
+    labels = np.asarray(labels)
+    if len(labels) == 0:
+        return np.zeros(0, dtype='int16')
+
+    # first frame of every syllable instance, including the first frame of each session
+    onsets = np.ones(len(labels), dtype='bool')
+    onsets[1:] = labels[1:] != labels[:-1]
+    onsets[offsets[:-1][offsets[:-1] < len(labels)]] = True
+
+    instances = labels[onsets & (labels >= 0)].astype('int64')
+    counts = np.bincount(instances, minlength=max(int(labels.max()) + 1, 0))
+
+    mapping = np.empty(len(counts), dtype='int16')
+    mapping[np.argsort(-counts, kind='stable')] = np.arange(len(counts))
+
+    return mapping
+
+
+class ModelLabelStore:
+
+    def __init__(self, labels, offsets, keys, groups, usage_mapping=None):
+        """
+        Hold the syllable labels of every modeled session as one concatenated int16 array with session offsets,
+         along with the session uuids and groups needed by the app.
+
+        Args:
+        labels (1d numpy array): concatenated syllable labels of all sessions.
+        offsets (1d numpy array): start index of each session's labels, followed by the total number of labels.
+        keys (list): session uuids, in the order of the labels.
+        groups (list): group name of each session.
+        usage_mapping (1d numpy array): precomputed usage rank of each syllable label.
+        """
+
+        self.labels = labels
+        self.offsets = np.asarray(offsets, dtype='int64')
+        self.keys = [str(k) for k in keys]
+        self.groups = [str(g) for g in groups]
+        self._usage_mapping = None if usage_mapping is None else np.asarray(usage_mapping, dtype='int16')
+        self._relabeled = None
+
+    @classmethod
+    def from_model_dict(cls, model_fit):
+        """
+        Create a label store from a model dict loaded with parse_model_results().
+
+        Args:
+        model_fit (dict): loaded model dict.
+
+        Returns:
+        store (ModelLabelStore): label store of the model's sessions.
+        """
+
+        keys = model_fit.get('train_list', model_fit.get('keys'))
+        if keys is None:
+            keys = model_fit['metadata']['uuids']
+        groups = model_fit['metadata'].get('groups', {})
+        if not isinstance(groups, dict):
+            groups = dict(zip(model_fit['metadata']['uuids'], groups))
+
+        lengths = [len(lbl) for lbl in model_fit['labels']]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype('int64')
+        labels = np.concatenate([np.asarray(lbl, dtype='int16') for lbl in model_fit['labels']]) \
+            if len(lengths) > 0 else np.zeros(0, dtype='int16')
+
+        return cls(labels, offsets, keys, [groups.get(k, 'default') for k in keys])
+
+    @property
+    def usage_mapping(self):
+        """
+        Usage rank of each syllable label, computed on first access.
+        """
+
+        if self._usage_mapping is None:
+            self._usage_mapping = get_usage_mapping(self.labels, self.offsets)
+        return self._usage_mapping
+
+    @property
+    def relabeled(self):
+        """
+        Concatenated labels of all sessions, relabeled by descending usage. Negative labels are left unchanged.
+        """
+
+        if self._relabeled is None:
+            labels = np.asarray(self.labels)
+            mapping = self.usage_mapping
+            if len(mapping) == 0:
+                # sessions holding only negative labels (e.g. padding) have no syllables to relabel
+                self._relabeled = labels.astype('int16')
+            else:
+                self._relabeled = np.where(labels >= 0, mapping[np.clip(labels, 0, None)], labels).astype('int16')
+        return self._relabeled
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_labels(self, relabel=True):
+        """
+        Get the labels of each session as views into the concatenated label array.
+
+        Args:
+        relabel (bool): indicates to return the labels relabeled by usage.
+
+        Returns:
+        labels (list): list of session label arrays, in the order of keys.
+        """
+
+        labels = self.relabeled if relabel else self.labels
+        return [labels[start:end] for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    def get_session_labels(self, uuid, relabel=True):
+        """
+        Get the labels of a single session.
+
+        Args:
+        uuid (str): session uuid.
+        relabel (bool): indicates to return the labels relabeled by usage.
+
+        Returns:
+        labels (1d numpy array): session labels.
+        """
+
+        i = self.keys.index(uuid)
+        labels = self.relabeled if relabel else self.labels
+        return labels[self.offsets[i]:self.offsets[i + 1]]
+
+    def to_model_dict(self, relabel=True):
+        """
+        Create the subset of the parse_model_results() dict used by the app's controllers.
+
+        Args:
+        relabel (bool): indicates to return the labels relabeled by usage.
+
+        Returns:
+        model_fit (dict): dict with the session labels, keys and metadata (uuids and groups).
+        """
+
+        return {
+            'labels': self.get_labels(relabel=relabel),
+            'keys': list(self.keys),
+            'train_list': list(self.keys),
+            'metadata': {
+                'uuids': list(self.keys),
+                'groups': dict(zip(self.keys, self.groups)),
+            },
+        }
+
+    def save(self, path, model_mtime=None):
+        """
+        Write the label store to an uncompressed .npz file, whose label array can later be memory-mapped.
+
+        Args:
+        path (str): path to the .npz file.
+        model_mtime (float): modification time of the model file the labels were loaded from.
+        """
+
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path,
+                 labels=np.asarray(self.labels, dtype='int16'),
+                 offsets=self.offsets,
+                 keys=np.array(self.keys, dtype='str'),
+                 groups=np.array(self.groups, dtype='str'),
+                 usage_mapping=self.usage_mapping,
+                 model_mtime=np.array(np.nan if model_mtime is None else model_mtime))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a label store written by save(), memory-mapping the labels.
+
+        Args:
+        path (str): path to the .npz file.
+
+        Returns:
+        store (ModelLabelStore): loaded label store.
+        model_mtime (float): modification time of the model file the labels were loaded from.
+        """
+
+        with np.load(path) as data:
+            offsets = data['offsets']
+            keys, groups = data['keys'].tolist(), data['groups'].tolist()
+            usage_mapping = data['usage_mapping']
+            model_mtime = float(data['model_mtime'])
+
+        store = cls(_memmap_npz_member(path, 'labels'), offsets, keys, groups, usage_mapping=usage_mapping)
+
+        return store, model_mtime
+
+
+def get_label_store_path(model_path):
+    """
+    Get the path of the label store sidecar file written next to a model.
+
+    Args:
+    model_path (str): path to the trained model.
+
+    Returns:
+    path (str): path to the .npz label store.
+    """
+
+    return f'{splitext(model_path)[0]}_labels.npz'
+
+
+def load_model_labels(model_path):
+    """
+    Load a model's labels, reusing the label store already loaded in this process or the .npz sidecar
+     written next to the model, as long as the model file was not modified since.
+    The first load parses the model with parse_model_results() and writes the sidecar.
+
+    Args:
+    model_path (str): path to the trained model.
+
+    Returns:
+    store (ModelLabelStore): label store of the model's sessions.
+    """
+
+    model_mtime = getmtime(model_path)
+    key = (abspath(model_path), model_mtime)
+    if key in _store_cache:
+        return _store_cache[key]
+
+    store_path = get_label_store_path(model_path)
+    store = None
+    if exists(store_path):
+        try:
+            store, stored_mtime = ModelLabelStore.load(store_path)
+            if stored_mtime != model_mtime:
+                store = None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            store = None
+
+    if store is None:
+        store = ModelLabelStore.from_model_dict(parse_model_results(model_path))
+        try:
+            store.save(store_path, model_mtime=model_mtime)
+        except OSError as e:
+            warnings.warn(f'Could not write the model label store to {store_path}: {e}')
+
+    _store_cache[key] = store
+
+    return store
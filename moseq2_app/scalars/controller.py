@@ -3,104 +3,185 @@ Interactive Scalar Summary Viewing tool.
 """
 import plotly.express as px
 import plotly.graph_objects as go
-from moseq2_viz.util import parse_index
+from plotly.colors import hex_to_rgb
 from plotly.subplots import make_subplots
-from moseq2_viz.scalars.util import scalars_to_dataframe
+from moseq2_app.util import get_sorted_index
 from moseq2_app.scalars.widgets import InteractiveScalarWidgets
+from moseq2_app.scalars.util import (get_scalar_summary, get_scalar_summary_path, get_scalar_histograms,
+                                     get_scalar_histogram_path, get_frame_distributions, scalar_columns)
 
 class InteractiveScalarViewer(InteractiveScalarWidgets):
 
-    def __init__(self, index_filepath):
+    def __init__(self, index_filepath, quantiles=()):
         """
-        Initialize function that will compute the scalar dataframe, the mean and standard deviation for interactive scalar summary.
+        Initialize function that will compute the mean and standard deviation of each session's scalars for interactive scalar summary.
 
         Args:
         index_filepath (str): Path to index file
+        quantiles (tuple): quantiles of each session's scalars to also compute, in [0, 1].
         """
 
         super().__init__()
 
         self.index_filepath = index_filepath
 
-        # get scalar dataframe
-        _, self.sorted_index = parse_index(index_filepath)
-        self.scalar_df = scalars_to_dataframe(self.sorted_index)
+        # summarize each session's scalars, only loading the sessions that changed since the last summary
+        self.sorted_index = get_sorted_index(index_filepath)
+        self.summary_df = get_scalar_summary(self.sorted_index, summary_path=get_scalar_summary_path(index_filepath),
+                                             quantiles=quantiles)
 
-        self.mean_df = self.scalar_df.groupby(['uuid', 'SessionName', 'SubjectName', 'group'], as_index=False).mean()
-        self.std_df = self.scalar_df.groupby(['uuid', 'SessionName', 'SubjectName', 'group'],
-                                        as_index=True).std().reset_index()
+        session_cols = ['uuid', 'SessionName', 'SubjectName', 'group']
+        self.mean_df = self.summary_df[session_cols].assign(
+            **{c: self.summary_df[f'{c}_mean'] for c in scalar_columns})
+        self.std_df = self.summary_df[session_cols].assign(
+            **{c: self.summary_df[f'{c}_std'] for c in scalar_columns})
         self.colors = px.colors.qualitative.Alphabet
 
+        # session rows and hover texts of each group, computed once
+        self.unique_groups = self.mean_df.group.unique()
+        self.group_partitions = self.mean_df.groupby('group', sort=False).indices
+        self.hover_texts = {}
+        for g, idx in self.group_partitions.items():
+            rows = self.mean_df.iloc[idx]
+            self.hover_texts[g] = [f'SessionName: {sn}<br>SubjectName: {sj}<br>uuid: {u}' for sn, sj, u in
+                                   zip(rows['SessionName'], rows['SubjectName'], rows['uuid'])]
+
+        # (mean, std) violin traces keyed by (column, group)
+        self.trace_cache = {}
+
+        # session histograms are only loaded once the frame-level distributions are requested
+        self.histograms = None
+        # frame-level distribution traces keyed by (column, group)
+        self.distribution_cache = {}
+
         # populate column selector
-        self.checked_list.options = [
-            'area_mm', 'height_ave_mm', 'length_mm', 'velocity_2d_mm', 
-            'velocity_3d_mm', 'width_mm', 'dist_to_center_px']
+        self.checked_list.options = list(scalar_columns)
 
         # set default values
         self.checked_list.value = ['area_mm', 'velocity_2d_mm']
 
+    def get_traces(self, c, i, g):
+        """
+        Get the mean and STD violin traces of a scalar column for a group, creating them the first time they are requested.
+
+        Args:
+        c (str): scalar column name.
+        i (int): index of the group, used to pick its color.
+        g (str): group name.
+
+        Returns:
+        v1 (go.Violin): violin of the session means.
+        v2 (go.Violin): violin of the session STDs.
+        """
+
+        if (c, g) not in self.trace_cache:
+            idx = self.group_partitions[g]
+            texts = self.hover_texts[g]
+
+            v1 = go.Violin(y=self.mean_df[c].to_numpy()[idx],
+                           name=g,
+                           jitter=0.5,
+                           line_color=self.colors[i],
+                           marker=dict(size=5),
+                           line=dict(width=1),
+                           points='all',
+                           text=texts,
+                           legendgroup=g,
+                           showlegend=False,
+                           hovertemplate=f'Mean {c}: ' + "%{y}<br>%{text}"
+                           )
+
+            v2 = go.Violin(y=self.std_df[c].to_numpy()[idx],
+                           name=g,
+                           jitter=0.5,
+                           line_color=self.colors[i],
+                           marker=dict(size=5),
+                           line=dict(width=1),
+                           points='all',
+                           text=texts,
+                           legendgroup=g,
+                           showlegend=False,
+                           hovertemplate=f'STD {c}: ' + "%{y}<br>%{text}"
+                           )
+
+            self.trace_cache[(c, g)] = (v1, v2)
+
+        return self.trace_cache[(c, g)]
+
+    def get_distribution_traces(self, c, i, g):
+        """
+        Get the frame-level distribution traces of a scalar column for a group: the mean density of the group's sessions,
+         surrounded by a band of +/- one standard deviation across sessions.
+        Densities are computed from the precomputed session histograms, over bins shared by all the groups.
+
+        Args:
+        c (str): scalar column name.
+        i (int): index of the group, used to pick its color.
+        g (str): group name.
+
+        Returns:
+        traces (tuple): lower band, upper band and mean density go.Scattergl traces.
+        """
+
+        if self.histograms is None:
+            self.histograms = get_scalar_histograms(self.sorted_index,
+                                                    histogram_path=get_scalar_histogram_path(self.index_filepath))
+
+        if (c, g) not in self.distribution_cache:
+            if c not in self.distribution_cache:
+                self.distribution_cache[c] = get_frame_distributions(self.histograms, self.mean_df['uuid'], c)
+            centers, densities = self.distribution_cache[c]
+
+            group_densities = densities[self.group_partitions[g]]
+            mean = group_densities.mean(axis=0)
+            std = group_densities.std(axis=0)
+
+            band_color = 'rgba({}, {}, {}, 0.2)'.format(*hex_to_rgb(self.colors[i]))
+            lower = go.Scattergl(x=centers, y=mean - std, mode='lines', line=dict(width=0), legendgroup=g,
+                                 showlegend=False, hoverinfo='skip')
+            upper = go.Scattergl(x=centers, y=mean + std, mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=band_color, legendgroup=g, showlegend=False, hoverinfo='skip')
+            line = go.Scattergl(x=centers, y=mean, mode='lines', name=g, line=dict(color=self.colors[i], width=2),
+                                legendgroup=g, showlegend=False,
+                                hovertemplate=f'{c}: ' + '%{x}<br>Density: %{y}<extra>' + g + '</extra>')
+
+            self.distribution_cache[(c, g)] = (lower, upper, line)
+
+        return self.distribution_cache[(c, g)]
+
     def make_graphs(self):
         """
         create interactive scalar plots.
         """
 
         selected_cols = self.checked_list.value
-        unique_groups = self.scalar_df.group.unique()
+        frame_level = self.frame_level.value
 
-        self.fig = make_subplots(rows=len(selected_cols), cols=2)
+        self.fig = make_subplots(rows=len(selected_cols), cols=3 if frame_level else 2)
 
         for j, c in enumerate(selected_cols):
-            for i, g in enumerate(unique_groups):
-                y = self.mean_df[self.mean_df['group'] == g][c]
-                std_y = self.std_df[self.std_df['group'] == g][c]
-
-                session_name = self.mean_df[self.mean_df['group'] == g]['SessionName']
-                subject_name = self.mean_df[self.mean_df['group'] == g]['SubjectName']
-                uuid = self.mean_df[self.mean_df['group'] == g]['uuid']
-
-                texts = [f'SessionName: {sn}<br>SubjectName: {sj}<br>uuid: {u}' for sn, sj, u in
-                         zip(session_name, subject_name, uuid)]
-
-                show = j < 1
-
-                v1 = go.Violin(y=y,
-                               name=g,
-                               jitter=0.5,
-                               line_color=self.colors[i],
-                               marker=dict(size=5),
-                               line=dict(width=1),
-                               points='all',
-                               text=texts,
-                               legendgroup=g,
-                               showlegend=show,
-                               hovertemplate=f'Mean {c}: ' + "%{y}<br>%{text}"
-                               )
-
-                self.fig.add_trace(v1, row=j + 1, col=1)
-
-                self.fig.update_yaxes(title_text=f"{c}", row=j + 1, col=1)
-
-                v2 = go.Violin(y=std_y,
-                               name=g,
-                               jitter=0.5,
-                               line_color=self.colors[i],
-                               marker=dict(size=5),
-                               line=dict(width=1),
-                               points='all',
-                               text=texts,
-                               legendgroup=g,
-                               showlegend=False,
-                               hovertemplate=f'STD {c}: ' + "%{y}<br>%{text}"
-                               )
+            for i, g in enumerate(self.unique_groups):
+                v1, v2 = self.get_traces(c, i, g)
 
+                # only the first row of violins is shown in the legend
+                self.fig.add_trace(go.Violin(v1, showlegend=j < 1), row=j + 1, col=1)
                 self.fig.add_trace(v2, row=j + 1, col=2)
 
+                if frame_level:
+                    for trace in self.get_distribution_traces(c, i, g):
+                        self.fig.add_trace(trace, row=j + 1, col=3)
+
+            self.fig.update_yaxes(title_text=f"{c}", row=j + 1, col=1)
+            if frame_level:
+                self.fig.update_xaxes(title_text=f"{c}", row=j + 1, col=3)
+
         self.fig.update_xaxes(title_text=f"Mean", row=len(selected_cols), col=1)
         self.fig.update_xaxes(title_text=f"STD", row=len(selected_cols), col=2)
         self.fig.update_xaxes(tickangle=45)
 
-        self.fig.update_layout(height=300*len(selected_cols), width=1000, title_text="Scalar Summary")
-        self.fig.update_traces(box_visible=True, meanline_visible=True)
+        self.fig.update_layout(height=300*len(selected_cols), width=1500 if frame_level else 1000,
+                               title_text="Scalar Summary")
+        self.fig.update_traces(box_visible=True, meanline_visible=True, selector=dict(type='violin'))
 
         return self.fig
 
@@ -0,0 +1,319 @@
+"""
+Per-session scalar summaries used by the interactive scalar summary viewer.
+"""
+
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from os.path import dirname, exists, getmtime, join
+from joblib import Parallel, delayed
+from moseq2_viz.scalars.util import scalars_to_dataframe
+
+# scalar columns summarized for each session
+scalar_columns = ['area_mm', 'height_ave_mm', 'length_mm', 'velocity_2d_mm', 'velocity_3d_mm', 'width_mm',
+                  'dist_to_center_px']
+
+# modification time recorded for sessions whose h5 file is missing, comparable once read back from the caches
+MISSING_H5_MTIME = -1.0
+
+# session summaries keyed by (uuid, h5 modification time)
+_summary_cache = {}
+
+
+def get_h5_mtimes(sorted_index):
+    """
+    Get the modification time of each session's h5 file, used to key the cached session summaries and histograms.
+
+    Args:
+    sorted_index (dict): Sorted dict of the extracted sessions.
+
+    Returns:
+    stamps (dict): session uuids mapped to their h5 modification time, MISSING_H5_MTIME if the file is missing.
+    """
+
+    stamps = {}
+    for uuid, session in sorted_index['files'].items():
+        h5_path = session['path'][0]
+        stamps[uuid] = float(getmtime(h5_path)) if exists(h5_path) else MISSING_H5_MTIME
+
+    return stamps
+
+
+def get_scalar_summary_path(index_path):
+    """
+    Get the path of the per-session scalar summary cache written next to an index file.
+
+    Args:
+    index_path (str): Path to index file.
+
+    Returns:
+    summary_path (str): path to the scalar summary parquet file.
+    """
+
+    return join(dirname(index_path), 'scalar_summary.parquet')
+
+
+def summarize_session_scalars(sorted_index, uuid, quantiles=()):
+    """
+    Load the frame-level scalars of a single session, and compute their mean, standard deviation and quantiles.
+
+    Args:
+    sorted_index (dict): Sorted dict of the extracted sessions.
+    uuid (str): uuid of the session to summarize.
+    quantiles (tuple): quantiles of each scalar to compute, in [0, 1].
+
+    Returns:
+    summary (dict): '{scalar}_mean', '{scalar}_std' and '{scalar}_q{quantile}' values of the session.
+    """
+
+    session_index = {**sorted_index, 'files': {uuid: sorted_index['files'][uuid]}}
+    scalar_df = scalars_to_dataframe(session_index)
+
+    summary = {}
+    for c in scalar_columns:
+        values = scalar_df[c].to_numpy(dtype='float64') if c in scalar_df.columns else np.array([np.nan])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            summary[f'{c}_mean'] = np.nanmean(values)
+            # sample standard deviation, matching pandas' std()
+            summary[f'{c}_std'] = np.nanstd(values, ddof=1)
+            for q in quantiles:
+                summary[f'{c}_q{q:g}'] = np.nanquantile(values, q)
+
+    return summary
+
+
+def get_scalar_summary(sorted_index, summary_path=None, quantiles=(), n_jobs=-1):
+    """
+    Compute the per-session scalar summaries of all the sessions in an index. Only the sessions whose h5 file changed
+     since their summary was last computed are loaded, in parallel, one session at a time.
+    Summaries are cached in memory and, when summary_path is given, in a parquet file.
+
+    Args:
+    sorted_index (dict): Sorted dict of the extracted sessions.
+    summary_path (str): path to the parquet file caching the session summaries.
+    quantiles (tuple): quantiles of each scalar to compute, in [0, 1].
+    n_jobs (int): number of processes used to summarize the sessions (-1 uses all cores).
+
+    Returns:
+    summary_df (pd.DataFrame): one row per session with its uuid, SessionName, SubjectName, group and scalar summaries.
+    """
+
+    stamps = get_h5_mtimes(sorted_index)
+
+    # reuse the summaries cached on disk for unchanged sessions
+    if summary_path is not None and exists(summary_path):
+        try:
+            cached = pd.read_parquet(summary_path, engine='fastparquet')
+            for row in cached.to_dict(orient='records'):
+                summary = {k: v for k, v in row.items() if k.startswith(tuple(scalar_columns))}
+                _summary_cache.setdefault((row['uuid'], float(row['h5_mtime'])), summary)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # summary keys of each session, cached summaries missing any of them are recomputed
+    keys = [f'{c}_{k}' for c in scalar_columns for k in ['mean', 'std'] + [f'q{q:g}' for q in quantiles]]
+
+    missing = [uuid for uuid, mtime in stamps.items()
+               if not all(k in _summary_cache.get((uuid, mtime), {}) for k in keys)]
+    if len(missing) > 0:
+        summaries = Parallel(n_jobs=n_jobs)(delayed(summarize_session_scalars)(sorted_index, uuid, quantiles)
+                                            for uuid in missing)
+        for uuid, summary in zip(missing, summaries):
+            _summary_cache[(uuid, stamps[uuid])] = summary
+
+    rows = []
+    for uuid, session in sorted_index['files'].items():
+        meta = session.get('metadata', {})
+        summary = _summary_cache[(uuid, stamps[uuid])]
+        rows.append({'uuid': uuid,
+                     'SessionName': str(meta.get('SessionName')),
+                     'SubjectName': str(meta.get('SubjectName')),
+                     'group': session.get('group', 'default'),
+                     'h5_mtime': stamps[uuid],
+                     **{k: summary.get(k, np.nan) for k in keys}})
+    summary_df = pd.DataFrame(rows)
+
+    if summary_path is not None and len(missing) > 0:
+        try:
+            tmp_path = f'{summary_path}.tmp'
+            summary_df.to_parquet(tmp_path, engine='fastparquet')
+            os.replace(tmp_path, summary_path)
+        except OSError as e:
+            warnings.warn(f'Could not write the scalar summary to {summary_path}: {e}')
+
+    return summary_df
+
+
+# fine-grained session histograms keyed by (uuid, h5 modification time, number of bins)
+_histogram_cache = {}
+
+
+def get_scalar_histogram_path(index_path):
+    """
+    Get the path of the per-session scalar histogram cache written next to an index file.
+
+    Args:
+    index_path (str): Path to index file.
+
+    Returns:
+    histogram_path (str): path to the scalar histogram .npz file.
+    """
+
+    return join(dirname(index_path), 'scalar_histograms.npz')
+
+
+def histogram_session_scalars(sorted_index, uuid, n_bins=1000):
+    """
+    Load the frame-level scalars of a single session, and bin each scalar between its minimum and maximum value.
+
+    Args:
+    sorted_index (dict): Sorted dict of the extracted sessions.
+    uuid (str): uuid of the session to bin.
+    n_bins (int): number of evenly spaced bins of each scalar.
+
+    Returns:
+    histograms (dict): scalar names mapped to their (counts, (min, max)) histogram.
+    """
+
+    session_index = {**sorted_index, 'files': {uuid: sorted_index['files'][uuid]}}
+    scalar_df = scalars_to_dataframe(session_index)
+
+    histograms = {}
+    for c in scalar_columns:
+        values = scalar_df[c].to_numpy(dtype='float64') if c in scalar_df.columns else np.zeros(0)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            histograms[c] = (np.zeros(n_bins, dtype='int64'), (np.nan, np.nan))
+            continue
+        lo, hi = values.min(), values.max()
+        counts, _ = np.histogram(values, bins=n_bins, range=(lo, hi if hi > lo else lo + 1))
+        histograms[c] = (counts, (lo, hi))
+
+    return histograms
+
+
+def get_scalar_histograms(sorted_index, histogram_path=None, n_bins=1000, n_jobs=-1):
+    """
+    Compute the fine-grained histograms of each scalar for all the sessions in an index, so that frame-level
+     distributions can be plotted without loading every frame. Only the sessions whose h5 file changed since
+     their histograms were last computed are loaded.
+    Histograms are cached in memory and, when histogram_path is given, in an .npz file.
+
+    Args:
+    sorted_index (dict): Sorted dict of the extracted sessions.
+    histogram_path (str): path to the .npz file caching the session histograms.
+    n_bins (int): number of evenly spaced bins of each session histogram.
+    n_jobs (int): number of processes used to bin the sessions (-1 uses all cores).
+
+    Returns:
+    histograms (dict): session uuids mapped to their {scalar: (counts, (min, max))} histograms.
+    """
+
+    stamps = get_h5_mtimes(sorted_index)
+
+    # reuse the histograms cached on disk for unchanged sessions
+    if histogram_path is not None and exists(histogram_path):
+        try:
+            with np.load(histogram_path) as data:
+                uuids, mtimes = data['uuids'].tolist(), data['h5_mtimes']
+                arrays = {c: (data[f'{c}_counts'], data[f'{c}_range']) for c in scalar_columns}
+            # histograms cached with a different number of bins are recomputed
+            if arrays[scalar_columns[0]][0].shape[1] != n_bins:
+                uuids = []
+            for k, (uuid, mtime) in enumerate(zip(uuids, mtimes)):
+                _histogram_cache.setdefault((uuid, float(mtime), n_bins),
+                                            {c: (counts[k], tuple(ranges[k])) for c, (counts, ranges) in arrays.items()})
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def key(uuid):
+        return uuid, stamps[uuid], n_bins
+
+    missing = [uuid for uuid in stamps if key(uuid) not in _histogram_cache]
+    if len(missing) > 0:
+        results = Parallel(n_jobs=n_jobs)(delayed(histogram_session_scalars)(sorted_index, uuid, n_bins)
+                                          for uuid in missing)
+        for uuid, histograms in zip(missing, results):
+            _histogram_cache[key(uuid)] = histograms
+
+    histograms = {uuid: _histogram_cache[key(uuid)] for uuid in stamps}
+
+    if histogram_path is not None and len(missing) > 0 and len(histograms) > 0:
+        try:
+            uuids = list(histograms)
+            arrays = {}
+            for c in scalar_columns:
+                arrays[f'{c}_counts'] = np.stack([histograms[u][c][0] for u in uuids])
+                arrays[f'{c}_range'] = np.array([histograms[u][c][1] for u in uuids], dtype='float64')
+            tmp_path = f'{histogram_path}.tmp.npz'
+            np.savez(tmp_path, uuids=np.array(uuids, dtype='str'),
+                     h5_mtimes=np.array([key(u)[1] for u in uuids], dtype='float64'), **arrays)
+            os.replace(tmp_path, histogram_path)
+        except OSError as e:
+            warnings.warn(f'Could not write the scalar histograms to {histogram_path}: {e}')
+
+    return histograms
+
+
+def rebin_histograms(counts, ranges, edges):
+    """
+    Redistribute fine-grained histograms, each spanning its own range, onto shared bin edges, assuming the
+     values are evenly spread within each fine bin.
+
+    Args:
+    counts (2d numpy array): histogram counts of each session (sessions x fine bins).
+    ranges (2d numpy array): (min, max) range of each session's histogram (sessions x 2).
+    edges (1d numpy array): shared bin edges.
+
+    Returns:
+    rebinned (2d numpy array): counts of each session within the shared bins (sessions x len(edges) - 1).
+    """
+
+    counts = np.asarray(counts, dtype='float64')
+    rebinned = np.zeros((len(counts), len(edges) - 1))
+    for k, (c, (lo, hi)) in enumerate(zip(counts, ranges)):
+        if not np.isfinite(lo):
+            continue
+        if hi <= lo:
+            # all the session's values are equal
+            rebinned[k] = np.histogram([lo], bins=edges)[0] * c.sum()
+            continue
+        fine_edges = np.linspace(lo, hi, len(c) + 1)
+        cumulative = np.concatenate([[0], np.cumsum(c)])
+        rebinned[k] = np.diff(np.interp(edges, fine_edges, cumulative))
+
+    return rebinned
+
+
+def get_frame_distributions(histograms, uuids, column, n_bins=100):
+    """
+    Get the frame-level density of a scalar for a set of sessions, over bins shared by all of them.
+
+    Args:
+    histograms (dict): session histograms returned by get_scalar_histograms().
+    uuids (list): uuids of the sessions whose distributions are returned.
+    column (str): scalar column name.
+    n_bins (int): number of shared bins.
+
+    Returns:
+    centers (1d numpy array): centers of the shared bins.
+    densities (2d numpy array): density of each session within the shared bins (sessions x n_bins).
+    """
+
+    counts = np.array([histograms[u][column][0] for u in uuids])
+    ranges = np.array([histograms[u][column][1] for u in uuids], dtype='float64')
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        lo, hi = np.nanmin(ranges[:, 0]), np.nanmax(ranges[:, 1])
+    if not np.isfinite(lo):
+        lo, hi = 0, 1
+    edges = np.linspace(lo, hi if hi > lo else lo + 1, n_bins + 1)
+
+    rebinned = rebin_histograms(counts, ranges, edges)
+    totals = rebinned.sum(axis=1, keepdims=True)
+    densities = np.divide(rebinned, totals * np.diff(edges), out=np.zeros_like(rebinned), where=totals > 0)
+
+    return (edges[:-1] + edges[1:]) / 2, densities
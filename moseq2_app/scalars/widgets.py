@@ -28,10 +28,14 @@ class InteractiveScalarWidgets:
         self.checked_list = widgets.SelectMultiple(options=[], description='Scalar Columns to Plot', style=style,
                                                    continuous_update=False, disabled=False, layout=self.label_layout)
 
-        self.ui_tools = VBox([self.clear_button, self.checked_list], layout=self.box_layout)
+        self.frame_level = widgets.Checkbox(value=False, description='Show Frame-level Distributions', style=style,
+                                            indent=False)
+
+        self.ui_tools = VBox([self.clear_button, self.checked_list, self.frame_level], layout=self.box_layout)
 
         # initialize event listeners
         self.checked_list.observe(self.on_column_select, names='value')
+        self.frame_level.observe(self.on_column_select, names='value')
         self.clear_button.on_click(self.on_clear)
 
     def on_clear(self, b=None):
@@ -49,7 +53,7 @@ class InteractiveScalarWidgets:
 
     def on_column_select(self, event=None):
         """
-        Update the view once the user selects a new set of scalars to plot.
+        Update the view once the user selects a new set of scalars to plot, or toggles the frame-level distributions.
 
         Args:
         event
@@ -3,25 +3,26 @@ Main interactive model syllable statistics results application functionality.
 """
 
 import os
-import io
-import base64
 import warnings
 import numpy as np
 import pandas as pd
-from os.path import exists
-from collections import defaultdict
+import networkx as nx
+from os.path import exists, join, dirname
+from collections import OrderedDict
 from ipywidgets import interactive_output
-from moseq2_viz.info.util import transition_entropy
-from moseq2_app.util import merge_labels_with_scalars
-from moseq2_viz.util import get_sorted_index, read_yaml
-from moseq2_viz.model.stat import run_kruskal, run_pairwise_stats
-from moseq2_viz.model.util import (parse_model_results, relabel_by_usage, normalize_usages,
-                                   sort_syllables_by_stat, sort_syllables_by_stat_difference)
+from moseq2_app.util import get_df_fingerprint, write_yaml
+from moseq2_viz.util import read_yaml
+from moseq2_viz.model.stat import run_pairwise_stats
+from moseq2_app.stat.parallel import run_kruskal_parallel
+from moseq2_app.context import get_data_context
+from moseq2_app.viz.util import get_crowd_movie_previews, encode_movie
+from moseq2_viz.model.util import normalize_usages, sort_syllables_by_stat, sort_syllables_by_stat_difference
 from moseq2_app.stat.widgets import SyllableStatWidgets, TransitionGraphWidgets
-from moseq2_app.stat.view import bokeh_plotting, plot_interactive_transition_graph
-from moseq2_viz.model.trans_graph import (get_trans_graph_groups, get_group_trans_mats,
-                                         convert_transition_matrix_to_ebunch,
-                                         convert_ebunch_to_graph, make_transition_graphs, get_pos)
+from moseq2_app.stat.transitions import TransitionGraphModel, compute_group_transition_entropies
+from moseq2_app.stat.view import (bokeh_plotting, compute_syllable_aggregates, add_bootstrap_cis,
+                                  plot_transition_graph_model, plot_transition_graph_model_client_side,
+                                  update_transition_graph_model_plots)
+from moseq2_viz.model.trans_graph import get_group_trans_mats, get_pos
 
 class InteractiveSyllableStats(SyllableStatWidgets):
 
@@ -45,6 +46,12 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         self.index_path = index_path
         self.df_path = df_path
 
+        # model, index and syllable data shared with the other widgets
+        self.data_context = get_data_context({'model_path': model_path, 'index_file': index_path})
+
+        # hypothesis test results are saved next to the syllable DataFrame to be reused in later sessions
+        self.stat_test_path = join(dirname(df_path), 'syll_stat_tests.yaml') if df_path is not None else None
+
         # If user inputs load_parquet=True in main.py function label_syllables()
         # then the self.df_path will be set to the inputted df_path (pointing to a pre-existing parquet file)
         # to load the data from.
@@ -58,8 +65,16 @@ class InteractiveSyllableStats(SyllableStatWidgets):
 
         self.df = None
 
+        # aggregated syllable statistics keyed by (groupby, errorbar), and syllable orderings keyed by sorting
+        self.aggregates = {}
+        self.orderings = {}
+
+        # significant syllables keyed by (test, stat, ctrl_group, exp_group, max_sylls) for the fingerprinted DataFrame
+        self.df_fingerprint = None
+        self.stat_test_results = {}
+
         # Load Syllable Info
-        self.syll_info = read_yaml(self.info_path)
+        self.syll_info = self.data_context.get_syll_info(self.info_path)
 
         # Load all the data
         self.interactive_stat_helper()
@@ -113,31 +128,31 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         Computes and saves the all the relevant syllable information to be displayed.
         """
         # Read syllable information dict
-        syll_info = read_yaml(self.info_path)
+        syll_info = self.data_context.get_syll_info(self.info_path)
 
         # Getting number of syllables included in the info dict
         max_sylls = len(self.syll_info)
+
+        # Embed the lightweight crowd movie previews in the hover tooltips
+        previews = get_crowd_movie_previews([syll_info[k]['crowd_movie_path'] for k in range(max_sylls)])
         for k in range(max_sylls):
             # remove group_info
             syll_info[k].pop('group_info', None)
 
             # Open videos in encoded urls
-            # Implementation from: https://github.com/jupyter/notebook/issues/1024#issuecomment-338664139
-            if exists(syll_info[k]['crowd_movie_path']):
-                video = io.open(syll_info[k]['crowd_movie_path'], 'r+b').read()
-                encoded = base64.b64encode(video)
-                syll_info[k]['crowd_movie_path'] = encoded.decode('ascii')
+            if exists(previews[k]):
+                syll_info[k]['crowd_movie_path'] = encode_movie(previews[k])
 
         info_df = pd.DataFrame(syll_info).T.sort_index()
         info_df['syllable'] = info_df.index
 
-        # Load the model and sort labels - also remaps the ar matrices
-        model_data = parse_model_results(self.model_path, sort_labels_by_usage=True, count='usage')
+        # Load the model session uuids
+        model_uuids = self.data_context.get_model_labels().keys
 
         # Read index file
-        self.sorted_index = get_sorted_index(self.index_path)
+        self.sorted_index = self.data_context.get_sorted_index()
 
-        if not set(model_data['metadata']['uuids']).issubset(set(self.sorted_index['files'])):
+        if not set(model_uuids).issubset(set(self.sorted_index['files'])):
             print('Error: Index file UUIDs do not match model UUIDs.')
 
         # Get max syllables if None is given
@@ -149,13 +164,14 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         # otherwise, the DataFrame is computed from scratch
         if self.df_path is not None:
             print('Loading parquet files')
-            df = pd.read_parquet(self.df_path, engine='fastparquet')
+            df, _ = self.data_context.get_syllable_dataframes(df_path=self.df_path, load_scalars=False,
+                                                              max_syllable=self.max_sylls)
             if len(df.syllable.unique()) < self.max_sylls:
                 print('Requested more syllables than the parquet file holds, recomputing requested dataset.')
-                df, _ = merge_labels_with_scalars(self.sorted_index, self.model_path)
+                df, _ = self.data_context.get_syllable_dataframes(max_syllable=self.max_sylls)
         else:
             print('Syllable DataFrame not found. Computing syllable statistics...')
-            df, _ = merge_labels_with_scalars(self.sorted_index, self.model_path)
+            df, _ = self.data_context.get_syllable_dataframes(max_syllable=self.max_sylls)
 
         self.df = df.merge(info_df, on='syllable')
         self.df['SubjectName'] = self.df['SubjectName'].astype(str)
@@ -164,6 +180,98 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         # Since syllable usage is 0, the nan in scalars will be filled with 0
         self.df.fillna(0, inplace=True)
 
+        # reset the tables aggregated from the previous DataFrame
+        self.aggregates = {}
+        self.orderings = {}
+        self.df_fingerprint = None
+
+    def get_syllable_aggregates(self, groupby, errorbar, stat):
+        """
+        Get the per-(groupby, syllable) mean and error values of the syllable statistics,
+         computing them the first time the (groupby, errorbar) pair is requested.
+        Confidence intervals are only computed for the selected statistic, the first time it is selected.
+
+        Args:
+        groupby (str): column to group the syllable stats by.
+        errorbar (str): name of the error bar type to compute values for.
+        stat (str): name of the selected statistic.
+
+        Returns:
+        aggregates (dict): output of compute_syllable_aggregates() for the current syllable DataFrame.
+        """
+
+        if (groupby, errorbar) not in self.aggregates:
+            self.aggregates[(groupby, errorbar)] = compute_syllable_aggregates(self.df, groupby, errorbar,
+                                                                               stats=[stat])
+        elif errorbar == 'CI 95%':
+            add_bootstrap_cis(self.aggregates[(groupby, errorbar)], self.df, groupby, stats=[stat])
+
+        return self.aggregates[(groupby, errorbar)]
+
+    def get_syllable_ordering(self, sort, stat, ctrl_group, exp_group):
+        """
+        Get the syllable ordering of the selected sorting, computing it the first time it is requested.
+
+        Args:
+        sort (str): name of the statistic to sort syllables by, or 'difference'.
+        stat (str): statistic to compute the group difference sorting with.
+        ctrl_group (str): Name of control group to compute group difference sorting with.
+        exp_group (str): Name of comparative group to compute group difference sorting with.
+
+        Returns:
+        ordering (list): syllable index values in the selected order.
+        """
+
+        if sort == 'difference':
+            key = (sort, stat, ctrl_group, exp_group)
+        else:
+            key = (sort,)
+
+        if key not in self.orderings:
+            if sort == 'difference':
+                self.orderings[key] = sort_syllables_by_stat_difference(self.df, ctrl_group, exp_group, stat=stat)
+            elif sort != 'usage':
+                self.orderings[key], _ = sort_syllables_by_stat(self.df, stat=sort)
+            else:
+                self.orderings[key] = range(len(self.df.syllable.unique()))
+
+        return self.orderings[key]
+
+    def load_stat_test_results(self):
+        """
+        Fingerprint the current syllable DataFrame, and load the hypothesis test results previously saved for it.
+        """
+
+        columns = [c for c in ('group', 'uuid', 'SessionName', 'SubjectName') if c in self.df.columns]
+        columns += list(self.df.select_dtypes('number').columns)
+        self.df_fingerprint = get_df_fingerprint(self.df, columns=columns)
+
+        self.stat_test_results = {}
+        if self.stat_test_path is not None and exists(self.stat_test_path):
+            saved = read_yaml(self.stat_test_path) or {}
+            # results computed from a different DataFrame are discarded
+            if saved.get('fingerprint') == self.df_fingerprint:
+                for r in saved.get('results', []):
+                    key = (r['test'], r['stat'], r['ctrl_group'], r['exp_group'], r['max_sylls'])
+                    self.stat_test_results[key] = r['sig_sylls']
+
+    def save_stat_test_results(self):
+        """
+        Write the hypothesis test results of the current syllable DataFrame next to the syllable DataFrame file.
+        """
+
+        if self.stat_test_path is None:
+            return
+
+        results = [{'test': test, 'stat': stat, 'ctrl_group': ctrl, 'exp_group': exp, 'max_sylls': max_sylls,
+                    'sig_sylls': sig_sylls}
+                   for (test, stat, ctrl, exp, max_sylls), sig_sylls in self.stat_test_results.items()]
+
+        try:
+            write_yaml({'fingerprint': self.df_fingerprint, 'results': results}, self.stat_test_path)
+        except OSError as e:
+            warnings.warn(f'Could not save the hypothesis test results to {self.stat_test_path}: {e}')
+
     def run_selected_hypothesis_test(self, hyp_test_name, stat, ctrl_group, exp_group):
         """
         compute the significant syllables for a given pair of groups given the hypothesis test on the data.
@@ -178,15 +286,28 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         sig_sylls (list): list of significant syllables to mark on plotted statistics figure
         """
 
+        test = self.dropdown_mapping[hyp_test_name]
+        key = (test, stat, ctrl_group, exp_group, self.max_sylls)
+
+        # reuse the results previously computed from the same DataFrame
+        if self.df_fingerprint is None:
+            self.load_stat_test_results()
+        if key in self.stat_test_results:
+            return self.stat_test_results[key]
+
         if self.dropdown_mapping[hyp_test_name] == 'kw':
-            # run KW and Dunn's Test
-            sig_syll_dict = run_kruskal(self.df, statistic=stat, max_syllable=self.max_sylls)[2]
+            # run KW and Dunn's Test, spreading the permutations across all cores
+            sig_syll_dict = run_kruskal_parallel(self.df, statistic=stat, max_syllable=self.max_sylls)[2]
+
+            # the test covers all group pairs at once, so store each of them in both orders
+            for (g1, g2), pair_sylls in sig_syll_dict.items():
+                pair_sylls = [int(x) for x in pair_sylls]
+                self.stat_test_results[(test, stat, g1, g2, self.max_sylls)] = pair_sylls
+                self.stat_test_results[(test, stat, g2, g1, self.max_sylls)] = pair_sylls
 
             # get corresponding computed significant syllables from pair dict
-            if (ctrl_group, exp_group) in sig_syll_dict:
-                sig_sylls = sig_syll_dict[(ctrl_group, exp_group)]
-            elif (exp_group, ctrl_group) in sig_syll_dict:
-                sig_sylls = sig_syll_dict[(exp_group, ctrl_group)]
+            if key in self.stat_test_results:
+                sig_sylls = self.stat_test_results[key]
             else:
                 raise KeyError('Selected groups are not compatible with KW hypothesis test.')
 
@@ -204,7 +325,10 @@ class InteractiveSyllableStats(SyllableStatWidgets):
                                                      test_type='mw', statistic=stat, max_syllable=self.max_sylls)
 
         if self.dropdown_mapping[hyp_test_name] != 'kw':
-            sig_sylls = list(intersect_sig_sylls[intersect_sig_sylls["is_sig"] == True].index)
+            sig_sylls = [int(x) for x in intersect_sig_sylls[intersect_sig_sylls["is_sig"] == True].index]
+            self.stat_test_results[key] = sig_sylls
+
+        self.save_stat_test_results()
 
         return sig_sylls
 
@@ -228,8 +352,8 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         # initialize sig_sylls list variable to prevent UnboundLocalError
         sig_sylls = []
 
-        # Get current dataFrame to plot
-        df = self.df.fillna(0)
+        # Get current dataFrame to plot, the missing values have already been filled upon loading
+        df = self.df
 
         # Handle names to query DataFrame with
         stat = self.dropdown_mapping[stat.lower()]
@@ -239,7 +363,7 @@ class InteractiveSyllableStats(SyllableStatWidgets):
         # Get selected syllable sorting
         if sort.lower() == 'difference':
             # display Text for groups to input experimental groups
-            ordering = sort_syllables_by_stat_difference(df, ctrl_group, exp_group, stat=stat)
+            ordering = self.get_syllable_ordering('difference', stat, ctrl_group, exp_group)
 
             # run selected hypothesis test
             if ctrl_group != exp_group:
@@ -247,10 +371,8 @@ class InteractiveSyllableStats(SyllableStatWidgets):
 
                 # renumber the significant syllables s.t. they are plotted to match the current ordering.
                 sig_sylls = np.argsort(ordering)[sig_sylls_indices]
-        elif sort.lower() != 'usage':
-            ordering, _ = sort_syllables_by_stat(df, stat=sortby)
         else:
-            ordering = range(len(df.syllable.unique()))
+            ordering = self.get_syllable_ordering(sortby, stat, ctrl_group, exp_group)
 
         # Handle selective display for whether mutation sort is selected
         if sort.lower() == 'difference':
@@ -261,7 +383,7 @@ class InteractiveSyllableStats(SyllableStatWidgets):
 
         # Handle selective display to select included sessions to graph
         if groupby == 'SessionName' or groupby == 'SubjectName':
-            mean_df = df.copy()
+            mean_df = df
             df = df[df[groupby].isin(self.session_sel.value)]
             # set error bar to None because error bars are not implemented correctly in SessionName and SubjectName
             errorbar = "None"
@@ -270,12 +392,19 @@ class InteractiveSyllableStats(SyllableStatWidgets):
             self.error_box.layout.display = "block"
             mean_df = None
 
+        # slice the cached aggregates instead of regrouping the session-level DataFrame
+        aggregates = {groupby: self.get_syllable_aggregates(groupby, errorbar, stat)}
+        if mean_df is not None:
+            aggregates['group'] = self.get_syllable_aggregates('group', errorbar, stat)
+
         self.stat_fig = bokeh_plotting(df, stat, ordering, mean_df=mean_df, groupby=groupby, errorbar=errorbar,
-                                       syllable_families=None, sort_name=sort, thresh=thresh, sig_sylls=sig_sylls)
+                                       syllable_families=None, sort_name=sort, thresh=thresh, sig_sylls=sig_sylls,
+                                       aggregates=aggregates)
 
 
 class InteractiveTransitionGraph(TransitionGraphWidgets):
-    def __init__(self, model_path, index_path, info_path, df_path, max_sylls, plot_vertically, load_parquet):
+    def __init__(self, model_path, index_path, info_path, df_path, max_sylls, plot_vertically, load_parquet,
+                 client_side=False, difference_pairs=None):
         """
         Initialize variables for interactive transition graph.
 
@@ -284,6 +413,8 @@ class InteractiveTransitionGraph(TransitionGraphWidgets):
         index_path (str): Path to index file containing trained session metadata.
         info_path (str): Path to labeled syllable info file
         max_sylls (int): Maximum number of syllables to plot.
+        client_side (bool): Indicates to threshold the graphs in the browser with Bokeh sliders instead of the kernel.
+        difference_pairs (list): list of (group, group) name pairs to display difference graphs for, defaults to all pairs.
         """
 
         super().__init__()
@@ -294,6 +425,12 @@ class InteractiveTransitionGraph(TransitionGraphWidgets):
         self.df_path = df_path
         self.max_sylls = max_sylls
         self.plot_vertically = plot_vertically
+        self.client_side = client_side
+        self.difference_pairs = difference_pairs
+
+        # graph node positions keyed by (layout, node set, max_sylls), least recently used first
+        self.layout_cache = OrderedDict()
+        self.max_cached_layouts = 128
 
         # If user inputs load_parquet=True in main.py function label_syllables()
         # then the self.df_path will be set to the inputted df_path (pointing to a pre-existing parquet file)
@@ -306,21 +443,37 @@ class InteractiveTransitionGraph(TransitionGraphWidgets):
             # If load_parquet=False, self.df_path will be set to None to compute the DataFrame from scratch
             self.df_path = None
 
-        # Load Model
-        self.model_fit = parse_model_results(model_path)
+        # model, index and syllable data shared with the other widgets
+        self.data_context = get_data_context({'model_path': model_path, 'index_file': index_path})
+
+        # Load the model labels, sorted by usage
+        self.label_store = self.data_context.get_model_labels()
+        self.model_fit = self.label_store.to_model_dict()
 
         # Load Index File
-        self.sorted_index = get_sorted_index(index_path)
+        self.sorted_index = self.data_context.get_sorted_index()
 
         if set(self.sorted_index['files']) != set(self.model_fit['metadata']['uuids']):
             print('Warning: Index file UUIDs do not match model UUIDs.')
 
+        # displayed graph renderers, updated in place upon threshold changes
+        self.graph_layout = None
+        self.plot_handle = None
+        self.rendered_graphs = None
+
         # Load and store transition graph data
         self.initialize_transition_data()
 
         self.set_range_widget_values()
 
         self.clear_button.on_click(self.clear_on_click)
+        if self.client_side:
+            # thresholding is done by the Bokeh sliders displayed with the graphs
+            self.edge_thresholder.layout.display = 'none'
+            self.usage_thresholder.layout.display = 'none'
+        else:
+            self.edge_thresholder.observe(self.on_threshold_update, names='value')
+            self.usage_thresholder.observe(self.on_threshold_update, names='value')
 
         # Manage dropdown menu values
         self.scalar_dict = {
@@ -335,39 +488,18 @@ class InteractiveTransitionGraph(TransitionGraphWidgets):
     def compute_entropies(self, labels, label_group):
         """
         Compute individual syllable entropy and transition entropy rates for all sessions with in a label_group.
+        Entropies are computed on the labels relabeled by the usage of all the sessions, like the graph nodes.
 
         Args:
         labels (2d list): list of session syllable labels over time.
         label_group (list): list of groups computing entropies for.
         """
 
-        self.incoming_transition_entropy, self.outgoing_transition_entropy = [], []
-
-        for g in self.group:
-            use_labels = [lbl for lbl, grp in zip(labels, label_group) if grp == g]
-
-            self.incoming_transition_entropy.append(np.mean(transition_entropy(use_labels,
-                                                    tm_smoothing=0,
-                                                    truncate_syllable=self.max_sylls,
-                                                    transition_type='incoming',
-                                                    relabel_by='usage'), axis=0))
-
-            self.outgoing_transition_entropy.append(np.mean(transition_entropy(use_labels,
-                                                    tm_smoothing=0,
-                                                    truncate_syllable=self.max_sylls,
-                                                    transition_type='outgoing',
-                                                    relabel_by='usage'), axis=0))
+        # all sessions are counted at once, and the results are reused until the model file changes
+        cache_key = (os.path.abspath(self.model_path), os.path.getmtime(self.model_path))
 
-    def compute_entropy_differences(self):
-        """
-        Compute cross group entropy/entropy-rate differences and cast them to OrderedDict objects
-        """
-
-        # Compute entropy + entropy rate differences
-        for i in range(len(self.group)):
-            for j in range(i + 1, len(self.group)):
-                self.incoming_transition_entropy.append(self.incoming_transition_entropy[j] - self.incoming_transition_entropy[i])
-                self.outgoing_transition_entropy.append(self.outgoing_transition_entropy[j] - self.outgoing_transition_entropy[i])
+        self.incoming_transition_entropy, self.outgoing_transition_entropy = \
+            compute_group_transition_entropies(labels, label_group, self.group, self.max_sylls, cache_key=cache_key)
 
     def initialize_transition_data(self):
         """
@@ -377,119 +509,181 @@ class InteractiveTransitionGraph(TransitionGraphWidgets):
             warnings.simplefilter('ignore')
 
             # Load Syllable Info
-            self.syll_info = read_yaml(self.info_path)
+            self.syll_info = self.data_context.get_syll_info(self.info_path)
 
-            # Get labels and optionally relabel them by usage sorting
+            # Get the labels relabeled by usage sorting
             labels = self.model_fit['labels']
 
             # get max_sylls
             if self.max_sylls is None:
                 self.max_sylls = len(self.syll_info)
 
+            # Embed the lightweight crowd movie previews in the hover tooltips
+            previews = get_crowd_movie_previews([self.syll_info[k]['crowd_movie_path'] for k in range(self.max_sylls)])
             for k in range(self.max_sylls):
                 # Open videos in encoded urls
-                # Implementation from: https://github.com/jupyter/notebook/issues/1024#issuecomment-338664139
-                if exists(self.syll_info[k]['crowd_movie_path']):
-                    video = io.open(self.syll_info[k]['crowd_movie_path'], 'r+b').read()
-                    encoded = base64.b64encode(video)
-                    self.syll_info[k]['crowd_movie_path'] = encoded.decode('ascii')
+                if exists(previews[k]):
+                    self.syll_info[k]['crowd_movie_path'] = encode_movie(previews[k])
 
+            _scalar_map = {
+                'duration': 'duration',
+                'speeds_2d': 'velocity_2d_mm_mean',
+                'speeds_3d': 'velocity_3d_mm_mean',
+                'heights': 'height_ave_mm_mean',
+                'dists': 'dist_to_center_px_mean'
+            }
+
+            # only the displayed syllables and the scalars shown in the node tooltips are read
+            query = dict(columns=['group', 'syllable'] + list(_scalar_map.values()), max_syllable=self.max_sylls)
             if self.df_path is not None:
                 print('Loading parquet files')
-                df = pd.read_parquet(self.df_path, engine='fastparquet')
+                df, _ = self.data_context.get_syllable_dataframes(df_path=self.df_path, load_scalars=False, **query)
             else:
                 print('Syllable DataFrame not found. Creating new dataframe and computing syllable statistics...')
-                df, _ = merge_labels_with_scalars(self.sorted_index, self.model_path)
+                df, _ = self.data_context.get_syllable_dataframes(**query)
             self.df = df
 
             # Get groups and matching session uuids
-            label_group, _ = get_trans_graph_groups(self.model_fit)
+            label_group = self.label_store.groups
             self.group = sorted(list(set(label_group)))
 
-            labels = relabel_by_usage(labels, count='usage')[0]
+            # difference graphs are only computed for the displayed pairs of groups
+            pairs = self.get_difference_pair_indices()
 
             self.compute_entropies(labels, label_group)
 
             # Compute usages and transition matrices
             self.trans_mats, self.usages = get_group_trans_mats(labels, label_group, sorted(self.group), self.max_sylls)
-            self.df = self.df[self.df['syllable'] < self.max_sylls]
             self.df = self.df.groupby(['group', 'syllable'], as_index=False).mean()
 
-            self.compute_entropy_differences()
+            # groups x syllables arrays of normalized usages and mean scalars
+            usages = np.array([[normalize_usages(u).get(s, 0) for s in range(self.max_sylls)] for u in self.usages])
+            scalars = {}
+            for new_scalar, old_scalar in _scalar_map.items():
+                scalars[new_scalar] = self.df.pivot(index='group', columns='syllable', values=old_scalar)\
+                    .reindex(index=self.group, columns=range(self.max_sylls)).to_numpy()
+
+            # large transition matrices are mostly zeros, and are stored sparsely
+            self.graph_model = TransitionGraphModel(self.trans_mats, usages, self.group, scalars=scalars,
+                                                    incoming_entropy=self.incoming_transition_entropy,
+                                                    outgoing_entropy=self.outgoing_transition_entropy,
+                                                    syll_info=self.syll_info, pairs=pairs,
+                                                    sparse=self.max_sylls >= 100)
+
+    def get_difference_pair_indices(self):
+        """
+        Validate the requested difference graph pairs against the groups found in the index.
+
+        Returns:
+        pairs (list or None): list of (i, j) group index pairs, None to display all pairs.
+        """
+
+        if self.difference_pairs is None:
+            return None
+
+        pairs = []
+        for pair in self.difference_pairs:
+            if len(pair) != 2 or any(g not in self.group for g in pair):
+                raise ValueError(f'Invalid difference pair {tuple(pair)}: pairs must hold two of the groups '
+                                 f'{", ".join(map(str, self.group))}.')
+            pairs.append((self.group.index(pair[0]), self.group.index(pair[1])))
+
+        return pairs
+
+    def get_layout_positions(self, graph, layout):
+        """
+        Get the node positions of a graph for the selected layout, reusing the positions previously computed for the same node set.
+        When a spring layout is requested for a node set that only slightly differs from a cached one,
+         the cached positions seed a shorter force-directed re-layout, so the graph does not jump between thresholds.
+
+        Args:
+        graph (nx.DiGraph): anchor transition graph to lay out.
+        layout (str): name of the graph layout. options=['circular', 'spring']
+
+        Returns:
+        pos (dict): node indices mapped to their (x, y) positions.
+        """
+
+        nodes = frozenset(graph.nodes)
+        key = (layout, nodes, self.max_sylls)
 
-    def interactive_transition_graph_helper(self, layout, edge_threshold, usage_threshold):
+        if key in self.layout_cache:
+            self.layout_cache.move_to_end(key)
+            return dict(self.layout_cache[key])
+
+        # find the most similar cached spring layout
+        prev_pos, min_diff = None, None
+        if layout == 'spring':
+            for (l, n, m), cached_pos in self.layout_cache.items():
+                if l == layout and m == self.max_sylls and (min_diff is None or len(n ^ nodes) < min_diff):
+                    prev_pos, min_diff = cached_pos, len(n ^ nodes)
+
+        if prev_pos is not None and min_diff <= max(2, len(nodes) // 10):
+            init_pos = {n: prev_pos[n] for n in nodes if n in prev_pos}
+            pos = nx.spring_layout(graph, k=1.5 / np.sqrt(self.max_sylls), pos=init_pos, iterations=20, seed=0)
+        else:
+            pos = get_pos(graph, layout=layout, nnodes=self.max_sylls)
+
+        self.layout_cache[key] = pos
+        while len(self.layout_cache) > self.max_cached_layouts:
+            self.layout_cache.popitem(last=False)
+
+        return dict(pos)
+
+    def interactive_transition_graph_helper(self, layout, edge_threshold=None, usage_threshold=None):
         """
-        generate all the transition graphs given the currently selected thresholding values, then display them in a Jupyter notebook or web page.
+        generate all the transition graphs given the currently selected layout and thresholding values, then display them in a Jupyter notebook or web page.
+        Later threshold changes update the displayed graphs in place through on_threshold_update().
 
         Args:
-        layout (string)
-        scalar_color (string)
-        edge_threshold (tuple or ipywidgets.FloatRangeSlider): Transition probability range to include in graphs.
-        usage_threshold (tuple or ipywidgets.FloatRangeSlider): Syllable usage range to include in graphs.
-        speed_threshold (tuple or ipywidgets.FloatRangeSlider): Syllable speed range to include in graphs.
+        layout (string or ipywidgets.Dropdown): name of the graph layout.
+        edge_threshold (tuple or None): Transition probability range to include in graphs, defaults to the edge threshold slider value.
+        usage_threshold (tuple or None): Syllable usage range to include in graphs, defaults to the usage threshold slider value.
         """
         with warnings.catch_warnings():
             warnings.simplefilter('ignore')
 
-            # Get graph node anchors
-            anchor = 0
-            # make a list of normalized usages
-            usages = [normalize_usages(u) for u in self.usages]
-            usages_anchor = usages[anchor]
+            if edge_threshold is None:
+                edge_threshold = self.edge_thresholder.value
+            if usage_threshold is None:
+                usage_threshold = self.usage_thresholder.value
 
-            # Get anchored group scalars
-            scalars = defaultdict(list)
-            _scalar_map = {
-                'duration': 'duration',
-                'speeds_2d': 'velocity_2d_mm_mean',
-                'speeds_3d': 'velocity_3d_mm_mean',
-                'heights': 'height_ave_mm_mean',
-                'dists': 'dist_to_center_px_mean'
-            }
-            # loop thru each group and append a syllable -> scalar value mapping to collection above
-            for g in self.group:
-                group_df = self.df.query('group == @g').set_index('syllable')
-                for new_scalar, old_scalar in _scalar_map.items():
-                    scalars[new_scalar].append(dict(group_df[old_scalar]))
-
-            # key = self.scalar_dict.get(scalar_color, 'speeds_2d')
-            # scalar_anchor = scalars[key][anchor]
-
-            usage_kwargs = {
-                'usages': usages_anchor,
-                'usage_threshold': usage_threshold
-            }
+            self.graph_layout = layout
+
+            if self.client_side:
+                # lay out all the syllables, since the displayed nodes are selected in the browser
+                node_mask, edge_mask = self.graph_model.get_masks((0, np.inf), (-np.inf, np.inf))
+                pos = self.get_layout_positions(self.graph_model.get_anchor_graph(node_mask, edge_mask), layout)
+                plot_transition_graph_model_client_side(self.graph_model, pos, edge_threshold, usage_threshold,
+                                                        plot_vertically=self.plot_vertically)
+                return
 
-            # Create graph with nodes and edges
-            ebunch_anchor, orphans = convert_transition_matrix_to_ebunch(
-                self.trans_mats[anchor], self.trans_mats[anchor], edge_threshold=edge_threshold,
-                keep_orphans=True, max_syllable=self.max_sylls, **usage_kwargs)
-            indices = [e[:-1] for e in ebunch_anchor]
-
-            # Get graph anchor
-            graph_anchor = convert_ebunch_to_graph(ebunch_anchor)
-
-            pos = get_pos(graph_anchor, layout=layout, nnodes=self.max_sylls)
-
-            # make transition graphs
-            group_names = self.group.copy()
-
-            # prepare transition graphs
-            usages, group_names, _, _, _, graphs, scalars = make_transition_graphs(self.trans_mats,
-                                                                                usages[:len(self.group)],
-                                                                                self.group,
-                                                                                group_names,
-                                                                                pos=pos,
-                                                                                indices=indices,
-                                                                                orphans=orphans,
-                                                                                edge_threshold=edge_threshold,
-                                                                                arrows=True,
-                                                                                scalars=scalars,
-                                                                                usage_kwargs=usage_kwargs,
-                                                                                )
+            node_mask, edge_mask = self.graph_model.get_masks(edge_threshold, usage_threshold)
+            pos = self.get_layout_positions(self.graph_model.get_anchor_graph(node_mask, edge_mask), layout)
 
             # interactive plot transition graphs
-            plot_interactive_transition_graph(graphs, pos, self.group,
-                                            group_names, usages, self.syll_info,
-                                            self.incoming_transition_entropy, self.outgoing_transition_entropy,
-                                            scalars=scalars, plot_vertically=self.plot_vertically)
\ No newline at end of file
+            self.plot_handle, self.rendered_graphs = plot_transition_graph_model(self.graph_model, pos, node_mask,
+                                                                                 edge_mask,
+                                                                                 plot_vertically=self.plot_vertically)
+
+    def on_threshold_update(self, change=None):
+        """
+        Threshold the displayed transition graphs with the current slider values, updating their data sources in place.
+
+        Args:
+        change (dict): ipywidgets change event of the edge or usage threshold slider.
+        """
+
+        if self.rendered_graphs is None:
+            return
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+
+            node_mask, edge_mask = self.graph_model.get_masks(self.edge_thresholder.value,
+                                                              self.usage_thresholder.value)
+            pos = self.get_layout_positions(self.graph_model.get_anchor_graph(node_mask, edge_mask),
+                                            self.graph_layout)
+
+            update_transition_graph_model_plots(self.graph_model, self.rendered_graphs, pos, node_mask, edge_mask,
+                                                handle=self.plot_handle)
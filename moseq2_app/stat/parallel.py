@@ -0,0 +1,210 @@
+"""
+Parallel Kruskal-Wallis and Dunn's permutation testing of syllable statistics.
+Follows the algorithm of moseq2_viz.model.stat.run_kruskal, spreading its permutation batches across processes.
+"""
+
+import itertools
+import numpy as np
+import pandas as pd
+from scipy.stats import kruskal
+from joblib import Parallel, delayed
+
+
+def rank_columns(values):
+    """
+    Rank the values of each column, assigning tied values the average of their ranks.
+    NaN values are ranked last, each with its own rank, like scipy.stats.rankdata.
+
+    Args:
+    values (2d numpy array): samples x columns array of values.
+
+    Returns:
+    ranks (2d numpy array): samples x columns array of ranks, starting from 1.
+    tie_sums (1d numpy array): sum of (t^3 - t) over the groups of t tied values in each column.
+    """
+
+    values = np.asarray(values, dtype='float64')
+    n = values.shape[0]
+
+    order = np.argsort(values, axis=0, kind='mergesort')
+    sorted_values = np.take_along_axis(values, order, axis=0)
+
+    # flag the sorted positions that start (or end) a run of tied values
+    pos = np.broadcast_to(np.arange(n)[:, None], values.shape)
+    starts = np.ones(values.shape, dtype='bool')
+    starts[1:] = sorted_values[1:] != sorted_values[:-1]
+    ends = np.ones(values.shape, dtype='bool')
+    ends[:-1] = starts[1:]
+
+    # first and last sorted position of the run each value belongs to
+    first = np.maximum.accumulate(np.where(starts, pos, 0), axis=0)
+    last = np.minimum.accumulate(np.where(ends, pos, n - 1)[::-1], axis=0)[::-1]
+
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=0)
+
+    # each of the t values in a run contributes t^2 - 1, summing to t^3 - t for the run
+    tie_sums = ((last - first + 1) ** 2 - 1).sum(axis=0)
+
+    return ranks, tie_sums
+
+
+def fdr_bh(pvals):
+    """
+    Apply the Benjamini-Hochberg false discovery rate correction along the last axis,
+     with the same arithmetic as statsmodels' multipletests(method='fdr_bh').
+
+    Args:
+    pvals (numpy array): p-values to correct.
+
+    Returns:
+    p_adj (numpy array): corrected p-values.
+    """
+
+    pvals = np.asarray(pvals, dtype='float64')
+    m = pvals.shape[-1]
+
+    order = np.argsort(pvals, axis=-1)
+    sorted_p = np.take_along_axis(pvals, order, axis=-1) / (np.arange(1, m + 1) / float(m))
+    # enforce monotonicity, starting from the largest p-value
+    sorted_p = np.minimum.accumulate(sorted_p[..., ::-1], axis=-1)[..., ::-1]
+
+    p_adj = np.empty_like(sorted_p)
+    np.put_along_axis(p_adj, order, np.minimum(sorted_p, 1), axis=-1)
+
+    return p_adj
+
+
+def _count_null_exceedances(ranks, kw_tie_correct, x_ties, cum_group_idx, n_per_group, h_real, kw_rand,
+                            pair_masks, pair_rand, real_zs):
+    """
+    Count how often the KW H statistics and Dunn's z statistics of a batch of permutations exceed the observed ones.
+
+    Args:
+    ranks (2d numpy array): sessions x syllables array of ranks, with the sessions sorted by group.
+    kw_tie_correct (1d numpy array): KW tie correction factor of each syllable.
+    x_ties (1d numpy array): Dunn's tie correction term of each syllable.
+    cum_group_idx (1d numpy array): offset of each group's first session, followed by the number of sessions.
+    n_per_group (1d numpy array): number of sessions in each group.
+    h_real (1d numpy array): observed H statistic of each syllable.
+    kw_rand (2d numpy array): permutations x sessions array of uniform draws, argsorted to permute all the sessions.
+    pair_masks (list): (session mask, number of sessions in the first group, B term) of each pair of groups.
+    pair_rand (list): permutations x pair sessions arrays of uniform draws, argsorted to permute each pair's sessions.
+    real_zs (list): observed Dunn's z statistics of each pair of groups.
+
+    Returns:
+    kw_counts (1d numpy array): number of permutations with an H statistic > the observed one, for each syllable.
+    dunn_counts (2d numpy array): pairs x syllables array of the number of permutations with a z statistic >
+     the observed one.
+    """
+
+    n_sessions, n_sylls = ranks.shape
+
+    # KW statistic of each permutation of all the sessions
+    perm_ranks = ranks[kw_rand.argsort(-1)]
+    ssbn = np.zeros((len(kw_rand), n_sylls))
+    for i in range(len(n_per_group)):
+        ssbn += perm_ranks[:, cum_group_idx[i]:cum_group_idx[i + 1]].sum(1) ** 2 / n_per_group[i]
+
+    h_all = 12.0 / (n_sessions * (n_sessions + 1)) * ssbn - 3 * (n_sessions + 1)
+    h_all /= kw_tie_correct
+    kw_counts = (h_all > h_real).sum(0)
+
+    # Dunn's statistic of each permutation of the sessions within each pair of groups
+    a = n_sessions * (n_sessions + 1.) / 12.
+    dunn_counts = np.zeros((len(pair_masks), n_sylls), dtype='int64')
+    for k, ((mask, n_i, b), rand, real_z) in enumerate(zip(pair_masks, pair_rand, real_zs)):
+        ranks_perm = ranks[mask][rand.argsort(-1)]
+        diff = np.abs(ranks_perm[:, :n_i, :].mean(1) - ranks_perm[:, n_i:, :].mean(1))
+        null_z = diff / np.sqrt((a - x_ties) * b)
+        dunn_counts[k] = (null_z > real_z).sum(0)
+
+    return kw_counts, dunn_counts
+
+
+def run_kruskal_parallel(stats_df, statistic='usage', max_syllable=40, n_perm=10000, seed=42, thresh=0.05,
+                         n_jobs=-1, batch_size=500):
+    """
+    Run a permutation Kruskal-Wallis test on each syllable's statistic, followed by a permutation Dunn's test
+     between every pair of groups, following moseq2_viz.model.stat.run_kruskal:
+     - KW p-values are the fraction of permutations of all the sessions with a larger H statistic,
+       corrected across syllables with the Benjamini-Hochberg procedure.
+     - Dunn's p-values are the fraction of permutations of each pair's sessions with a larger z statistic,
+       corrected across the pairs of groups of each syllable.
+    The random draws of all the permutations are generated upfront from the same seeded streams as run_kruskal,
+     then batches of permutations are evaluated across a process pool, so the results do not depend on n_jobs
+     or batch_size.
+
+    Args:
+    stats_df (pd.DataFrame): DataFrame containing the syllable statistics of each session.
+    statistic (str): name of the statistic to test.
+    max_syllable (int): maximum number of syllables to test.
+    n_perm (int): number of permutations used to compute the p-values.
+    seed (int): seed of the random number generators used to permute the sessions.
+    thresh (float): significance threshold of the corrected p-values.
+    n_jobs (int): number of processes to run the permutation batches with (-1 uses all cores).
+    batch_size (int): number of permutations evaluated within each batch.
+
+    Returns:
+    df_k_real (pd.DataFrame): KW H statistics, p-values, permutation corrected p-values and significance of each syllable.
+    dunn_results_df (pd.DataFrame): Dunn's test corrected p-values of each syllable for each pair of groups.
+    intersect_sig_syllables (dict): pairs of groups mapped to arrays of syllables significant in both tests.
+    """
+
+    stats_df = stats_df[stats_df['syllable'] < max_syllable]
+    grouped_data = stats_df.pivot_table(index=['group', 'uuid'], columns='syllable', values=statistic)
+
+    # sessions are sorted by group, so each group's sessions are contiguous
+    group_labels = grouped_data.index.get_level_values('group')
+    group_names = group_labels.unique()
+    vc = group_labels.value_counts()
+    n_per_group = vc.loc[group_names].to_numpy()
+    cum_group_idx = np.insert(np.cumsum(n_per_group), 0, 0)
+
+    values = grouped_data.to_numpy()
+    n_sessions, n_sylls = values.shape
+
+    ranks, tie_sums = rank_columns(values)
+    kw_tie_correct = 1.0 - tie_sums / (float(n_sessions) ** 3 - n_sessions)
+    x_ties = tie_sums / (12. * (n_sessions - 1))
+
+    df_k_real = pd.DataFrame([kruskal(*np.split(values[:, s], cum_group_idx[1:-1])) for s in range(n_sylls)])
+    h_real = df_k_real['statistic'].to_numpy()
+
+    # Dunn's observed statistics, and the sessions permuted within each pair of groups
+    a = n_sessions * (n_sessions + 1.) / 12.
+    pairs = list(itertools.combinations(group_names, 2))
+    pair_masks, real_zs = [], []
+    for g1, g2 in pairs:
+        is_i, is_j = np.asarray(group_labels == g1), np.asarray(group_labels == g2)
+        b = 1. / vc.loc[g1] + 1. / vc.loc[g2]
+        group_ranks = ranks[is_i | is_j]
+        real_diff = np.abs(group_ranks[:is_i.sum(), :].mean(0) - group_ranks[is_i.sum():, :].mean(0))
+        pair_masks.append((is_i | is_j, is_i.sum(), b))
+        real_zs.append(real_diff / np.sqrt((a - x_ties) * b))
+
+    # draw the permutations in the same order as run_kruskal
+    kw_rand = np.random.RandomState(seed=seed).rand(n_perm, n_sessions)
+    rnd = np.random.RandomState(seed=seed)
+    pair_rand = [rnd.rand(n_perm, mask.sum()) for mask, _, _ in pair_masks]
+
+    batches = [slice(start, min(start + batch_size, n_perm)) for start in range(0, n_perm, batch_size)]
+    counts = Parallel(n_jobs=n_jobs)(
+        delayed(_count_null_exceedances)(ranks, kw_tie_correct, x_ties, cum_group_idx, n_per_group, h_real,
+                                         kw_rand[batch], pair_masks, [r[batch] for r in pair_rand], real_zs)
+        for batch in batches)
+    kw_counts = np.sum([c[0] for c in counts], axis=0)
+    dunn_counts = np.sum([c[1] for c in counts], axis=0)
+
+    df_k_real['p_adj'] = fdr_bh((kw_counts + 1) / n_perm)
+    df_k_real['is_sig'] = df_k_real['p_adj'] <= thresh
+
+    # Dunn's p-values are corrected across the pairs of groups of each syllable
+    dunn_p = (dunn_counts.T + 1) / n_perm
+    dunn_results_df = pd.DataFrame(fdr_bh(dunn_p), columns=pd.MultiIndex.from_tuples(pairs))
+
+    intersect_sig_syllables = {}
+    for pair in pairs:
+        intersect_sig_syllables[pair] = np.where((dunn_results_df[pair] < thresh) & df_k_real['is_sig'])[0]
+
+    return df_k_real, dunn_results_df, intersect_sig_syllables
@@ -0,0 +1,385 @@
+"""
+Matrix-based transition graph model used to threshold and display the group transition graphs.
+"""
+
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix, issparse
+
+# session-level entropies keyed by (model path, model file modification time, max_sylls)
+_entropy_cache = {}
+
+
+def get_session_transition_counts(labels, max_sylls):
+    """
+    Count the syllable transitions and syllable usages of every session in a single pass over the concatenated labels.
+    Repeated labels are collapsed into one syllable instance, and transitions from or to negative labels
+     or syllables >= max_sylls are ignored.
+
+    Args:
+    labels (list): list of session syllable label arrays.
+    max_sylls (int): number of syllables to count.
+
+    Returns:
+    counts (3d numpy array): sessions x max_sylls x max_sylls array of (from, to) transition counts.
+    usages (2d numpy array): sessions x max_sylls array of syllable usage counts.
+    """
+
+    n_sessions = len(labels)
+    lengths = np.array([len(lbl) for lbl in labels], dtype='int64')
+    session = np.repeat(np.arange(n_sessions), lengths)
+    flat = np.concatenate([np.asarray(lbl, dtype='int64') for lbl in labels]) if n_sessions > 0 \
+        else np.zeros(0, dtype='int64')
+
+    # keep the first frame of every syllable instance
+    keep = np.ones(len(flat), dtype='bool')
+    keep[1:] = (flat[1:] != flat[:-1]) | (session[1:] != session[:-1])
+    flat, session = flat[keep], session[keep]
+
+    valid = (flat >= 0) & (flat < max_sylls)
+    usages = np.bincount(session[valid] * max_sylls + flat[valid],
+                         minlength=n_sessions * max_sylls).reshape(n_sessions, max_sylls)
+
+    # consecutive syllable instances within the same session
+    pairs = valid[:-1] & valid[1:] & (session[:-1] == session[1:])
+    idx = (session[:-1][pairs] * max_sylls + flat[:-1][pairs]) * max_sylls + flat[1:][pairs]
+    counts = np.bincount(idx, minlength=n_sessions * max_sylls ** 2).reshape(n_sessions, max_sylls, max_sylls)
+
+    return counts, usages
+
+
+def get_transition_entropies(counts, usages, eps=1e-100):
+    """
+    Compute the usage-weighted incoming and outgoing transition entropy of every syllable in every session.
+
+    Args:
+    counts (3d numpy array): sessions x syllables x syllables array of (from, to) transition counts.
+    usages (2d numpy array): sessions x syllables array of syllable usage counts.
+    eps (float): small value added to avoid divisions by zero and log(0).
+
+    Returns:
+    incoming (2d numpy array): sessions x syllables array of incoming transition entropies.
+    outgoing (2d numpy array): sessions x syllables array of outgoing transition entropies.
+    """
+
+    counts = np.asarray(counts, dtype='float64')
+    usages = np.asarray(usages, dtype='float64') + eps
+    usages /= usages.sum(axis=1, keepdims=True)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # P(from | to), weighted by the usage of the source syllable
+        p_in = counts / counts.sum(axis=1, keepdims=True)
+        incoming = -np.nansum(usages[:, :, None] * p_in * np.log2(p_in + eps), axis=1)
+
+        # P(to | from), weighted by the usage of the target syllable
+        p_out = counts / counts.sum(axis=2, keepdims=True)
+        outgoing = -np.nansum(usages[:, None, :] * p_out * np.log2(p_out + eps), axis=2)
+
+    return incoming, outgoing
+
+
+def compute_group_transition_entropies(labels, label_group, group, max_sylls, cache_key=None):
+    """
+    Compute the mean incoming and outgoing transition entropies of each group from a single
+     sessions x syllables x syllables transition count tensor.
+    Only the session entropies are cached, the group means are recomputed from the current session groups,
+     such that regrouping the sessions in the index updates the results.
+    Unlike transition_entropy(relabel_by='usage'), the labels are not relabeled by each group's own usage, so the
+     entropies of syllable i belong to the same syllable in every group, matching the graph nodes.
+
+    Args:
+    labels (list): list of session syllable label arrays, relabeled by usage.
+    label_group (list): group name of each session.
+    group (list): list of unique group names to compute the entropies for.
+    max_sylls (int): number of syllables to compute the entropies for.
+    cache_key (hashable): key identifying the labels (e.g. the model path and modification time).
+     Session entropies computed with the same key and max_sylls are reused.
+
+    Returns:
+    incoming (list): list of incoming transition entropy arrays, one per group.
+    outgoing (list): list of outgoing transition entropy arrays, one per group.
+    """
+
+    key = None if cache_key is None else (cache_key, max_sylls)
+    if key is not None and key in _entropy_cache:
+        session_in, session_out = _entropy_cache[key]
+    else:
+        counts, usages = get_session_transition_counts(labels, max_sylls)
+        session_in, session_out = get_transition_entropies(counts, usages)
+        if key is not None:
+            _entropy_cache[key] = (session_in, session_out)
+
+    label_group = np.asarray(label_group)
+    incoming = [session_in[label_group == g].mean(axis=0) for g in group]
+    outgoing = [session_out[label_group == g].mean(axis=0) for g in group]
+
+    return incoming, outgoing
+
+
+class TransitionGraphModel:
+
+    def __init__(self, trans_mats, usages, group, scalars=None, incoming_entropy=None, outgoing_entropy=None,
+                 syll_info=None, anchor=0, pairs=None, sparse=False):
+        """
+        Hold the transition matrices, node usages and node statistics of every group graph as stacked numpy arrays,
+         such that thresholding the graphs only computes boolean masks.
+        Difference graphs hold the values of group j - group i for each displayed pair of groups (i, j),
+         and are only computed when their data is requested.
+
+        Args:
+        trans_mats (list): list of (max_sylls x max_sylls) group transition matrices.
+        usages (2d numpy array): groups x max_sylls array of normalized syllable usages.
+        group (list): list of unique group names corresponding to the transition matrices.
+        scalars (dict): scalar names mapped to groups x max_sylls arrays of mean syllable scalars.
+        incoming_entropy (list): list of incoming transition entropies of each group.
+        outgoing_entropy (list): list of outgoing transition entropies of each group.
+        syll_info (dict): dict of syllable label information to display with the HoverTool.
+        anchor (int): index of the group whose transition probabilities and usages are thresholded.
+        pairs (list): list of (i, j) group index pairs to display difference graphs for, defaults to all pairs with i < j.
+        sparse (bool): indicates to store the group transition matrices as scipy sparse matrices.
+        """
+
+        self.group = list(group)
+        self.anchor = anchor
+        self.sparse = sparse
+
+        # groups x syllables x syllables transition probabilities
+        trans_mats = np.asarray(trans_mats, dtype='float64')
+        usages = np.asarray(usages, dtype='float64')
+        n_groups = len(self.group)
+        self.n_sylls = trans_mats.shape[1]
+
+        if pairs is None:
+            pairs = [(i, j) for i in range(n_groups) for j in range(i + 1, n_groups)]
+        self.pairs = [(int(i), int(j)) for i, j in pairs]
+        self.graph_names = self.group + [f'{self.group[j]} - {self.group[i]}' for i, j in self.pairs]
+        self.is_difference = np.arange(len(self.graph_names)) >= n_groups
+
+        self.anchor_weights = trans_mats[anchor]
+        self.anchor_usages = usages[anchor]
+
+        if sparse:
+            self.trans_mats = [csr_matrix(tm) for tm in trans_mats]
+        else:
+            self.trans_mats = trans_mats
+        # difference transition matrices of the pairs requested so far
+        self.difference_cache = {}
+
+        self.usages = usages
+        self.scalars = {k: np.asarray(v, dtype='float64') for k, v in (scalars or {}).items()}
+        for k in ('duration', 'speeds_2d', 'speeds_3d', 'heights', 'dists'):
+            self.scalars.setdefault(k, np.full((n_groups, self.n_sylls), np.nan))
+
+        def as_group_array(entropies):
+            arr = np.full((n_groups, self.n_sylls), np.nan)
+            for k, e in enumerate((entropies or [])[:n_groups]):
+                e = np.asarray(e, dtype='float64')[:self.n_sylls]
+                arr[k, :len(e)] = e
+            return arr
+
+        self.incoming_entropy = as_group_array(incoming_entropy)
+        self.outgoing_entropy = as_group_array(outgoing_entropy)
+
+        syll_info = syll_info or {}
+        self.labels = [syll_info.get(s, {}).get('label', '') for s in range(self.n_sylls)]
+        self.descs = [syll_info.get(s, {}).get('desc', '') for s in range(self.n_sylls)]
+        self.movies = [syll_info.get(s, {}).get('crowd_movie_path', '') for s in range(self.n_sylls)]
+
+    def get_graph_values(self, arr, k):
+        """
+        Get the values of a graph from a groups x syllables array, computing the group difference of difference graphs.
+
+        Args:
+        arr (2d numpy array): groups x syllables array of node values.
+        k (int): index of the group graph or difference graph.
+
+        Returns:
+        values (1d numpy array): node values of the graph.
+        """
+
+        if k < len(self.group):
+            return arr[k]
+        i, j = self.pairs[k - len(self.group)]
+        return arr[j] - arr[i]
+
+    def get_transition_matrix(self, k):
+        """
+        Get the (possibly sparse) transition matrix of a graph. Difference matrices are computed once, upon request.
+
+        Args:
+        k (int): index of the group graph or difference graph.
+
+        Returns:
+        trans_mat (numpy array or scipy.sparse.csr_matrix): syllables x syllables transition matrix.
+        """
+
+        if k < len(self.group):
+            return self.trans_mats[k]
+        if k not in self.difference_cache:
+            i, j = self.pairs[k - len(self.group)]
+            self.difference_cache[k] = self.trans_mats[j] - self.trans_mats[i]
+        return self.difference_cache[k]
+
+    def get_weights(self, k):
+        """
+        Get the dense transition matrix of a graph.
+
+        Args:
+        k (int): index of the group graph or difference graph.
+
+        Returns:
+        weights (2d numpy array): syllables x syllables transition probabilities (or their differences).
+        """
+
+        tm = self.get_transition_matrix(k)
+        return tm.toarray() if issparse(tm) else np.array(tm)
+
+    def get_edge_weights(self, k, starts, ends):
+        """
+        Get the transition weights of a graph for a set of edges.
+
+        Args:
+        k (int): index of the group graph or difference graph.
+        starts (1d numpy array): source syllable of each edge.
+        ends (1d numpy array): target syllable of each edge.
+
+        Returns:
+        weights (1d numpy array): transition weight of each edge.
+        """
+
+        if len(starts) == 0:
+            return np.zeros(0)
+        tm = self.get_transition_matrix(k)
+        return np.asarray(tm[starts, ends], dtype='float64').ravel()
+
+    def get_masks(self, edge_threshold, usage_threshold):
+        """
+        Threshold the anchor group's syllable usages and transition probabilities.
+        All the group graphs and difference graphs share the resulting nodes and edges.
+
+        Args:
+        edge_threshold (tuple): (min, max] range of transition probabilities to include.
+        usage_threshold (tuple): [min, max] range of syllable usages to include.
+
+        Returns:
+        node_mask (1d numpy array): boolean array indicating the included syllables.
+        edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+        """
+
+        node_mask = (self.anchor_usages >= usage_threshold[0]) & (self.anchor_usages <= usage_threshold[1])
+        edge_mask = (self.anchor_weights > edge_threshold[0]) & (self.anchor_weights <= edge_threshold[1])
+        edge_mask &= node_mask[:, None] & node_mask[None, :]
+
+        return node_mask, edge_mask
+
+    def get_anchor_graph(self, node_mask, edge_mask):
+        """
+        Create the thresholded anchor graph used to compute the node layout.
+
+        Args:
+        node_mask (1d numpy array): boolean array indicating the included syllables.
+        edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+
+        Returns:
+        graph (nx.DiGraph): anchor group transition graph.
+        """
+
+        graph = nx.DiGraph()
+        graph.add_nodes_from(np.flatnonzero(node_mask).tolist())
+        starts, ends = np.nonzero(edge_mask)
+        graph.add_weighted_edges_from(zip(starts.tolist(), ends.tolist(), self.anchor_weights[starts, ends].tolist()))
+
+        return graph
+
+    def get_node_data(self, i, node_mask, edge_mask):
+        """
+        Compute the node data source columns of a graph.
+
+        Args:
+        i (int): index of the group graph or difference graph.
+        node_mask (1d numpy array): boolean array indicating the included syllables.
+        edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+
+        Returns:
+        node_data (dict): column names mapped to lists of values for each included syllable.
+        """
+
+        nodes = np.flatnonzero(node_mask)
+        usages = np.nan_to_num(self.get_graph_values(self.usages, i)[nodes])
+
+        # neighboring syllables sorted by descending transition weight, then by syllable number
+        starts, ends = np.nonzero(edge_mask)
+        weights = self.get_edge_weights(i, starts, ends)
+        next_order = ends[np.lexsort((ends, -weights, starts))]
+        prev_order = starts[np.lexsort((starts, -weights, ends))]
+        next_split = np.cumsum(np.bincount(starts, minlength=self.n_sylls)[nodes])[:-1]
+        prev_split = np.cumsum(np.bincount(ends, minlength=self.n_sylls)[nodes])[:-1]
+
+        def node_values(arr):
+            return np.nan_to_num(self.get_graph_values(arr, i)[nodes]).tolist()
+
+        if self.is_difference[i]:
+            node_color = np.where(usages > 0, 'blue', 'red')
+            node_size = np.maximum(15., 15 + np.abs(usages * 1000))
+        else:
+            node_color = np.full(len(nodes), 'red')
+            node_size = np.maximum(15., np.abs(usages * 1000))
+
+        node_data = {
+            'index': nodes.tolist(),
+            'number': nodes.tolist(),
+            'label': [self.labels[n] for n in nodes],
+            'desc': [self.descs[n] for n in nodes],
+            'movies': [self.movies[n] for n in nodes],
+            'prev': [o.tolist() for o in np.split(prev_order, prev_split)] if len(nodes) > 0 else [],
+            'next': [o.tolist() for o in np.split(next_order, next_split)] if len(nodes) > 0 else [],
+            'usage': usages.tolist(),
+            'duration': node_values(self.scalars['duration']),
+            'speed_2d': node_values(self.scalars['speeds_2d']),
+            'speed_3d': node_values(self.scalars['speeds_3d']),
+            'height': node_values(self.scalars['heights']),
+            'dist_to_center_px': node_values(self.scalars['dists']),
+            'ent_in': node_values(self.incoming_entropy),
+            'ent_out': node_values(self.outgoing_entropy),
+            'node_color': node_color.tolist(),
+            'node_size': node_size.tolist(),
+        }
+
+        return node_data
+
+    def get_edge_data(self, i, edge_mask):
+        """
+        Compute the edge data source columns of a graph.
+
+        Args:
+        i (int): index of the group graph or difference graph.
+        edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+
+        Returns:
+        edge_data (dict): column names mapped to lists of values for each included transition.
+        """
+
+        starts, ends = np.nonzero(edge_mask)
+        weights = self.get_edge_weights(i, starts, ends)
+
+        if self.is_difference[i]:
+            edge_color = np.where(weights > 0, 'blue', 'red')
+            edge_width = np.abs(weights * 400)
+        else:
+            edge_color = np.full(len(weights), 'black')
+            edge_width = weights * 250
+
+        # bidirectional transitions are green, others are colored by the direction relative to the syllable order
+        bidirectional = edge_mask[ends, starts]
+        line_color = np.where(bidirectional, 'green', np.where(starts > ends, 'purple', 'orange'))
+
+        edge_data = {
+            'start': starts.tolist(),
+            'end': ends.tolist(),
+            'weight': weights.tolist(),
+            'edge_color': edge_color.tolist(),
+            'edge_width': edge_width.tolist(),
+            'line_color': line_color.tolist(),
+        }
+
+        return edge_data
@@ -19,15 +19,21 @@ from bokeh.palettes import Spectral4, Set1_9, Set2_8, Set3_12, Colorblind8
 from bokeh.transform import linear_cmap
 from bokeh.models.tickers import FixedTicker
 from bokeh.plotting import figure, show, from_networkx
-from moseq2_app.stat.widgets import SyllableStatBokehCallbacks
+from moseq2_app.stat.widgets import SyllableStatBokehCallbacks, TransitionGraphBokehCallbacks
 from bokeh.models import (ColumnDataSource, LabelSet, BoxSelectTool, Circle, ColorBar, RangeSlider, CustomJS, TextInput,
-                          Legend, LegendItem, HoverTool, MultiLine, NodesAndLinkedEdges, TapTool)
-from moseq2_viz.util import get_sorted_index, read_yaml
+                          Legend, LegendItem, HoverTool, MultiLine, NodesAndLinkedEdges, TapTool, GraphRenderer,
+                          StaticLayoutProvider)
+from bokeh.io import push_notebook
+from bokeh.core.properties import value
+from moseq2_app.context import get_data_context
 from scipy.cluster.hierarchy import linkage, dendrogram
 from scipy.spatial.distance import squareform
 from moseq2_viz.model.dist import get_behavioral_distance
 
 
+# syllable statistics displayed in the HoverTool of the syllable statistics plot
+_aux_stats = ['usage', 'duration', 'velocity_2d_mm_mean', 'velocity_3d_mm_mean', 'height_ave_mm_mean', 'dist_to_center_px_mean']
+
 def colorscale(hexstr, scalefactor):
     """
     Scale a hex string by scalefactor. Returns scaled hex string.
@@ -79,6 +85,104 @@ def get_ci_vect_vectorized(x, n_boots=10000, n_samp=None, function=np.nanmean, p
     percentile = np.percentile(boots, [pct, 100 - pct])
     return percentile
 
+def get_ci_vect_batched(values, cells, n_boots=10000, pct=5, seed=0, chunk_size=2 ** 21):
+    """
+    Compute min and max values within a (default) 95th percentile for many cells and statistics in one pass.
+    Cells holding the same number of samples share the bootstrap resampling counts, so their bootstrapped
+    nan-means are computed with matrix products. Rows and bootstraps are processed in chunks holding at most
+    chunk_size values, which bounds the memory used regardless of the number of cells.
+
+    Args:
+    values (2d numpy array): samples x statistics array of values.
+    cells (1d numpy array): cell (e.g. group and syllable) index of each sample.
+    n_boots (int): Number of bootstrapped examples to generate to compute the percentile.
+    pct (int): Percentile to compute.
+    seed (int): Seed of the random number generator used to draw the bootstrap samples.
+    chunk_size (int): Maximum number of values held by each intermediate array.
+
+    Returns:
+    cell_ids (1d numpy array): sorted unique cell indices.
+    percentile (3d numpy array): cells x statistics x 2 array of min and max values.
+    """
+
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        values = values[:, None]
+    pct /= 2
+
+    cell_ids, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+    # sample rows ordered by cell, and the offset of each cell's first sample
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    n_stats = values.shape[1]
+    # number of cells whose bootstrapped statistics are held at once
+    cell_chunk = max(1, chunk_size // (n_boots * n_stats))
+
+    percentile = np.full((len(cell_ids), n_stats, 2), np.nan)
+    for n in np.unique(counts):
+        sel = np.flatnonzero(counts == n)
+        # bootstrap iterations whose resampling counts are held at once
+        boot_chunk = int(min(n_boots, max(1, chunk_size // n)))
+
+        for c0 in range(0, len(sel), cell_chunk):
+            cells_chunk = sel[c0:c0 + cell_chunk]
+            # (cells, statistics, samples) block of values
+            block = values[order[starts[cells_chunk][:, None] + np.arange(n)]].transpose(0, 2, 1).reshape(-1, n)
+            finite = np.isfinite(block)
+            sums, valid = np.where(finite, block, 0), finite.astype('float64')
+
+            boots = np.empty((len(block), n_boots))
+            for j, b0 in enumerate(range(0, n_boots, boot_chunk)):
+                b1 = min(b0 + boot_chunk, n_boots)
+                # resampling counts only depend on the sample size and bootstrap chunk,
+                # so every cell chunk of the same size is resampled identically
+                rng = np.random.default_rng([seed, n, j])
+
+                # number of times each sample is drawn in each bootstrap iteration
+                draws = rng.integers(n, size=(b1 - b0, n)) + n * np.arange(b1 - b0)[:, None]
+                weights = np.bincount(draws.ravel(), minlength=n * (b1 - b0)).reshape(b1 - b0, n).T
+                weights = weights.astype('float64')
+
+                # bootstrapped nan-means: sums of finite values over counts of finite values
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    boots[:, b0:b1] = (sums @ weights) / (valid @ weights)
+
+            ci = np.percentile(boots, [pct, 100 - pct], axis=1).T
+            percentile[cells_chunk] = ci.reshape(len(cells_chunk), n_stats, 2)
+
+    return cell_ids, percentile
+
+def get_bootstrap_cis(df, groupby='group', stats=('usage',), n_boots=10000, pct=5, seed=0):
+    """
+    Compute the bootstrapped confidence intervals of the given statistics for every (groupby, syllable) pair.
+
+    Args:
+    df (pd.DataFrame): DataFrame containing the syllable statistics of each session.
+    groupby (str): column to group the syllable stats by.
+    stats (list): names of the statistics to compute confidence intervals for.
+    n_boots (int): Number of bootstrapped examples to generate to compute the percentile.
+    pct (int): Percentile to compute.
+    seed (int): Seed of the random number generator used to draw the bootstrap samples.
+
+    Returns:
+    cis (dict): group names mapped to dicts of statistic names -> pd.Series of [min, max] arrays indexed by syllable.
+    """
+
+    stats = list(stats)
+    cells, keys = pd.MultiIndex.from_frame(df[[groupby, 'syllable']]).factorize()
+    cell_ids, percentile = get_ci_vect_batched(df[stats].to_numpy(dtype='float64'), cells,
+                                               n_boots=n_boots, pct=pct, seed=seed)
+    keys = keys[cell_ids]
+
+    cis = {}
+    for group in keys.get_level_values(0).unique():
+        mask = np.asarray(keys.get_level_values(0) == group)
+        sylls = keys.get_level_values(1)[mask]
+        cis[group] = {s: pd.Series(list(percentile[mask, i]), index=sylls).sort_index() for i, s in enumerate(stats)}
+
+    return cis
+
 def setup_syllable_search(src_dict, err_dict, err_source, searchbox, circle, line):
     """
     Initializes the CustomJS script callback function used to update the plot upon changing the value of the TextInput.
@@ -184,7 +288,69 @@ def setup_hovertool(renderers, callback=None):
 
     return hover
 
-def get_aux_stat_dfs(df, group, sorting, groupby='group', errorbar='CI 95%', stat='usage'):
+def compute_syllable_aggregates(df, groupby='group', errorbar='CI 95%', stats=('usage',)):
+    """
+    Compute the per-(group, syllable) means and error values of the syllable statistics,
+     such that redrawing the statistics plot only requires slicing the precomputed tables.
+    Bootstrapped confidence intervals are only computed for the given statistics, use add_bootstrap_cis()
+     to compute them for other statistics later on.
+
+    Args:
+    df (pd.DataFrame): DataFrame containing the syllable statistics of each session.
+    groupby (str): column to group the syllable stats by.
+    errorbar (str): name of the error bar type to compute values for.
+    stats (list): names of the statistics to compute bootstrapped confidence intervals for.
+
+    Returns:
+    aggregates (dict): group names mapped to dicts with the keys 'mean' (pd.DataFrame of mean syllable statistics)
+     and 'err' (pd.DataFrame of SEM/STD values, or dict of statistic name -> pd.Series of confidence intervals).
+    """
+
+    grouped = df.groupby([groupby, 'syllable'])
+    means = grouped.mean()
+
+    if errorbar == 'CI 95%':
+        errs = get_bootstrap_cis(df, groupby=groupby, stats=[s for s in dict.fromkeys(stats) if s in df.columns])
+    elif errorbar == 'SEM':
+        errs = grouped.sem()
+    else:
+        errs = grouped.std()
+
+    aggregates = {}
+    for group in means.index.unique(level=0):
+        aggregates[group] = {
+            'mean': means.xs(group, level=0).reset_index(),
+            'err': errs.get(group, {}) if errorbar == 'CI 95%' else errs.xs(group, level=0),
+        }
+
+    return aggregates
+
+def add_bootstrap_cis(aggregates, df, groupby='group', stats=('usage',)):
+    """
+    Add the bootstrapped confidence intervals of the given statistics to CI 95% aggregates, in place.
+    Only the statistics that are missing from the aggregates are computed.
+
+    Args:
+    aggregates (dict): output of compute_syllable_aggregates(df, groupby, 'CI 95%').
+    df (pd.DataFrame): DataFrame containing the syllable statistics of each session.
+    groupby (str): column to group the syllable stats by.
+    stats (list): names of the statistics to compute bootstrapped confidence intervals for.
+
+    Returns:
+    aggregates (dict): the updated aggregates.
+    """
+
+    missing = [s for s in dict.fromkeys(stats)
+               if s in df.columns and any(s not in agg['err'] for agg in aggregates.values())]
+
+    if len(missing) > 0:
+        cis = get_bootstrap_cis(df, groupby=groupby, stats=missing)
+        for group, agg in aggregates.items():
+            agg['err'].update(cis.get(group, {}))
+
+    return aggregates
+
+def get_aux_stat_dfs(df, group, sorting, groupby='group', errorbar='CI 95%', stat='usage', aggregates=None):
     """
     Compute the group-specific syllable statistics dataframe, and the selected error values to later draw the line plot and error bars.
 
@@ -195,6 +361,7 @@ def get_aux_stat_dfs(df, group, sorting, groupby='group', errorbar='CI 95%', sta
     groupby (str): column to group the syllable stats by.
     errorbar (str): name of the error bar type to compute values for.
     stat (str): name of the statistic to plot.
+    aggregates (dict): optional precomputed output of compute_syllable_aggregates(df, groupby, errorbar).
 
     Returns:
     aux_df (pd.DataFrame): dataframe that only contains the selected group's mean statistics.
@@ -203,26 +370,24 @@ def get_aux_stat_dfs(df, group, sorting, groupby='group', errorbar='CI 95%', sta
     errs_x (list): list of x-indices to plot the error bar lines within.
     errs_y (list): list of y-indices to plot the error bar lines within.
     """
-    
-    # Get group specific dataframe indices
-    df_group = df[df[groupby] == group]
-    grouped = df_group.groupby('syllable')[[stat]]
+
+    if aggregates is None:
+        aggregates = compute_syllable_aggregates(df[df[groupby] == group], groupby, errorbar, stats=[stat])
+    group_agg = aggregates[group]
 
     # Get resorted mean syllable data
-    aux_df = df_group.groupby('syllable', as_index=False).mean().reindex(sorting)
+    aux_df = group_agg['mean'].reindex(sorting)
 
     # Get SEM
     if errorbar == 'CI 95%':
-        stat_err = df_group.groupby('syllable')[stat].apply(get_ci_vect_vectorized).reindex(sorting)
-        aux_err = {}
-        for s in ['usage', 'duration', 'velocity_2d_mm_mean', 'velocity_3d_mm_mean', 'height_ave_mm_mean', 'dist_to_center_px_mean']:
-            aux_err[s] = df_group.groupby('syllable')[s].apply(get_ci_vect_vectorized).reindex(sorting)
-    elif errorbar == 'SEM':
-        stat_err = grouped.sem().reindex(sorting)
-        aux_err = df_group.groupby('syllable', as_index=False).sem().reindex(sorting)
+        stat_err = group_agg['err'][stat].reindex(sorting)
+        # the intervals of the statistics that are not displayed are only computed once they are selected
+        missing = pd.Series([(np.nan, np.nan)] * len(sorting), index=sorting)
+        aux_err = {s: group_agg['err'][s].reindex(sorting) if s in group_agg['err'] else missing
+                   for s in dict.fromkeys(_aux_stats + list(group_agg['err']))}
     else:
-        stat_err = grouped.std().reindex(sorting)
-        aux_err = df_group.groupby('syllable', as_index=False).std().reindex(sorting)
+        stat_err = group_agg['err'][[stat]].reindex(sorting)
+        aux_err = group_agg['err'].reset_index().reindex(sorting)
 
     # Get min and max error bar values
     if errorbar == 'CI 95%':
@@ -334,7 +499,8 @@ def get_datasources(aux_df, aux_sem, sem, labels, desc, cm_paths, errs_x, errs_y
 
     return source, src_dict, err_source, err_dict
 
-def draw_stats(fig, df, groups, colors, sorting, groupby, stat, errorbar, line_dash='solid', thresh_stat='usage', sig_sylls=[]):
+def draw_stats(fig, df, groups, colors, sorting, groupby, stat, errorbar, line_dash='solid', thresh_stat='usage', sig_sylls=[],
+               aggregates=None):
     """
     iterate through the given DataFrame and plots the data grouped by specified column ('group', 'SessionName', 'SubjectName'), with the errorbars
 
@@ -347,6 +513,7 @@ def draw_stats(fig, df, groups, colors, sorting, groupby, stat, errorbar, line_d
     groupby (str): string that indicates which DataFrame column is being grouped.
     stat (str): String that indicates the statistic that is being plotted.
     errorbar (str): String that indicates the type of error bars to be plotted.
+    aggregates (dict): optional precomputed output of compute_syllable_aggregates(df, groupby, errorbar).
 
     Returns:
     pickers (list of ColorPickers): List of interactive color picker widgets to update the graph colors.
@@ -359,12 +526,17 @@ def draw_stats(fig, df, groups, colors, sorting, groupby, stat, errorbar, line_d
 
     searchbox = TextInput(value='', title='Syllable to Display:')
 
-    for group, color in zip(groups, colors):
+    # aggregate all the drawn groups at once
+    if aggregates is None:
+        aggregates = compute_syllable_aggregates(df[df[groupby].isin(groups)], groupby, errorbar, stats=[stat])
 
-        aux_df, sem, aux_sem, errs_x, errs_y = get_aux_stat_dfs(df, group, sorting, groupby, errorbar, stat)
+    # get syllable info
+    labels, desc, cm_paths = get_syllable_info(df, sorting)
 
-        # get syllable info
-        labels, desc, cm_paths = get_syllable_info(df, sorting)
+    for group, color in zip(groups, colors):
+
+        aux_df, sem, aux_sem, errs_x, errs_y = get_aux_stat_dfs(df, group, sorting, groupby, errorbar, stat,
+                                                                aggregates=aggregates)
 
         # get bokeh data sources
         source, src_dict, err_source, err_dict = get_datasources(aux_df, aux_sem, sem,
@@ -509,7 +681,7 @@ def format_stat_plot(p, df, searchbox, slider, sorting):
     return graph_n_pickers
 
 def bokeh_plotting(df, stat, sorting, mean_df=None, groupby='group', errorbar='SEM',
-                   syllable_families=None, sort_name='usage', thresh='usage', sig_sylls=[]):
+                   syllable_families=None, sort_name='usage', thresh='usage', sig_sylls=[], aggregates=None):
     """
     Generate a Bokeh plot with interactive tools such as the HoverTool
 
@@ -521,6 +693,8 @@ def bokeh_plotting(df, stat, sorting, mean_df=None, groupby='group', errorbar='S
     errorbar (str): Error bar type to display
     sort_name (str): Syllable sorting name displayed in title.
     thresh (str): Statistic to threshold syllables by using the Range Slider
+    aggregates (dict): optional dict of grouping column names -> precomputed compute_syllable_aggregates() output,
+     reused across redraws.
 
     Returns:
     p (bokeh figure): Displayed stat plot with optional color pickers.
@@ -537,16 +711,21 @@ def bokeh_plotting(df, stat, sorting, mean_df=None, groupby='group', errorbar='S
                y_axis_label=f'{stat}',
                output_backend="svg")
 
+    if aggregates is None:
+        aggregates = {}
+
     # get default colors to display each group's line plots
     groups, group_colors, colors = set_grouping_colors(df, groupby)
 
     if groupby != 'group':
         # draw session based statistics, without returning individual bokeh widgets to display
         draw_stats(p, mean_df, list(df.group.unique()), group_colors, sorting, 'group',
-                   stat, errorbar, line_dash='dashed', thresh_stat=thresh, sig_sylls=sig_sylls)
+                   stat, errorbar, line_dash='dashed', thresh_stat=thresh, sig_sylls=sig_sylls,
+                   aggregates=aggregates.get('group'))
 
     # draw line plots, setup hovertool, thresholding slider and group color pickers
-    slider, searchbox = draw_stats(p, df, groups, colors, sorting, groupby, stat, errorbar, thresh_stat=thresh, sig_sylls=sig_sylls)
+    slider, searchbox = draw_stats(p, df, groups, colors, sorting, groupby, stat, errorbar, thresh_stat=thresh,
+                                   sig_sylls=sig_sylls, aggregates=aggregates.get(groupby))
 
     # Format Bokeh plot with widgets
     graph_n_pickers = format_stat_plot(p, df, searchbox, slider, sorting)
@@ -1278,6 +1457,277 @@ def plot_interactive_transition_graph(graphs, pos, group, group_names, usages,
     gp = gridplot(formatted_plots, sizing_mode='scale_both', ncols=ncols, plot_width=plot_width, plot_height=plot_height)
     show(gp)
 
+def get_static_layout(pos):
+    """
+    Convert node positions to the JSON serializable layout used by the Bokeh StaticLayoutProvider.
+
+    Args:
+    pos (dict): node indices mapped to their (x, y) positions.
+
+    Returns:
+    graph_layout (dict): node indices mapped to [x, y] lists.
+    """
+
+    return {int(k): [float(v[0]), float(v[1])] for k, v in pos.items()}
+
+def update_info_legend(info_legend, edge_width, difference_graph=False):
+    """
+    Update the min and max transition probability legend items of a transition graph in place.
+
+    Args:
+    info_legend (bokeh Legend instance): Legend created by get_legend_items()
+    edge_width (dict): dict of edges mapped to float values describing edge widths.
+    difference_graph (bool): indicator for whether the legend belongs to a difference graph.
+    """
+
+    if difference_graph:
+        min_down_tp, max_down_tp, min_up_tp, max_up_tp = get_minmax_tp(edge_width, diff=True)
+        entries = [(f"Min Up-regulated P(transition): {min_up_tp:.4f}", min_up_tp * 350),
+                   (f"Max Up-regulated P(transition): {max_up_tp:.4f}", max_up_tp * 350),
+                   (f"Min Down-regulated P(transition): {min_down_tp:.4f}", min_down_tp * 350),
+                   (f"Max Down-regulated P(transition): {max_down_tp:.4f}", max_down_tp * 350)]
+    else:
+        min_tp, max_tp = get_minmax_tp(edge_width, diff=False)
+        entries = [(f"Min P(transition): {min_tp:.4f}", min_tp * 200),
+                   (f"Max P(transition): {max_tp:.4f}", max_tp * 200)]
+
+    for item, (label, width) in zip(info_legend.items, entries):
+        item.label = value(label)
+        item.renderers[0].glyph.line_width = width
+
+def draw_transition_graph_plots(model, pos, node_mask, edge_mask, scalar_color='default', plot_vertically=False,
+                                legend_loc='above'):
+    """
+    Draw all the group transition graphs and difference graphs of a TransitionGraphModel into a grid of Bokeh figures.
+
+    Args:
+    model (TransitionGraphModel): transition graph model holding the group and difference transition matrices.
+    pos (dict): shared node position coordinates layout object.
+    node_mask (1d numpy array): boolean array indicating the included syllables.
+    edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+    scalar_color (str): name of scalar to color nodes by.
+    plot_vertically (bool): indicates to stack the graphs in a single column.
+    legend_loc (str): location of the main legend relative to each plot.
+
+    Returns:
+    gp (bokeh gridplot): grid of the drawn transition graphs.
+    rendered (list): list of dicts with the graph renderer, label data source and info legend of each plot.
+    """
+
+    if plot_vertically:
+        legend_loc = 'right'
+
+    graph_layout = get_static_layout(pos)
+    rendered, plots = [], []
+
+    for i, name in enumerate(model.graph_names):
+
+        difference_graph = bool(model.is_difference[i])
+
+        # initialize bokeh plot with title and joined panning/zooming coordinates
+        if len(plots) == 0:
+            plot = figure(title=f"{name}", x_range=(-1.2, 1.2), y_range=(-1.2, 1.2), output_backend="svg")
+        else:
+            # Connecting pan-zoom interaction across plots
+            plot = figure(title=f"{name}", x_range=plots[0].x_range, y_range=plots[0].y_range, output_backend="svg")
+
+        # format the plot and set up the tooltips
+        format_plot(plot)
+        setup_trans_graph_tooltips(plot)
+
+        node_data = model.get_node_data(i, node_mask, edge_mask)
+        edge_data = model.get_edge_data(i, edge_mask)
+
+        graph_renderer = GraphRenderer()
+        graph_renderer.node_renderer.data_source.data = node_data
+        graph_renderer.edge_renderer.data_source.data = edge_data
+        graph_renderer.layout_provider = StaticLayoutProvider(graph_layout=graph_layout)
+
+        group_stats = {
+            'speed_2d': node_data['speed_2d'],
+            'speed_3d': node_data['speed_3d'],
+            'duration': node_data['duration'],
+            'height': node_data['height'],
+            'dist': node_data['dist_to_center_px'],
+            'incoming_transition_entropy': node_data['ent_in'],
+            'outgoing_transition_entropy': node_data['ent_out'],
+        }
+        graph_renderer, color_bar = setup_node_and_edge_interactions(graph_renderer, group_stats, scalar_color)
+
+        plot.renderers.append(graph_renderer)
+
+        # draw the syllable numbers on each node
+        x, y = zip(*[graph_layout[n] for n in node_data['index']]) if len(node_data['index']) > 0 else ([], [])
+        labels = set_node_labels(list(x), list(y), [str(n) for n in node_data['index']])
+        plot.renderers.append(labels)
+
+        # get plot legends
+        edge_width = dict(enumerate(edge_data['edge_width']))
+        main_legend, info_legend = get_legend_items(plot, edge_width, name, difference_graph)
+
+        plot.renderers.append(main_legend)
+        plot.renderers.append(info_legend)
+
+        if not plot_vertically:
+            plot.add_layout(main_legend, legend_loc)
+
+        if color_bar is not None:
+            plot.renderers.append(color_bar)
+
+        plots.append(plot)
+        rendered.append({'graph_renderer': graph_renderer, 'label_source': labels.source, 'info_legend': info_legend})
+
+    # format all the generated bokeh transition graphs
+    ncols = 1
+    formatted_plots = list(plots)
+    plot_height, plot_width = 550, 550
+    if not plot_vertically:
+        # Format grid of transition graphs
+        ncols = None
+        plot_width, plot_height = 550, 675
+        if len(model.pairs) == len(model.group) * (len(model.group) - 1) // 2:
+            formatted_plots = format_graphs(plots, model.group)
+        else:
+            # only some difference graphs are displayed, each one next to its pair of groups
+            n_groups = len(model.group)
+            grid = np.array([[None] * n_groups] * n_groups)
+            for k in range(n_groups):
+                grid[k, k] = plots[k]
+            for plot, (i, j) in zip(plots[n_groups:], model.pairs):
+                grid[min(i, j), max(i, j)] = plot
+            formatted_plots = list(grid)
+
+    # Create Bokeh grid plot object
+    gp = gridplot(formatted_plots, sizing_mode='scale_both', ncols=ncols, plot_width=plot_width, plot_height=plot_height)
+
+    return gp, rendered
+
+def plot_transition_graph_model(model, pos, node_mask, edge_mask, scalar_color='default', plot_vertically=False,
+                                legend_loc='above'):
+    """
+    Display all the group transition graphs and difference graphs of a TransitionGraphModel.
+    The returned data sources can later be updated in place with update_transition_graph_model_plots().
+
+    Args:
+    model (TransitionGraphModel): transition graph model holding the group and difference transition matrices.
+    pos (dict): shared node position coordinates layout object.
+    node_mask (1d numpy array): boolean array indicating the included syllables.
+    edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+    scalar_color (str): name of scalar to color nodes by.
+    plot_vertically (bool): indicates to stack the graphs in a single column.
+    legend_loc (str): location of the main legend relative to each plot.
+
+    Returns:
+    handle (bokeh CommsHandle): notebook handle used to push the data source updates, None outside of notebooks.
+    rendered (list): list of dicts with the graph renderer, label data source and info legend of each plot.
+    """
+
+    gp, rendered = draw_transition_graph_plots(model, pos, node_mask, edge_mask, scalar_color=scalar_color,
+                                               plot_vertically=plot_vertically, legend_loc=legend_loc)
+    handle = show(gp, notebook_handle=True)
+
+    return handle, rendered
+
+def plot_transition_graph_model_client_side(model, pos, edge_threshold, usage_threshold, scalar_color='default',
+                                            plot_vertically=False, legend_loc='above'):
+    """
+    Display all the group transition graphs and difference graphs of a TransitionGraphModel, thresholded in the browser.
+    Every node and every non-zero anchor transition is shipped once along with the anchor usages and weights,
+     and Bokeh RangeSliders filter the displayed nodes and edges through a CustomJS callback,
+     such that thresholding does not require a round trip to the Python kernel.
+
+    Args:
+    model (TransitionGraphModel): transition graph model holding the group and difference transition matrices.
+    pos (dict): node position coordinates layout object covering all the syllables.
+    edge_threshold (tuple): initial (min, max] range of transition probabilities to include.
+    usage_threshold (tuple): initial [min, max] range of syllable usages to include.
+    scalar_color (str): name of scalar to color nodes by.
+    plot_vertically (bool): indicates to stack the graphs in a single column.
+    legend_loc (str): location of the main legend relative to each plot.
+
+    Returns:
+    layout (bokeh column): displayed sliders and grid of transition graphs.
+    """
+
+    # draw the initially thresholded graphs
+    node_mask, edge_mask = model.get_masks(edge_threshold, usage_threshold)
+    gp, rendered = draw_transition_graph_plots(model, pos, node_mask, edge_mask, scalar_color=scalar_color,
+                                               plot_vertically=plot_vertically, legend_loc=legend_loc)
+
+    # ship every node and non-zero transition, the thresholding is done in the browser
+    all_nodes, all_edges = model.get_masks((0, np.inf), (-np.inf, np.inf))
+    starts, ends = np.nonzero(all_edges)
+
+    # syllable info is shared by all the graphs, and only shipped once
+    info_source = ColumnDataSource({'label': model.labels, 'desc': model.descs, 'movies': model.movies})
+    browser_computed = ['label', 'desc', 'movies', 'prev', 'next', 'line_color']
+
+    full_nodes, full_edges = [], []
+    for i in range(len(rendered)):
+        node_data = {k: v for k, v in model.get_node_data(i, all_nodes, all_edges).items() if k not in browser_computed}
+        node_data['anchor_usage'] = model.anchor_usages[all_nodes].tolist()
+        edge_data = {k: v for k, v in model.get_edge_data(i, all_edges).items() if k not in browser_computed}
+        edge_data['anchor_weight'] = model.anchor_weights[starts, ends].tolist()
+
+        full_nodes.append(node_data)
+        full_edges.append(edge_data)
+
+    edge_slider = RangeSlider(start=0, end=float(np.max(model.anchor_weights)), value=tuple(edge_threshold),
+                              step=0.001, format="0[.]0000", title='Threshold Edge Weights')
+    usage_slider = RangeSlider(start=0, end=float(np.max(model.anchor_usages)), value=tuple(usage_threshold),
+                               step=0.001, format="0[.]000", title='Threshold Nodes by Usage')
+
+    callback = CustomJS(args=dict(edge_slider=edge_slider, usage_slider=usage_slider, info=info_source,
+                                  node_sources=[r['graph_renderer'].node_renderer.data_source for r in rendered],
+                                  edge_sources=[r['graph_renderer'].edge_renderer.data_source for r in rendered],
+                                  label_sources=[r['label_source'] for r in rendered],
+                                  info_legends=[r['info_legend'] for r in rendered],
+                                  is_difference=[bool(d) for d in model.is_difference],
+                                  full_nodes=full_nodes, full_edges=full_edges, layout=get_static_layout(pos)),
+                        code=TransitionGraphBokehCallbacks().code)
+    edge_slider.js_on_change('value', callback)
+    usage_slider.js_on_change('value', callback)
+
+    layout = column([edge_slider, usage_slider, gp])
+    show(layout)
+
+    return layout
+
+def update_transition_graph_model_plots(model, rendered, pos, node_mask, edge_mask, handle=None):
+    """
+    Update the data sources of the plots drawn by plot_transition_graph_model() in place, and push them to the notebook.
+
+    Args:
+    model (TransitionGraphModel): transition graph model holding the group and difference transition matrices.
+    rendered (list): list of dicts returned by plot_transition_graph_model().
+    pos (dict): shared node position coordinates layout object.
+    node_mask (1d numpy array): boolean array indicating the included syllables.
+    edge_mask (2d numpy array): boolean array indicating the included (from, to) transitions.
+    handle (bokeh CommsHandle): notebook handle returned by plot_transition_graph_model().
+    """
+
+    graph_layout = get_static_layout(pos)
+
+    for i, r in enumerate(rendered):
+        node_data = model.get_node_data(i, node_mask, edge_mask)
+        edge_data = model.get_edge_data(i, edge_mask)
+
+        graph_renderer = r['graph_renderer']
+        graph_renderer.layout_provider.graph_layout = graph_layout
+        graph_renderer.node_renderer.data_source.data = node_data
+        graph_renderer.edge_renderer.data_source.data = edge_data
+
+        r['label_source'].data = {
+            'x': [graph_layout[n][0] for n in node_data['index']],
+            'y': [graph_layout[n][1] for n in node_data['index']],
+            'syllable': [str(n) for n in node_data['index']],
+        }
+
+        update_info_legend(r['info_legend'], dict(enumerate(edge_data['edge_width'])), bool(model.is_difference[i]))
+
+    if handle is not None:
+        push_notebook(handle=handle)
+
 def plot_dendrogram(index_file, model_path, syll_info_path, save_dir, max_syllable = 40, color_by_cluster=False):
     """plot a static dentrogram
 
@@ -1289,9 +1739,12 @@ def plot_dendrogram(index_file, model_path, syll_info_path, save_dir, max_syllab
         max_syllable (int, optional): _description_. Defaults to 40.
         color_by_cluster (bool, optional): _description_. Defaults to False.
     """
+    # model, index and syllable data shared with the other widgets
+    data_context = get_data_context({'model_path': model_path, 'index_file': index_file})
+
     # if there is syll info, load syllable description
     if exists(syll_info_path):
-        syll_info = read_yaml(syll_info_path)
+        syll_info = data_context.get_syll_info(syll_info_path)
         syll_info = pd.DataFrame(syll_info).T.sort_index()
         labels = (syll_info['label']+"-" +syll_info.index.astype(str)).to_numpy()
     else:
@@ -1305,7 +1758,7 @@ def plot_dendrogram(index_file, model_path, syll_info_path, save_dir, max_syllab
         color_threshold = 0
     
     # compute similarity between syllables based on the AR matrix
-    sorted_index = get_sorted_index(index_file)
+    sorted_index = data_context.get_sorted_index()
     # X is a (max_syllable, max_syllable) size square matrix
     X = get_behavioral_distance(sorted_index, model_path, max_syllable=max_syllable, distances='ar[init]')['ar[init]']
     # need to run squareform on X because linkage expects a 1-d array
@@ -216,6 +216,110 @@ class SyllableStatBokehCallbacks:
         self.code = self.js_variables + self.js_for_loop + self.js_condition + \
                self.js_condition_pass + self.js_condition_fail + self.js_update
 
+class TransitionGraphBokehCallbacks:
+
+    def __init__(self):
+        """
+        Initialize JS string elements filtering the transition graph data sources with the Bokeh threshold sliders.
+        The callback expects the arguments: edge_slider, usage_slider, info (syllable info ColumnDataSource),
+         node_sources, edge_sources, label_sources, info_legends, is_difference (one per graph),
+         full_nodes, full_edges (unfiltered data of each graph) and layout (node positions).
+        """
+
+        # select the nodes within the anchor usage range
+        self.js_node_filter = """
+                        const [elo, ehi] = edge_slider.value;
+                        const [ulo, uhi] = usage_slider.value;
+
+                        for (let k = 0; k < node_sources.length; k++) {
+                            const fn = full_nodes[k];
+                            const fe = full_edges[k];
+
+                            const nodes = {};
+                            for (const key in fn) { nodes[key] = []; }
+                            const keep = new Set();
+                            for (let i = 0; i < fn['index'].length; i++) {
+                                const u = fn['anchor_usage'][i];
+                                if ((u >= ulo) && (u <= uhi)) {
+                                    keep.add(fn['index'][i]);
+                                    for (const key in fn) { nodes[key].push(fn[key][i]); }
+                                }
+                            }
+                            nodes['label'] = nodes['index'].map(n => info.data['label'][n]);
+                            nodes['desc'] = nodes['index'].map(n => info.data['desc'][n]);
+                            nodes['movies'] = nodes['index'].map(n => info.data['movies'][n]);\n
+                        """
+
+        # select the edges within the anchor weight range that connect two selected nodes
+        self.js_edge_filter = """
+                            const edges = {};
+                            for (const key in fe) { edges[key] = []; }
+                            for (let i = 0; i < fe['start'].length; i++) {
+                                const w = fe['anchor_weight'][i];
+                                if ((w > elo) && (w <= ehi) && keep.has(fe['start'][i]) && keep.has(fe['end'][i])) {
+                                    for (const key in fe) { edges[key].push(fe[key][i]); }
+                                }
+                            }\n
+                        """
+
+        # color bidirectional edges, and list the neighboring syllables by descending transition weight
+        self.js_neighbors = """
+                            const pairs = new Set(edges['start'].map((s, i) => s + ',' + edges['end'][i]));
+                            edges['line_color'] = edges['start'].map((s, i) => {
+                                const e = edges['end'][i];
+                                return pairs.has(e + ',' + s) ? 'green' : (s > e ? 'purple' : 'orange');
+                            });
+
+                            const order = [...Array(edges['start'].length).keys()]
+                                .sort((a, b) => edges['weight'][b] - edges['weight'][a]);
+                            const next = {}, prev = {};
+                            for (const i of order) {
+                                const s = edges['start'][i], e = edges['end'][i];
+                                (next[s] = next[s] || []).push(e);
+                                (prev[e] = prev[e] || []).push(s);
+                            }
+                            nodes['next'] = nodes['index'].map(n => next[n] || []);
+                            nodes['prev'] = nodes['index'].map(n => prev[n] || []);\n
+                        """
+
+        # update the min and max P(transition) legend items from the displayed edge widths, like update_info_legend()
+        self.js_legend = """
+                            const widths = edges['edge_width'];
+                            const minmax = (ws, scale) => ws.length > 0 ?
+                                [Math.min(...ws) / scale, Math.max(...ws) / scale] : [0, 0];
+                            let entries;
+                            if (is_difference[k]) {
+                                const [min_down, max_down] = minmax(widths.filter(w => w < 0), 350);
+                                const [min_up, max_up] = minmax(widths.filter(w => w > 0), 350);
+                                entries = [['Min Up-regulated P(transition): ', min_up, 350],
+                                           ['Max Up-regulated P(transition): ', max_up, 350],
+                                           ['Min Down-regulated P(transition): ', min_down, 350],
+                                           ['Max Down-regulated P(transition): ', max_down, 350]];
+                            } else {
+                                const [min_tp, max_tp] = minmax(widths, 200);
+                                entries = [['Min P(transition): ', min_tp, 200], ['Max P(transition): ', max_tp, 200]];
+                            }
+                            info_legends[k].items.forEach((item, i) => {
+                                const [label, tp, scale] = entries[i];
+                                item.label = {value: label + tp.toFixed(4)};
+                                item.renderers[0].glyph.line_width = tp * scale;
+                            });\n
+                        """
+
+        # replace the data sources, which emits the changes to the figures
+        self.js_update = """
+                            node_sources[k].data = nodes;
+                            edge_sources[k].data = edges;
+                            label_sources[k].data = {
+                                'x': nodes['index'].map(n => layout[n][0]),
+                                'y': nodes['index'].map(n => layout[n][1]),
+                                'syllable': nodes['index'].map(n => String(n))
+                            };
+                        }
+                        """
+
+        self.code = self.js_node_filter + self.js_edge_filter + self.js_neighbors + self.js_legend + self.js_update
+
 class TransitionGraphWidgets:
 
     def __init__(self):
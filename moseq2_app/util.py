@@ -1,22 +1,33 @@
 """
 General utility functions.
 """
+import os
+import json
+import hashlib
+import warnings
 import pandas as pd
+from fastparquet import ParquetFile
 import ruamel.yaml as yaml
 from copy import deepcopy
 from pprint import pprint
-from os.path import basename, join, exists, splitext
+from os.path import abspath, basename, dirname, join, exists, splitext, getmtime, getsize
 from os import mkdir
 from glob import glob
 from shutil import copy2
 from collections import defaultdict
 from contextlib import contextmanager
-from moseq2_viz.util import read_yaml
-from moseq2_app.gui.progress import update_progress
+from moseq2_viz.util import read_yaml, parse_index
+from moseq2_app.gui.progress import update_progress_vars
 from moseq2_viz.scalars.util import scalars_to_dataframe
 from moseq2_extract.util import read_yaml, check_filter_sizes
 from moseq2_viz.model.util import compute_behavioral_statistics
 
+# version of the materialized syllable statistics files, incremented when their columns or contents change
+SYLLABLE_STATS_SCHEMA_VERSION = 2
+
+# parsed index files keyed by absolute path, holding their (mtime, size) stamp, parsed contents and DataFrame
+_index_cache = {}
+
 
 def read_and_clean_config(config_file):
     """read config files and reset incorrect parameters
@@ -53,7 +64,7 @@ def write_yaml(data, file):
         yaml.safe_dump(data, yaml_f)
 
 
-def merge_labels_with_scalars(sorted_index, model_path):
+def merge_labels_with_scalars(sorted_index, model_path, report=None):
     """
     Compute all the syllable statistics to plot, including syllable scalars.
 
@@ -62,23 +73,355 @@ def merge_labels_with_scalars(sorted_index, model_path):
     model_fit (dict): Trained AR-HMM results dict
     model_path (str): Respective path to the AR-HMM model in use.
     max_sylls (int): Maximum number of syllables to include
+    report (function): called with the progress and message of each stage, e.g. a background job's report().
 
     Returns:
     df (pd.DataFrame): Dataframe containing all of the mean syllable statistics
     scalar_df (pd.DataFrame): Dataframe containing the frame-by-frame scalar and label data
     """
 
+    if report is not None:
+        report(progress=0., message='Loading the session scalars')
+
     # Load scalar Dataframe to compute syllable speeds
     scalar_df = scalars_to_dataframe(sorted_index, model_path=model_path)
 
+    if report is not None:
+        report(progress=0.5, message='Merging syllable labels with scalars')
+
     df = compute_behavioral_statistics(scalar_df, count='usage',
                                        groupby=['group', 'uuid', 'SessionName', 'SubjectName'])
 
     return df, scalar_df
 
+def get_scalar_df_path(df_path):
+    """
+    Get the path of the frame-level scalar DataFrame materialized next to a syllable statistics parquet file.
+
+    Args:
+    df_path (str): path to the syllable statistics parquet file.
+
+    Returns:
+    scalar_df_path (str): path to the frame-level scalar parquet file.
+    """
+
+    return join(dirname(df_path), 'moseq_scalar_dataframe.parquet')
+
+def get_syllable_stats_manifest_path(df_path):
+    """
+    Get the path of the manifest describing a materialized syllable statistics parquet file.
+
+    Args:
+    df_path (str): path to the syllable statistics parquet file.
+
+    Returns:
+    manifest_path (str): path to the manifest yaml file.
+    """
+
+    return f'{splitext(df_path)[0]}_manifest.yaml'
+
+def get_syllable_stats_fingerprint(sorted_index, model_path):
+    """
+    Fingerprint the inputs of merge_labels_with_scalars(): the model file, and each modeled session's metadata and h5 file.
+
+    Args:
+    sorted_index (dict): Sorted dict of modeled sessions
+    model_path (str): Path to the AR-HMM model in use.
+
+    Returns:
+    fingerprint (str): hex digest of the input files' sizes, modification times and session metadata.
+    """
+
+    def file_stamp(path):
+        return [getsize(path), getmtime(path)] if exists(path) else None
+
+    sessions = []
+    for uuid, session in sorted(sorted_index['files'].items()):
+        meta = session.get('metadata', {})
+        sessions.append([uuid, str(session.get('group')), str(meta.get('SessionName')), str(meta.get('SubjectName')),
+                         file_stamp(session['path'][0])])
+
+    inputs = {'model': file_stamp(model_path), 'sessions': sessions}
+
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+def write_syllable_stats(df, scalar_df, df_path, fingerprint, scalar_df_path=None, report=None):
+    """
+    Materialize the session-level syllable statistics and frame-level scalar DataFrames to parquet files,
+     along with a manifest holding the schema version and input fingerprint used to validate them later.
+    Each file is written to a temporary path and renamed, and the manifest is written last.
+
+    Args:
+    df (pd.DataFrame): Dataframe containing all of the mean syllable statistics
+    scalar_df (pd.DataFrame): Dataframe containing the frame-by-frame scalar and label data, None to skip it.
+    df_path (str): path to write the syllable statistics parquet file to.
+    fingerprint (str): input fingerprint computed with get_syllable_stats_fingerprint().
+    scalar_df_path (str): path to write the frame-level parquet file to, defaults to get_scalar_df_path(df_path).
+    report (function): called with the progress and message before each file is written, e.g. a background job's
+     report(). Stopping between files leaves no manifest behind, so the files are written again next time.
+    """
+
+    if scalar_df_path is None:
+        scalar_df_path = get_scalar_df_path(df_path)
+
+    if report is not None:
+        report(progress=0.7, message='Writing the syllable statistics')
+
+    def write_parquet(frame, path, **kwargs):
+        tmp_path = f'{path}.tmp'
+        frame.to_parquet(tmp_path, engine='fastparquet', compression='gzip', **kwargs)
+        os.replace(tmp_path, path)
+
+    # one row group per syllable, such that reads filtered by syllable skip the other row groups
+    df = df.astype(dict(SubjectName=str, SessionName=str))
+    df = df.sort_values(['syllable', 'group'], kind='mergesort').reset_index(drop=True)
+    syllables = df['syllable'].to_numpy()
+    row_group_offsets = [0] + [i for i in range(1, len(df)) if syllables[i] != syllables[i - 1]]
+
+    write_parquet(df, df_path, row_group_offsets=row_group_offsets)
+    if scalar_df is not None:
+        if report is not None:
+            report(progress=0.8, message='Writing the frame-level scalars')
+        write_parquet(scalar_df, scalar_df_path)
+
+    manifest = {
+        'schema_version': SYLLABLE_STATS_SCHEMA_VERSION,
+        'fingerprint': fingerprint,
+        'syll_df': basename(df_path),
+        'scalar_df': basename(scalar_df_path) if scalar_df is not None else None,
+    }
+
+    manifest_path = get_syllable_stats_manifest_path(df_path)
+    write_yaml(manifest, f'{manifest_path}.tmp')
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+def filter_syllable_df(df, columns=None, max_syllable=None, groups=None):
+    """
+    Select the syllables, groups and columns of a syllable statistics DataFrame.
+
+    Args:
+    df (pd.DataFrame): Dataframe containing the mean syllable statistics of each session.
+    columns (list): columns to keep, None keeps all of them.
+    max_syllable (int): keep the syllables < max_syllable, None keeps all of them.
+    groups (list): groups to keep, None keeps all of them.
+
+    Returns:
+    df (pd.DataFrame): selected rows and columns.
+    """
+
+    mask = pd.Series(True, index=df.index)
+    if max_syllable is not None:
+        mask &= df['syllable'] < max_syllable
+    if groups is not None:
+        mask &= df['group'].isin(list(groups))
+
+    df = df[mask.to_numpy()]
+    if columns is not None:
+        df = df[[c for c in df.columns if c in columns]]
+
+    return df.reset_index(drop=True)
+
+def read_syllable_df(df_path, columns=None, max_syllable=None, groups=None):
+    """
+    Read the selected columns of the selected syllables and groups from a syllable statistics parquet file.
+    Row groups whose syllable or group statistics exclude all of their rows are skipped,
+     so reading the first syllables only reads their share of a file written by write_syllable_stats().
+
+    Args:
+    df_path (str): path to the syllable statistics parquet file.
+    columns (list): columns to read, None reads all of them.
+    max_syllable (int): read the syllables < max_syllable, None reads all of them.
+    groups (list): groups to read, None reads all of them.
+
+    Returns:
+    df (pd.DataFrame): selected rows and columns.
+    """
+
+    pf = ParquetFile(df_path)
+
+    filters = []
+    if max_syllable is not None:
+        filters.append(('syllable', '<', max_syllable))
+    if groups is not None:
+        filters.append(('group', 'in', list(groups)))
+
+    read_columns = None
+    if columns is not None:
+        # the filtered columns are needed to drop the remaining rows of partially selected row groups
+        read_columns = [c for c in pf.columns if c in columns or c in ('syllable', 'group')]
+
+    df = pf.to_pandas(columns=read_columns, filters=filters)
+
+    return filter_syllable_df(df, columns=columns, max_syllable=max_syllable, groups=groups)
+
+def read_syllable_stats(df_path, fingerprint, load_scalars=False, scalar_df_path=None, columns=None,
+                        max_syllable=None, groups=None):
+    """
+    Read materialized syllable statistics if their manifest matches the current schema version and input fingerprint.
+
+    Args:
+    df_path (str): path to the syllable statistics parquet file.
+    fingerprint (str): input fingerprint computed with get_syllable_stats_fingerprint().
+    load_scalars (bool): indicates to also read the frame-level scalar DataFrame.
+    scalar_df_path (str): path to the frame-level parquet file, defaults to get_scalar_df_path(df_path).
+    columns (list): syllable statistics columns to read, None reads all of them.
+    max_syllable (int): read the syllables < max_syllable, None reads all of them.
+    groups (list): groups to read, None reads all of them.
+
+    Returns:
+    df (pd.DataFrame or None): mean syllable statistics, None if the files are missing or out of date.
+    scalar_df (pd.DataFrame or None): frame-level scalar data, None if it was not requested or cannot be used.
+    """
+
+    if scalar_df_path is None:
+        scalar_df_path = get_scalar_df_path(df_path)
+
+    manifest_path = get_syllable_stats_manifest_path(df_path)
+    if not (exists(df_path) and exists(manifest_path)):
+        return None, None
+
+    manifest = read_yaml(manifest_path) or {}
+    if manifest.get('schema_version') != SYLLABLE_STATS_SCHEMA_VERSION or manifest.get('fingerprint') != fingerprint:
+        return None, None
+
+    if load_scalars and (manifest.get('scalar_df') != basename(scalar_df_path) or not exists(scalar_df_path)):
+        return None, None
+
+    df = read_syllable_df(df_path, columns=columns, max_syllable=max_syllable, groups=groups)
+    scalar_df = pd.read_parquet(scalar_df_path, engine='fastparquet') if load_scalars else None
+
+    return df, scalar_df
+
+def get_index_cache_path(index_path):
+    """
+    Get the path of the parsed index sidecar file, written to the user's cache directory rather than next to the
+     index file. Sidecars are named after the digest of the index file's absolute path.
+
+    Args:
+    index_path (str): Path to index file.
+
+    Returns:
+    cache_path (str): path to the JSON index file.
+    """
+
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or join(os.path.expanduser('~'), '.cache')
+    name = hashlib.sha1(abspath(index_path).encode('utf-8')).hexdigest()
+
+    return join(cache_dir, 'moseq2-app', 'index', f'{name}.json')
+
+def _hash_file(path):
+    """
+    Compute the sha1 digest of a file's contents.
+
+    Args:
+    path (str): path to the file.
+
+    Returns:
+    digest (str): hex digest of the file.
+    """
+
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+def _load_cached_index(index_path):
+    """
+    Get the cache entry of an index file, parsing the yaml file only if neither the in-process cache nor the
+     JSON sidecar match it. Sidecars are matched by the index file's modification time and size, or by its
+     sha1 digest when the file was touched without changing its contents. Index contents that do not round trip
+     through JSON (e.g. yaml timestamps) are only cached in memory.
+
+    Args:
+    index_path (str): Path to index file.
+
+    Returns:
+    entry (dict): stamp, parsed index contents and (lazily built) DataFrame of the index file.
+    """
+
+    path = abspath(index_path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime, stat.st_size)
+
+    entry = _index_cache.get(path)
+    if entry is not None and entry['stamp'] == stamp:
+        return entry
+
+    cache_path = get_index_cache_path(path)
+    index_data, digest, write_sidecar = None, None, True
+    if exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                sidecar = json.load(f)
+            if tuple(sidecar['stamp']) == stamp:
+                index_data, write_sidecar = sidecar['index'], False
+            else:
+                digest = _hash_file(path)
+                if sidecar['sha1'] == digest:
+                    index_data = sidecar['index']
+        except (OSError, KeyError, TypeError, ValueError):
+            index_data = None
+
+    if index_data is None:
+        # the safe loader uses the C-accelerated libyaml parser when it is available
+        with open(path, 'r') as f:
+            index_data = yaml.YAML(typ='safe').load(f)
+
+    if write_sidecar:
+        try:
+            contents = json.dumps({'stamp': stamp, 'sha1': digest or _hash_file(path), 'index': index_data})
+            # only write contents that are loaded back unchanged
+            if json.loads(contents)['index'] == index_data:
+                os.makedirs(dirname(cache_path), exist_ok=True)
+                tmp_path = f'{cache_path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(contents)
+                os.replace(tmp_path, cache_path)
+        except TypeError:
+            # contents with values JSON cannot encode are only cached in memory
+            pass
+        except OSError as e:
+            warnings.warn(f'Could not write the index cache to {cache_path}: {e}')
+
+    entry = {'stamp': stamp, 'index': index_data, 'df': None}
+    _index_cache[path] = entry
+
+    return entry
+
+def load_index(index_path):
+    """
+    Load an index file, reusing its cached parsed contents until the file is modified.
+
+    Args:
+    index_path (str): Path to index file.
+
+    Returns:
+    index_data (dict): copy of the parsed index file contents.
+    """
+
+    return deepcopy(_load_cached_index(index_path)['index'])
+
+def get_sorted_index(index_path):
+    """
+    Load an index file with load_index(), and key its sessions by uuid.
+
+    Args:
+    index_path (str): Path to index file.
+
+    Returns:
+    sorted_index (dict): index dict whose files are keyed by session uuid.
+    """
+
+    _, sorted_index = parse_index(load_index(index_path))
+
+    return sorted_index
+
 def index_to_dataframe(index_path):
     """
     Read the index file into a dictionary and converts it into an editable DataFrame.
+    Both are cached until the index file is modified, and copies are returned.
 
     Args:
     index_path (str): Path to index file
@@ -88,7 +431,24 @@ def index_to_dataframe(index_path):
     df (pd.DataFrame): Formatted dict in DataFrame form including each session's metadata
     """
 
-    index_data = read_yaml(index_path)
+    entry = _load_cached_index(index_path)
+    index_data = deepcopy(entry['index'])
+
+    if entry['df'] is None:
+        entry['df'] = _index_data_to_dataframe(index_data)
+
+    return index_data, entry['df'].copy()
+
+def _index_data_to_dataframe(index_data):
+    """
+    Convert parsed index contents into a DataFrame with one row per session.
+
+    Args:
+    index_data (dict): parsed index file contents.
+
+    Returns:
+    df (pd.DataFrame): each session's metadata, file paths, group and filename.
+    """
 
     files = index_data['files']
     meta = [f['metadata'] for f in files]
@@ -103,7 +463,28 @@ def index_to_dataframe(index_path):
 
     df['filename'] = df['path'].apply(apply_filename)
 
-    return index_data, df
+    return df
+
+def get_df_fingerprint(df, columns=None):
+    """
+    Compute a content hash of a DataFrame, used to check whether results computed from it are still valid.
+
+    Args:
+    df (pd.DataFrame): DataFrame to fingerprint.
+    columns (list): optional subset of columns to include in the fingerprint.
+
+    Returns:
+    fingerprint (str): hex digest of the DataFrame's column names and values.
+    """
+
+    if columns is not None:
+        df = df[list(columns)]
+
+    hasher = hashlib.sha1()
+    hasher.update(','.join(map(str, df.columns)).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+    return hasher.hexdigest()
 
 class bcolors:
     """
@@ -186,13 +567,17 @@ def update_model_paths(desired_model, model_dict, progress_filepath):
 
     assert desired_model in model_dict, '{} not found in model_dict. Make sure desired_model is one of the keys in model_dict. \nPossible keys: \n{}'.format(desired_model, "\n".join(map(str, model_dict)))
 
-    # update model_session_path and model_path
-    for key in ['model_session_path', 'model_path']:
-        progress_paths = update_progress(progress_filepath, key, model_dict[desired_model].get(key))
-    progress_paths = update_progress(progress_filepath, 'plot_path', join(model_dict[desired_model]['model_session_path'], 'plots/'))
-    progress_paths = update_progress(progress_filepath, 'crowd_dir', join(model_dict[desired_model]['model_session_path'], 'crowd_movies/'))
-    progress_paths = update_progress(progress_filepath, 'syll_info', join(model_dict[desired_model]['model_session_path'], 'syll_info.yaml'))
-    progress_paths = update_progress(progress_filepath, 'df_info_path', join(model_dict[desired_model]['model_session_path'], 'syll_df.parquet'))
+    model_session_path = model_dict[desired_model]['model_session_path']
+
+    # update all the model paths with a single read and write of the progress file
+    progress_paths = update_progress_vars(progress_filepath, {
+        'model_session_path': model_dict[desired_model].get('model_session_path'),
+        'model_path': model_dict[desired_model].get('model_path'),
+        'plot_path': join(model_session_path, 'plots/'),
+        'crowd_dir': join(model_session_path, 'crowd_movies/'),
+        'syll_info': join(model_session_path, 'syll_info.yaml'),
+        'df_info_path': join(model_session_path, 'syll_df.parquet'),
+    })
 
     return progress_paths
 
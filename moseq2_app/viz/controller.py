@@ -9,7 +9,6 @@ import base64
 import numpy as np
 import pandas as pd
 from glob import glob
-from copy import deepcopy
 from bokeh.io import show
 import ruamel.yaml as yaml
 import ipywidgets as widgets
@@ -17,16 +16,15 @@ from bokeh.layouts import column
 from bokeh.plotting import figure
 from os.path import exists
 from moseq2_extract.util import read_yaml
-from moseq2_viz.util import get_sorted_index
 from bokeh.models import Div, CustomJS, Slider
 from IPython.display import display, clear_output
 from moseq2_extract.io.video import get_video_info
 from moseq2_app.viz.view import display_crowd_movies
-from moseq2_app.util import merge_labels_with_scalars
-from moseq2_viz.model.util import parse_model_results
+from moseq2_app.context import get_data_context
+from moseq2_app.viz.util import (get_mean_position_heatmap, make_crowd_movie_preview, encode_movie,
+                                 SyllableInfoTable)
 from moseq2_app.viz.widgets import SyllableLabelerWidgets, CrowdMovieCompareWidgets
-from moseq2_viz.helpers.wrappers import make_crowd_movies_wrapper, init_wrapper_function
-from moseq2_viz.scalars.util import (scalars_to_dataframe, compute_syllable_position_heatmaps, get_syllable_pdfs)
+from moseq2_viz.helpers.wrappers import make_crowd_movies_wrapper
 
 yml = yaml.YAML()
 yml.indent(mapping=3, offset=2)
@@ -63,7 +61,10 @@ class SyllableLabeler(SyllableLabelerWidgets):
 
         self.model_fit = model_fit
         self.model_path = model_path
-        self.sorted_index = get_sorted_index(index_file)
+
+        # model, index and syllable data shared with the other widgets
+        self.data_context = get_data_context({'model_path': model_path, 'index_file': index_file})
+        self.sorted_index = self.data_context.get_sorted_index()
 
         # Syllable Info DataFrame path
         output_dir = os.path.dirname(save_path)
@@ -77,7 +78,7 @@ class SyllableLabeler(SyllableLabelerWidgets):
             print('Error: Some model UUIDs were not found in the provided index file.')
 
         if os.path.exists(save_path):
-            self.syll_info = read_yaml(save_path)
+            self.syll_info = self.data_context.get_syll_info(save_path)
             if len(self.syll_info) != max_sylls:
                 # Delete previously saved parquet
                 if os.path.exists(self.df_output_file):
@@ -125,9 +126,7 @@ class SyllableLabeler(SyllableLabelerWidgets):
         # the syllable statistics information plotted in the info table in the Syllable Labeler GUI.
         # The sub-dicts are dropped in order to keep the syll_info.yaml file clean, only containing the
         # label, description, and crowd movie path for each syllable.
-        tmp = deepcopy(self.syll_info)
-        for syll in range(self.max_sylls):
-            tmp[syll].pop('group_info', None)
+        tmp = {syll: {k: v for k, v in info.items() if k != 'group_info'} for syll, info in self.syll_info.items()}
 
         # Write to file
         with open(self.save_path, 'w') as f:
@@ -142,67 +141,31 @@ class SyllableLabeler(SyllableLabelerWidgets):
             self.syll_select.index = curr_syll
             self.syll_select._initializing_traits_ = False
 
-    def get_mean_group_dict(self, group_df):
-        """
-        Create a dict object to convert to a displayed table containing syllable scalars.
-
-        Args:
-        group_df (pd.DataFrame): DataFrame containing mean syllable scalar data for each session and their groups
-        """
-
-        # Get array of grouped syllable info
-        group_dicts = []
-        for group in self.groups:
-            group_dict = {
-                group: group_df[group_df['group'] == group].drop('group', axis=1).reset_index(drop=True).to_dict()}
-            group_dicts.append(group_dict)
-
-        self.group_syll_info = deepcopy(self.syll_info)
-        # Update syllable info dict
-        for gd in group_dicts:
-            group_name = list(gd)[0]
-            for syll in range(self.max_sylls):
-                self.group_syll_info[syll]['group_info'][group_name] = {
-                    'usage': gd[group_name]['usage'][syll],
-                    'duration (s)': gd[group_name]['duration'][syll],
-                    '2D velocity (mm/frame)': gd[group_name]['velocity_2d_mm_mean'][syll],
-                    '3D velocity (mm/frame)': gd[group_name]['velocity_3d_mm_mean'][syll],
-                    'height (mm)': gd[group_name]['height_ave_mm_mean'][syll],
-                    'distance to center (pixels)': gd[group_name]['dist_to_center_px_mean'][syll],
-                }
-
     def get_mean_syllable_info(self):
         """
         Populate syllable information dict with usage and scalar information.
         """
 
-        if not os.path.exists(self.df_output_file):
-            # Compute a syllable summary Dataframe containing usage-based
-            # sorted/relabeled syllable usage and duration information from [0, max_syllable) inclusive
-            df, scalar_df = merge_labels_with_scalars(self.sorted_index, self.model_path)
-            df = df.astype(dict(SubjectName=str, SessionName=str))
-            # print('Writing main syllable info to parquet')
-            # df.to_parquet(self.df_output_file, engine='fastparquet', compression='gzip')
-            # scalar_df.to_parquet(self.scalar_df_output, compression='gzip')
-        else:
-            print('Loading parquet files')
-            df = pd.read_parquet(self.df_output_file, engine='fastparquet')
+        # Compute a syllable summary Dataframe containing usage-based
+        # sorted/relabeled syllable usage and duration information from [0, max_syllable) inclusive.
+        # The session-level and frame-level DataFrames are materialized to parquet files for the other widgets,
+        # and reused as long as the model and extracted sessions are unchanged.
+        df, _ = self.data_context.get_syllable_dataframes(df_path=self.df_output_file, load_scalars=False,
+                                                          max_syllable=self.max_sylls)
+        df = df.astype(dict(SubjectName=str, SessionName=str))
 
         # Get all unique groups in df
-        self.groups = df.group.unique()
+        self.groups = [str(g) for g in df.group.unique()]
 
-        # Get grouped DataFrame
-        group_df = df.groupby(['group', 'syllable'], as_index=False).mean()
-
-        # Get self.group_info
-        self.get_mean_group_dict(group_df)
+        # Mean syllable statistics of each group, looked up when displaying each syllable's info table
+        self.group_info_table = SyllableInfoTable(df, 'group', self.max_sylls)
 
     def set_group_info_widgets(self, group_info):
         """
         read the syllable information into a pandas DataFrame and display it as a table.
 
         Args:
-        group_info (dict): Dictionary of grouped current syllable information
+        group_info (pd.DataFrame): current syllable statistics (rows) of each group (columns)
         """
 
         full_df = pd.DataFrame(group_info)
@@ -249,7 +212,7 @@ class SyllableLabeler(SyllableLabelerWidgets):
         self.cm_lbl.text = f'Crowd Movie {self.syll_select.index + 1}/{len(self.syll_select.options)}'
 
         # Update scalar values
-        self.set_group_info_widgets(self.group_syll_info[self.syll_select.index]['group_info'])
+        self.set_group_info_widgets(self.group_info_table.get_syllable_info(self.syll_select.index, self.groups))
 
         # Get current movie path
         cm_path = syllables['crowd_movie_path']
@@ -421,11 +384,15 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
         else:
             self.df_path = None
 
-        # Prepare current context's base session syllable info dict
-        self.session_dict = {i: {'session_info': {}} for i in range(self.max_sylls)}
+        # Currently selected session or subject names
+        self.selected_sessions = []
+
+        # model, index and syllable data shared with the other widgets
+        self.data_context = get_data_context({'model_path': model_path, 'index_file': index_path})
 
-        _, self.sorted_index = init_wrapper_function(index_file=index_path, output_dir=output_dir)
-        self.model_fit = parse_model_results(model_path)
+        os.makedirs(output_dir, exist_ok=True)
+        self.sorted_index = self.data_context.get_sorted_index()
+        self.model_fit = self.data_context.get_model_labels().to_model_dict()
 
         # Set Session MultipleSelect widget options
         self.sessions = sorted(set(self.model_fit['metadata']['uuids']))
@@ -473,122 +440,38 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
         self.config_data['cmap'] = 'jet'
         self.config_data['count'] = 'usage'
 
-    def get_mean_group_dict(self, group_df):
-        """
-        Create a dict object to convert to a displayed table containing syllable scalars.
-
-        Args:
-        group_df (pd.DataFrame): DataFrame containing mean syllable scalar data for each session and their groups
-        """
-
-        # Get array of grouped syllable info
-        group_dicts = []
-        for group in self.groups:
-            group_dict = {
-                group: group_df[group_df['group'] == group].drop('group', axis=1).reset_index(drop=True).to_dict()}
-            group_dicts.append(group_dict)
-
-        self.group_syll_info = deepcopy(self.syll_info)
-
-        for i in range(self.max_sylls):
-            if i not in self.group_syll_info:
-                self.group_syll_info[i] = {'label': '', 'desc': '', 'crowd_movie_path': ''}
-            if 'group_info' not in self.group_syll_info[i]:
-                self.group_syll_info[i]['group_info'] = {}
-
-        # Update syllable info dict
-        for gd in group_dicts:
-            group_name = list(gd.keys())[0]
-            for syll in list(gd[group_name]['syllable'].keys()):
-                # ensure syll is less than max number of syllables
-                if syll < self.max_sylls:
-                    try:
-                        self.group_syll_info[syll]['group_info'][group_name] = {
-                            'usage': gd[group_name]['usage'][syll],
-                            'duration (s)': gd[group_name]['duration'][syll],
-                            '2D velocity (mm/frame)': gd[group_name]['velocity_2d_mm_mean'][syll],
-                            '3D velocity (mm/frame)': gd[group_name]['velocity_3d_mm_mean'][syll],
-                            'height (mm)': gd[group_name]['height_ave_mm_mean'][syll],
-                            'distance to center (pixels)': gd[group_name]['dist_to_center_px_mean'][syll],
-                        }
-                    except KeyError:
-                        # if a syllable is not in the given group, a KeyError will arise.
-                        print(f'Warning: syllable #{syll} is not in group:{group_name}')
-
     def get_session_mean_syllable_info_df(self):
         """
         Populate session-based syllable information dict with usage and scalar information.
         """
-        if self.df_path is not None and os.path.exists(self.df_path):
+        if self.df_path is not None:
+            # reuse the materialized parquet files if they are up to date, otherwise recompute and rewrite them
             print('Loading parquet files')
-            df = pd.read_parquet(self.df_path, engine='fastparquet')
-            if not os.path.exists(self.scalar_df_path):
-                self.scalar_df = scalars_to_dataframe(self.sorted_index, model_path=self.model_path)
-                # self.scalar_df.to_parquet(self.scalar_df_path, compression='gzip')
-            else:
-                self.scalar_df = pd.read_parquet(self.scalar_df_path)
+            df, self.scalar_df = self.data_context.get_syllable_dataframes(df_path=self.df_path, load_scalars=True,
+                                                                           max_syllable=self.max_sylls)
         else:
-            print('Syllable DataFrame not found. Computing and saving syllable statistics...')
-            df, self.scalar_df = merge_labels_with_scalars(self.sorted_index, self.model_path)
-            # self.scalar_df.to_parquet(self.scalar_df_path, compression='gzip')
+            print('Syllable DataFrame not found. Computing syllable statistics...')
+            df, self.scalar_df = self.data_context.get_syllable_dataframes(max_syllable=self.max_sylls)
 
         if self.get_pdfs:
-            # Compute syllable position PDFs
-            hists = compute_syllable_position_heatmaps(self.scalar_df,
-                                                       syllables=range(self.max_sylls),
-                                                       normalize=True).reset_index().rename(columns={'labels (usage sort)': 'syllable', 0: 'pdf'})
-            self.df = pd.merge(df, hists, on=['group', 'SessionName', 'SubjectName', 'uuid', 'syllable'])
-            self.df['SubjectName'] = self.df['SubjectName'].astype(str)
-            self.df['SessionName'] = self.df['SessionName'].astype(str)
-
-        # Get grouped DataFrame
-        self.session_df = df.groupby(['SessionName', 'syllable'], as_index=False).mean()
-        self.subject_df = df.groupby(['SubjectName', 'syllable'], as_index=False).mean()
+            # position heatmaps of every (syllable, session) pair, computed in one pass and cached next to the model
+            self.position_heatmaps = self.data_context.get_position_heatmaps(self.max_sylls, scalar_df=self.scalar_df)
 
-        self.groups = list(df.group.unique())
+        self.groups = [str(g) for g in df.group.unique()]
 
-        # Get group DataFrame
-        self.group_df = df.groupby(['group', 'syllable'], as_index=False).mean()
-
-        self.get_mean_group_dict(self.group_df)
+        # Mean syllable statistics of each group, session and subject, looked up when displaying crowd movies
+        self.info_tables = {key: SyllableInfoTable(df, key, self.max_sylls)
+                            for key in ['group', 'SessionName', 'SubjectName']}
 
     def get_selected_session_syllable_info(self, sel_sessions):
         """
-        Prepare dict of session-based syllable information to display.
+        Set the sessions or subjects whose syllable information is displayed with their crowd movies.
 
         Args:
         sel_sessions (list): list of selected session names.
         """
 
-        if self.cm_sources_dropdown.value == 'SubjectName':
-            use_df = self.subject_df
-        elif self.cm_sources_dropdown.value == 'SessionName':
-            use_df = self.session_df
-
-        # Get array of grouped syllable info
-        session_dicts = []
-        for sess in sel_sessions:
-            session_dict = {
-                sess: use_df[use_df[self.cm_sources_dropdown.value] == sess].drop(self.cm_sources_dropdown.value, axis=1).reset_index(
-                    drop=True).to_dict()}
-            session_dicts.append(session_dict)
-
-        # Update syllable data with session info
-        for sd in session_dicts:
-            session_name = list(sd.keys())[0]
-            for syll in list(sd[session_name]['syllable'].keys()):
-                try:
-                    self.session_dict[syll]['session_info'][session_name] = {
-                        'usage': sd[session_name]['usage'][syll],
-                        'duration (s)': sd[session_name]['duration'][syll],
-                        '2D velocity (mm/frame)': sd[session_name]['velocity_2d_mm_mean'][syll],
-                        '3D velocity (mm/frame)': sd[session_name]['velocity_3d_mm_mean'][syll],
-                        'height (mm)': sd[session_name]['height_ave_mm_mean'][syll],
-                        'distance to center (pixels)': sd[session_name]['dist_to_center_px_mean'][syll],
-                    }
-                except KeyError:
-                    # if a syllable is not in the given group, a KeyError will arise.
-                    print(f'Warning: syllable #{syll} is not in group:{session_name}')
+        self.selected_sessions = [str(sess) for sess in sel_sessions]
 
     def get_pdf_plot(self, group_syllable_pdf, group_name):
         """
@@ -613,9 +496,12 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
 
         return pdf_fig
 
-    def generate_crowd_movie_divs(self, grouped_syll_dict):
+    def generate_crowd_movie_divs(self, syll_info_df):
         """
-        Generate HTML divs containing crowd movies and syllable metadata tables from the given syllable dict file.
+        Generate HTML divs containing crowd movies and syllable metadata tables from the given syllable info table.
+
+        Args:
+        syll_info_df (pd.DataFrame): current syllable statistics (rows) of each grouping (columns).
 
         Returns:
         divs (list of Bokeh.models.Div): Divs of HTML videos and metadata tables.
@@ -634,32 +520,17 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
         else:
             g_iter = self.cm_session_sel.value
 
+        group_syll_pdfs = {}
         if self.get_pdfs:
-            # Get corresponding syllable position PDF
-            group_syll_pdfs = get_syllable_pdfs(self.df,
-                                                syllables=[syll_number],
-                                                groupby=cm_source,
-                                                syllable_key='syllable')[0].drop('syllable', axis=1).reset_index()
+            # Average the syllable position PDFs of each grouping's sessions
+            sessions = self.position_heatmaps['sessions']
             for group in g_iter:
-                grouped_syll_dict[group]['pdf'] = group_syll_pdfs[group_syll_pdfs[cm_source] == group]['pdf']
+                group_syll_pdfs[group] = get_mean_position_heatmap(self.position_heatmaps, syll_number,
+                                                                   (sessions[cm_source] == str(group)).to_numpy())
 
         # Remove previously displayed data
         clear_output()
 
-        # Get each group's syllable info to display; formatting keys.
-        curr_grouped_syll_dict = {}
-        for group in grouped_syll_dict.keys():
-            curr_grouped_syll_dict[group] = {}
-            for key in grouped_syll_dict[group].keys():
-                if key == 'velocity_2d_mm_mean':
-                    new_key = '2D velocity (mm/s)'
-                    curr_grouped_syll_dict[group][new_key] = grouped_syll_dict[group][key]
-                else:
-                    curr_grouped_syll_dict[group][key] = grouped_syll_dict[group][key]
-
-        # Create syllable info DataFrame
-        syll_info_df = pd.DataFrame(curr_grouped_syll_dict)
-
         # Get currently selected syllable name info
         self.curr_label = self.syll_info[syll_number]['label']
         self.curr_desc = self.syll_info[syll_number]['desc']
@@ -670,29 +541,26 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
 
         for group_name, cm_path in path_dict.items():
             # Convert crowd movie metadata to HTML table
+            group_info = syll_info_df.reindex(columns=[group_name]).to_html()
+
             if self.get_pdfs:
-                group_info = pd.DataFrame(syll_info_df.drop('pdf', axis=0)[group_name]).to_html()
-                try:
-                    # The 'pdf' key is pointing to the outputted syllable-position heatmap for each grouping.
-                    group_syllable_pdf = syll_info_df[group_name]['pdf'].iloc[self.cm_syll_select.index]
-                except Exception as e:
+                group_syllable_pdf = group_syll_pdfs.get(group_name)
+                if group_syllable_pdf is None:
                     # If a group does not express this syllable, then a empty heatmap will be generated in it's place.
-                    group_syllable_pdf = np.zeros((50, 50))
+                    bins = self.position_heatmaps['pdfs'].shape[-1]
+                    group_syllable_pdf = np.zeros((bins, bins))
                     if len(cm_path) == 0:
                         continue
 
                 pdf_fig = self.get_pdf_plot(group_syllable_pdf, group_name)
 
                 bk_plots.append(pdf_fig)
-            else:
-                group_info = pd.DataFrame(syll_info_df[group_name]).drop('pdf').to_html()
 
             video_dims = get_video_info(cm_path[0])['dims']
 
-            # open the video and encode to be displayed in jupyter notebook
-            # Implementation from: https://github.com/jupyter/notebook/issues/1024#issuecomment-338664139
-            video = io.open(cm_path[0], 'r+b').read()
-            encoded = base64.b64encode(video)
+            # embed the crowd movie preview, unless the full quality movie is requested
+            movie_path = cm_path[0] if self.cm_full_quality.value else make_crowd_movie_preview(cm_path[0])
+            encoded = encode_movie(movie_path)
 
             # Insert paths and table into HTML div
             group_txt = """
@@ -703,7 +571,7 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
                     style="float: center; type: "video/mp4"; margin: 0px 10px 10px 0px;
                     border="2"; autoplay controls loop>
                 </video>
-            """.format(group_info=group_info, src=encoded.decode('ascii'), alt=encoded.decode('ascii'), height=int(video_dims[1] * 0.8),
+            """.format(group_info=group_info, src=encoded, alt=encoded, height=int(video_dims[1] * 0.8),
                        width=int(video_dims[0] * 0.8))
 
             divs.append(group_txt)
@@ -726,12 +594,10 @@ class CrowdMovieComparison(CrowdMovieCompareWidgets):
 
         # Get group info based on selected DropDownMenu item
         if groupby == 'group':
-            grouped_syll_dict = self.group_syll_info[syll_number]['group_info']
-            for k in grouped_syll_dict:
-                grouped_syll_dict[k]['pdf'] = None
+            syll_info_df = self.info_tables['group'].get_syllable_info(syll_number, self.groups)
 
             # Get Crowd Movie Divs
-            divs, self.bk_plots = self.generate_crowd_movie_divs(grouped_syll_dict)
+            divs, self.bk_plots = self.generate_crowd_movie_divs(syll_info_df)
 
             # Display generated movies
             display_crowd_movies(self.widget_box, self.curr_label, self.curr_desc, divs, self.bk_plots)
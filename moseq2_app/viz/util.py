@@ -0,0 +1,308 @@
+"""
+Syllable position heatmaps, syllable info tables and crowd movie previews used by the syllable labeler,
+ crowd movie comparison and syllable statistics tools.
+"""
+
+import os
+import base64
+import zipfile
+import warnings
+import subprocess
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from os.path import basename, dirname, exists, getmtime, join, splitext
+
+# session columns used to select the heatmaps of a crowd movie grouping
+session_columns = ['uuid', 'group', 'SessionName', 'SubjectName']
+
+
+def get_position_heatmap_path(model_path):
+    """
+    Get the path of the syllable position heatmap cache written next to a model.
+
+    Args:
+    model_path (str): path to the trained model.
+
+    Returns:
+    path (str): path to the .npz heatmap file.
+    """
+
+    return f'{splitext(model_path)[0]}_position_heatmaps.npz'
+
+
+def compute_position_heatmaps(scalar_df, max_syllable, bins=20, syllable_key='labels (usage sort)',
+                              centroid_keys=('centroid_x_mm', 'centroid_y_mm')):
+    """
+    Compute the position heatmap of every (syllable, session) pair in a single pass, by counting the frames
+     of each flattened (syllable, session, x bin, y bin) index.
+
+    Args:
+    scalar_df (pd.DataFrame): frame-level scalar and label data.
+    max_syllable (int): heatmaps are computed for the syllables < max_syllable.
+    bins (int): number of bins along each axis.
+    syllable_key (str): column holding each frame's syllable label.
+    centroid_keys (tuple): columns holding the x and y centroid positions.
+
+    Returns:
+    heatmaps (dict): 'pdfs' position densities (syllables x sessions x bins x bins), 'counts' frame counts
+     (syllables x sessions), 'sessions' DataFrame with the uuid, group, SessionName and SubjectName of each session,
+     and the 'xedges' and 'yedges' of the bins.
+    """
+
+    sessions = scalar_df[session_columns].drop_duplicates('uuid').astype(str).reset_index(drop=True)
+
+    x = scalar_df[centroid_keys[0]].to_numpy(dtype='float64')
+    y = scalar_df[centroid_keys[1]].to_numpy(dtype='float64')
+    syllables = scalar_df[syllable_key].to_numpy()
+    session_idx = pd.Index(sessions['uuid']).get_indexer(scalar_df['uuid'].astype(str))
+
+    valid = (syllables >= 0) & (syllables < max_syllable) & np.isfinite(x) & np.isfinite(y)
+    x, y, syllables, session_idx = x[valid], y[valid], syllables[valid].astype('int64'), session_idx[valid]
+
+    xlim = (x.min(), x.max()) if len(x) > 0 else (0, 1)
+    ylim = (y.min(), y.max()) if len(y) > 0 else (0, 1)
+    xedges = np.linspace(xlim[0], xlim[1] if xlim[1] > xlim[0] else xlim[0] + 1, bins + 1)
+    yedges = np.linspace(ylim[0], ylim[1] if ylim[1] > ylim[0] else ylim[0] + 1, bins + 1)
+
+    # the last bin includes its right edge, matching np.histogram2d
+    xbin = np.clip(np.searchsorted(xedges, x, side='right') - 1, 0, bins - 1)
+    ybin = np.clip(np.searchsorted(yedges, y, side='right') - 1, 0, bins - 1)
+
+    n_sessions = len(sessions)
+    flat = ((syllables * n_sessions + session_idx) * bins + xbin) * bins + ybin
+    hists = np.bincount(flat, minlength=max_syllable * n_sessions * bins * bins)
+    hists = hists.reshape(max_syllable, n_sessions, bins, bins).astype('float32')
+
+    # normalize each heatmap to a density, matching np.histogram2d(density=True)
+    counts = hists.sum(axis=(2, 3))
+    bin_area = np.outer(np.diff(xedges), np.diff(yedges))
+    pdfs = np.divide(hists, counts[..., None, None] * bin_area, out=np.zeros_like(hists),
+                     where=counts[..., None, None] > 0)
+
+    return {'pdfs': pdfs, 'counts': counts.astype('int64'), 'sessions': sessions, 'xedges': xedges, 'yedges': yedges}
+
+
+def save_position_heatmaps(path, heatmaps, fingerprint):
+    """
+    Write position heatmaps to an uncompressed .npz file, along with the fingerprint of the data they were computed from.
+
+    Args:
+    path (str): path to the .npz file.
+    heatmaps (dict): heatmaps returned by compute_position_heatmaps().
+    fingerprint (str): fingerprint of the model and sessions the heatmaps were computed from.
+    """
+
+    tmp_path = f'{path}.tmp.npz'
+    np.savez(tmp_path,
+             pdfs=heatmaps['pdfs'],
+             counts=heatmaps['counts'],
+             xedges=heatmaps['xedges'],
+             yedges=heatmaps['yedges'],
+             fingerprint=np.array(fingerprint),
+             **{f'sessions_{c}': heatmaps['sessions'][c].to_numpy(dtype='str') for c in session_columns})
+    os.replace(tmp_path, path)
+
+
+def load_position_heatmaps(path, fingerprint, max_syllable, bins=20):
+    """
+    Load position heatmaps written by save_position_heatmaps(), if they are up to date.
+
+    Args:
+    path (str): path to the .npz file.
+    fingerprint (str): fingerprint of the current model and sessions.
+    max_syllable (int): expected number of syllables.
+    bins (int): expected number of bins along each axis.
+
+    Returns:
+    heatmaps (dict): loaded heatmaps, None if the file is missing, unreadable or out of date.
+    """
+
+    try:
+        with np.load(path) as data:
+            if str(data['fingerprint']) != fingerprint or data['pdfs'].shape[0] != max_syllable \
+                    or data['pdfs'].shape[2] != bins:
+                return None
+            return {'pdfs': data['pdfs'],
+                    'counts': data['counts'],
+                    'sessions': pd.DataFrame({c: data[f'sessions_{c}'] for c in session_columns}),
+                    'xedges': data['xedges'],
+                    'yedges': data['yedges']}
+    except (OSError, ValueError, KeyError, IndexError, zipfile.BadZipFile):
+        return None
+
+
+def get_mean_position_heatmap(heatmaps, syllable, session_mask):
+    """
+    Average the position densities of a syllable over the selected sessions that express it.
+
+    Args:
+    heatmaps (dict): heatmaps returned by compute_position_heatmaps().
+    syllable (int): syllable number.
+    session_mask (1d numpy array): boolean mask of the selected sessions.
+
+    Returns:
+    pdf (2d numpy array): mean position density, None if none of the selected sessions express the syllable.
+    """
+
+    selected = np.asarray(session_mask) & (heatmaps['counts'][syllable] > 0)
+    if not selected.any():
+        return None
+
+    return heatmaps['pdfs'][syllable, selected].mean(axis=0)
+
+
+# syllable statistics shown in the syllable info tables, mapped to their display names
+info_columns = {
+    'usage': 'usage',
+    'duration': 'duration (s)',
+    'velocity_2d_mm_mean': '2D velocity (mm/frame)',
+    'velocity_3d_mm_mean': '3D velocity (mm/frame)',
+    'height_ave_mm_mean': 'height (mm)',
+    'dist_to_center_px_mean': 'distance to center (pixels)',
+}
+
+
+class SyllableInfoTable:
+
+    def __init__(self, df, key, max_syllable=None):
+        """
+        Hold the mean syllable statistics of each grouping (group, session or subject) in a single DataFrame
+         indexed by (syllable, grouping), from which the syllable info tables are looked up.
+
+        Args:
+        df (pd.DataFrame): session-level syllable statistics.
+        key (str): column used to group the sessions (group, SessionName or SubjectName).
+        max_syllable (int): only hold the syllables < max_syllable, None holds all of them.
+        """
+
+        self.key = key
+
+        if max_syllable is not None:
+            df = df[df['syllable'] < max_syllable]
+
+        columns = [c for c in info_columns if c in df.columns]
+        self.table = (df.assign(**{key: df[key].astype(str)})
+                      .groupby(['syllable', key])[columns]
+                      .mean()
+                      .rename(columns=info_columns))
+
+    def get_syllable_info(self, syllable, names=None):
+        """
+        Get the statistics of a syllable for each grouping.
+
+        Args:
+        syllable (int): syllable number.
+        names (list): groupings to get, in order. Groupings that do not express the syllable get NaN statistics.
+         None gets all the groupings expressing the syllable.
+
+        Returns:
+        info (pd.DataFrame): syllable statistics (rows) of each grouping (columns).
+        """
+
+        if syllable in self.table.index.get_level_values('syllable'):
+            info = self.table.xs(syllable, level='syllable')
+        else:
+            info = pd.DataFrame(columns=self.table.columns, index=pd.Index([], name=self.key), dtype='float64')
+
+        if names is not None:
+            info = info.reindex([str(n) for n in names])
+
+        return info.T
+
+
+def get_preview_path(movie_path):
+    """
+    Get the path of a crowd movie's preview, written to a previews/ directory next to the movie.
+
+    Args:
+    movie_path (str): path to the crowd movie.
+
+    Returns:
+    preview_path (str): path to the preview movie.
+    """
+
+    return join(dirname(movie_path), 'previews', basename(movie_path))
+
+
+def make_crowd_movie_preview(movie_path, scale=0.5, duration=3, fps=15, crf=30):
+    """
+    Make a short, low resolution and low bitrate preview of a crowd movie with ffmpeg, to be embedded in the
+     interactive plots instead of the full quality movie. Previews are reused until the crowd movie is modified.
+
+    Args:
+    movie_path (str): path to the crowd movie.
+    scale (float): scale of the preview's frame size relative to the crowd movie.
+    duration (float): maximum duration of the preview (in seconds).
+    fps (int): frame rate of the preview.
+    crf (int): h264 constant rate factor of the preview, higher values give smaller files.
+
+    Returns:
+    preview_path (str): path to the preview movie, or to the crowd movie if the preview could not be made.
+    """
+
+    preview_path = get_preview_path(movie_path)
+    if exists(preview_path) and getmtime(preview_path) >= getmtime(movie_path):
+        return preview_path
+
+    os.makedirs(dirname(preview_path), exist_ok=True)
+    tmp_path = f'{preview_path}.tmp'
+
+    command = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-i', movie_path,
+               '-t', str(duration),
+               '-vf', f'fps={fps},scale=trunc(iw*{scale}/2)*2:-2',
+               '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(crf), '-pix_fmt', 'yuv420p',
+               '-an', '-movflags', '+faststart',
+               '-f', 'mp4', tmp_path]
+
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        os.replace(tmp_path, preview_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        warnings.warn(f'Could not make a preview of {movie_path}, using the full quality movie: {e}')
+        if exists(tmp_path):
+            os.remove(tmp_path)
+        return movie_path
+
+    return preview_path
+
+
+def get_crowd_movie_previews(movie_paths, n_jobs=4, **kwargs):
+    """
+    Get the previews of several crowd movies, making the missing ones in parallel.
+
+    Args:
+    movie_paths (list): paths to the crowd movies. Paths to missing movies are returned unchanged.
+    n_jobs (int): number of ffmpeg processes run at once.
+    kwargs (dict): preview parameters passed to make_crowd_movie_preview().
+
+    Returns:
+    preview_paths (list): paths to the preview movies, in the order of movie_paths.
+    """
+
+    preview_paths = list(movie_paths)
+    found = [i for i, path in enumerate(movie_paths) if isinstance(path, str) and exists(path)]
+
+    previews = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(make_crowd_movie_preview)(movie_paths[i], **kwargs) for i in found)
+    for i, preview in zip(found, previews):
+        preview_paths[i] = preview
+
+    return preview_paths
+
+
+def encode_movie(movie_path):
+    """
+    Encode a movie file to be embedded in an HTML video tag as a base64 data url.
+    Implementation from: https://github.com/jupyter/notebook/issues/1024#issuecomment-338664139
+
+    Args:
+    movie_path (str): path to the movie.
+
+    Returns:
+    encoded (str): base64 encoded movie.
+    """
+
+    with open(movie_path, 'rb') as f:
+        return base64.b64encode(f.read()).decode('ascii')
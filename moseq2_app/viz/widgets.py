@@ -186,7 +186,10 @@ class CrowdMovieCompareWidgets:
                                                 layout=widgets.Layout(display='none', width='100%',
                                                                       align_items='stretch'))
 
-        self.syllable_box = VBox([self.cm_syll_select, self.num_examples])
+        self.cm_full_quality = widgets.Checkbox(value=False, description='Full Quality Movies', style=style,
+                                                tooltip='Display the full quality crowd movies instead of their previews')
+
+        self.syllable_box = VBox([self.cm_syll_select, self.num_examples, self.cm_full_quality])
 
         self.session_box = VBox([self.cm_sources_dropdown, self.cm_session_sel, self.cm_trigger_button])
 
@@ -259,13 +262,14 @@ class CrowdMovieCompareWidgets:
 
         syll_number = int(self.cm_syll_select.value.split(' - ')[0])
 
-        # Compute current selected syllable's session dict.
-        grouped_syll_dict = self.session_dict[syll_number]['session_info']
+        # Look up the current syllable's statistics for the selected sessions
+        syll_info_df = self.info_tables[self.cm_sources_dropdown.value].get_syllable_info(syll_number,
+                                                                                          self.selected_sessions)
 
-        self.config_data['session_names'] = list(grouped_syll_dict.keys())
+        self.config_data['session_names'] = list(syll_info_df.columns)
 
         # Get Crowd Movie Divs
-        divs, self.bk_plots = self.generate_crowd_movie_divs(grouped_syll_dict)
+        divs, self.bk_plots = self.generate_crowd_movie_divs(syll_info_df)
 
         # Display generated movies
         display_crowd_movies(self.widget_box, self.curr_label, self.curr_desc, divs, self.bk_plots)
\ No newline at end of file
@@ -1,3 +1,15 @@
+import h5py
+import shutil
+import tempfile
+import threading
+import numpy as np
+from os.path import join
+from unittest import TestCase, mock
+from collections import OrderedDict
+from moseq2_extract.extract.proc import clean_frames
+from moseq2_app.gui.jobs import Job
+from moseq2_app.flip.controller import FlipRangeTool
+from moseq2_app.flip.util import SessionFrameCache, sample_selected_frames
 # import os
 # import h5py
 # import shutil
@@ -281,4 +293,184 @@
 #         assert percent_correct == 45.0
 
 #         assert exists(self.gui.output_file)
-#         os.remove(self.gui.output_file)
\ No newline at end of file
+#         os.remove(self.gui.output_file)
+
+class TestFlipFrameSampling(TestCase):
+
+    def test_sample_selected_frames(self):
+
+        selected = {'a': [(True, range(0, 60)), (False, range(100, 120))],
+                    'b': [(False, range(0, 20))]}
+
+        # selections under the cap are kept whole
+        sampled = sample_selected_frames(selected, max_frames=1000)
+        assert len(sampled['a'][True]) == 60
+        assert len(sampled['a'][False]) == 20
+        assert len(sampled['b'][False]) == 20
+
+        # selections over the cap are sampled proportionally to each session and direction
+        sampled = sample_selected_frames(selected, max_frames=50, random_state=1)
+        assert len(sampled['a'][True]) == 30
+        assert len(sampled['a'][False]) == 10
+        assert len(sampled['b'][False]) == 10
+        assert all(np.all(np.diff(idx) > 0) for d in sampled.values() for idx in d.values())
+
+        # sampling is reproducible given a seed
+        resampled = sample_selected_frames(selected, max_frames=50, random_state=1)
+        assert all(np.array_equal(sampled[s][d], resampled[s][d]) for s in sampled for d in sampled[s])
+
+
+class TestSessionFrameCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.frames = np.random.default_rng(0).integers(0, 255, size=(100, 20, 20)).astype('uint8')
+
+        self.h5_paths = {}
+        for session in ('a', 'b', 'c'):
+            self.h5_paths[session] = join(self.tmp_dir, f'{session}.h5')
+            with h5py.File(self.h5_paths[session], 'w') as f:
+                f.create_dataset('frames', data=self.frames)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_frame(self):
+
+        cache = SessionFrameCache(self.h5_paths['a'], {}, window=2, max_size=10)
+        assert cache.nframes == 100
+
+        frame = cache.get_frame(50)
+        assert np.array_equal(frame, clean_frames(self.frames[50:51])[0])
+
+        # the window around the requested frame is prefetched in the background
+        cache._prefetch_future.result()
+        assert set(cache._cache) == {48, 49, 50, 51, 52}
+
+        # out of range frames are clipped to the session
+        assert np.array_equal(cache.get_frame(1000), clean_frames(self.frames[99:100])[0])
+
+        cache.close()
+
+    def test_lru_eviction(self):
+
+        cache = SessionFrameCache(self.h5_paths['a'], {}, window=0, max_size=3)
+
+        for num in (0, 1, 2):
+            cache.get_frame(num)
+        cache._prefetch_future.result()
+
+        # reading frame 0 again marks it as the most recently used, so frame 1 is evicted next
+        cache.get_frame(0)
+        cache.get_frame(3)
+        cache._prefetch_future.result()
+        assert list(cache._cache) == [2, 0, 3]
+
+        cache.close()
+
+    def test_prefetch_cancellation(self):
+
+        cache = SessionFrameCache(self.h5_paths['a'], {}, window=5, max_size=100)
+
+        # a prefetch scheduled before the latest request stops without reading any frames
+        generation = cache._generation
+        cache._generation += 1
+        cache._prefetch(20, generation)
+        assert len(cache._cache) == 0
+
+        # the current request's prefetch fills the window
+        cache._prefetch(20, cache._generation)
+        assert set(cache._cache) == set(range(15, 26))
+
+        cache.close()
+
+    def test_close(self):
+
+        cache = SessionFrameCache(self.h5_paths['a'], {}, window=2, max_size=10)
+        generation = cache._generation
+        cache.get_frame(10)
+        cache.close()
+
+        assert not cache._h5.id.valid
+        assert len(cache._cache) == 0
+        # pending prefetches are stale once the cache is closed
+        assert cache._generation > generation + 1
+        with self.assertRaises(RuntimeError):
+            cache._executor.submit(cache._prefetch, 10, cache._generation)
+
+        # closing twice is a no-op
+        cache.close()
+
+    def test_max_open_sessions(self):
+
+        tool = FlipRangeTool.__new__(FlipRangeTool)
+        tool.path_dict = self.h5_paths
+        tool.clean_parameters = {}
+        tool.frame_caches = OrderedDict()
+        tool.max_open_sessions = 2
+        tool.frame_cache_lock = threading.Lock()
+        tool.flipping = False
+
+        a = tool.get_frame_cache('a')
+        b = tool.get_frame_cache('b')
+        assert tool.get_frame_cache('a') is a
+
+        # opening a third session closes the least recently used one
+        c = tool.get_frame_cache('c')
+        assert list(tool.frame_caches) == ['a', 'c']
+        assert not b._h5.id.valid
+        assert a._h5.id.valid and c._h5.id.valid
+
+        tool.close_frame_caches()
+        assert len(tool.frame_caches) == 0
+        assert not a._h5.id.valid and not c._h5.id.valid
+
+    def test_apply_flip_classifier_resume(self):
+
+        with h5py.File(self.h5_paths['a'], 'a') as f:
+            f.create_dataset('scalars/angle', data=np.zeros(100))
+
+        tool = FlipRangeTool.__new__(FlipRangeTool)
+        tool.path_dict = {'a': self.h5_paths['a']}
+        tool.clean_parameters = {}
+        tool.frame_caches = OrderedDict()
+        tool.max_open_sessions = 2
+        tool.frame_cache_lock = threading.Lock()
+        tool.flipping = False
+        tool.clf = object()
+        tool.output_file = 'clf.p'
+
+        tool.get_frame_cache('a')
+        calls = []
+
+        def get_flips(frames, flip_file=None, smoothing=None):
+            # caches cannot be reopened while the sessions are flipped
+            with self.assertRaises(RuntimeError):
+                tool.get_frame_cache('a')
+            calls.append(len(calls))
+            if len(calls) == 2:
+                raise ValueError('interrupted')
+            return np.ones(len(frames), dtype='bool')
+
+        batches = [range(0, 40), range(40, 80), range(80, 100)]
+        with mock.patch('moseq2_app.flip.controller.get_flips', side_effect=get_flips), \
+                mock.patch('moseq2_app.flip.controller.gen_batch_sequence', return_value=batches):
+            job = Job('flip', tool.apply_flip_classifier, kwargs={'verbose': False})
+            job.run()
+            assert job.status == 'failed', job.error
+            assert job.state['written_batches'] == {'a': 1}
+            assert len(tool.frame_caches) == 0 and not tool.flipping
+
+            # the resumed job skips the batch it already flipped
+            job.run()
+            assert job.status == 'done'
+            assert job.state['flipped'] == ['a']
+            assert len(calls) == 4
+
+        # every frame is rotated exactly once
+        with h5py.File(self.h5_paths['a'], 'r') as f:
+            assert np.array_equal(f['frames'][()], np.rot90(self.frames, k=2, axes=(1, 2)))
+
+        # the widget can read frames again once the flip is done
+        assert tool.get_frame_cache('a').nframes == 100
+        tool.close_frame_caches()
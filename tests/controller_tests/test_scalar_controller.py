@@ -1,7 +1,16 @@
+import os
+import shutil
+import tempfile
 import unittest
-from unittest import TestCase
+import numpy as np
+import pandas as pd
+from unittest import TestCase, mock
 from plotly.offline import init_notebook_mode
+from moseq2_viz.scalars.util import scalars_to_dataframe
 from moseq2_app.scalars.controller import InteractiveScalarViewer
+from moseq2_app.scalars.util import (rebin_histograms, get_scalar_summary, get_scalar_histograms,
+                                     get_scalar_summary_path, get_scalar_histogram_path, scalar_columns,
+                                     _summary_cache, _histogram_cache)
 
 class TestInteractiveScalarViewer(TestCase):
 
@@ -12,6 +21,10 @@ class TestInteractiveScalarViewer(TestCase):
 
     def tearDown(self):
         del self.gui
+        # remove the session summaries cached next to the shared test index
+        for path in (get_scalar_summary_path(self.index_file), get_scalar_histogram_path(self.index_file)):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_init(self):
         assert list(self.gui.checked_list.value) == ['area_mm', 'velocity_2d_mm']
@@ -19,10 +32,139 @@ class TestInteractiveScalarViewer(TestCase):
     def test_on_clear(self):
         self.gui.on_clear()
 
+    def test_scalar_summary(self):
+        assert len(self.gui.mean_df) == len(self.gui.sorted_index['files'])
+        assert len(self.gui.std_df) == len(self.gui.mean_df)
+        assert set(self.gui.checked_list.options).issubset(self.gui.mean_df.columns)
+
+        # the session summaries match the means and STDs of the full frame-level DataFrame
+        scalar_df = scalars_to_dataframe(self.gui.sorted_index)
+        columns = [c for c in scalar_columns if c in scalar_df.columns]
+        for df, expected in ((self.gui.mean_df, scalar_df.groupby('uuid')[columns].mean()),
+                             (self.gui.std_df, scalar_df.groupby('uuid')[columns].std())):
+            np.testing.assert_allclose(df.set_index('uuid').loc[expected.index, columns].to_numpy(),
+                                       expected.to_numpy())
+
     def test_make_graphs(self):
         self.gui.make_graphs()
 
         assert self.gui.fig != None
 
+        # toggling a column reuses the cached traces of the other columns
+        n_cached = len(self.gui.trace_cache)
+        self.gui.checked_list.value = ['area_mm']
+        self.gui.make_graphs()
+        assert len(self.gui.trace_cache) == n_cached
+        assert len(self.gui.fig.data) == 2 * len(self.gui.unique_groups)
+
+    def test_frame_level_distributions(self):
+        self.gui.checked_list.value = ['area_mm']
+        self.gui.frame_level.value = True
+        self.gui.make_graphs()
+
+        assert len(self.gui.fig.data) == 5 * len(self.gui.unique_groups)
+        assert set(self.gui.histograms) == set(self.gui.sorted_index['files'])
+
+        for g in self.gui.unique_groups:
+            _, _, line = self.gui.distribution_cache[('area_mm', g)]
+            # each group's mean density integrates to 1
+            assert np.isclose(np.sum(line.y) * np.diff(line.x)[0], 1)
+
+    def test_rebin_histograms(self):
+        counts = np.array([[1, 2, 3, 4], [4, 0, 0, 0]])
+        ranges = np.array([[0, 4], [2, 2]])
+        rebinned = rebin_histograms(counts, ranges, np.array([0, 2, 4]))
+
+        np.testing.assert_allclose(rebinned, [[3, 7], [0, 4]])
+
+
+class TestScalarSummaryCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmp_dir, 'moseq2-index.yaml')
+
+        files = {}
+        for k, uuid in enumerate(['uuid0', 'uuid1', 'uuid2']):
+            h5_path = os.path.join(self.tmp_dir, f'{uuid}.h5')
+            # the last session's h5 file is missing
+            if k < 2:
+                open(h5_path, 'w').close()
+                os.utime(h5_path, (1000 + k, 1000 + k))
+            files[uuid] = {'path': [h5_path, h5_path.replace('.h5', '.yaml')], 'group': 'ab'[k % 2],
+                           'metadata': {'SessionName': f'session{k}', 'SubjectName': f'mouse{k}'}}
+        self.sorted_index = {'files': files, 'pca_path': 'pca.h5'}
+
+        _summary_cache.clear()
+        _histogram_cache.clear()
+
+    def tearDown(self):
+        _summary_cache.clear()
+        _histogram_cache.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def fake_scalars_to_dataframe(self, sorted_index, model_path=None):
+        # deterministic frame-level scalars of each session in the index
+        frames = []
+        for uuid in sorted_index['files']:
+            rng = np.random.default_rng(int(uuid[-1]))
+            frames.append(pd.DataFrame({'uuid': uuid, **{c: rng.normal(size=50) for c in scalar_columns}}))
+        return pd.concat(frames, ignore_index=True)
+
+    def test_scalar_summary_values(self):
+
+        with mock.patch('moseq2_app.scalars.util.scalars_to_dataframe', side_effect=self.fake_scalars_to_dataframe):
+            summary_df = get_scalar_summary(self.sorted_index, n_jobs=1).set_index('uuid')
+
+        # the session summaries match the means and STDs of the full frame-level DataFrame
+        scalar_df = self.fake_scalars_to_dataframe(self.sorted_index)
+        means = scalar_df.groupby('uuid')[scalar_columns].mean()
+        stds = scalar_df.groupby('uuid')[scalar_columns].std()
+        np.testing.assert_allclose(summary_df.loc[means.index, [f'{c}_mean' for c in scalar_columns]], means)
+        np.testing.assert_allclose(summary_df.loc[stds.index, [f'{c}_std' for c in scalar_columns]], stds)
+
+    def test_scalar_summary_cache(self):
+
+        summary_path = get_scalar_summary_path(self.index_path)
+        with mock.patch('moseq2_app.scalars.util.scalars_to_dataframe',
+                        side_effect=self.fake_scalars_to_dataframe) as load:
+            summary_df = get_scalar_summary(self.sorted_index, summary_path=summary_path, n_jobs=1)
+            assert load.call_count == 3
+            assert os.path.exists(summary_path)
+
+            # unchanged sessions, including the one whose h5 file is missing, are read from the cache file
+            _summary_cache.clear()
+            cached_df = get_scalar_summary(self.sorted_index, summary_path=summary_path, n_jobs=1)
+            assert load.call_count == 3
+            pd.testing.assert_frame_equal(cached_df, summary_df)
+
+            # only the modified session is loaded again
+            os.utime(self.sorted_index['files']['uuid1']['path'][0], (2000, 2000))
+            _summary_cache.clear()
+            get_scalar_summary(self.sorted_index, summary_path=summary_path, n_jobs=1)
+            assert load.call_count == 4
+            assert load.call_args[0][0]['files'].keys() == {'uuid1'}
+
+    def test_scalar_histograms_cache(self):
+
+        histogram_path = get_scalar_histogram_path(self.index_path)
+        with mock.patch('moseq2_app.scalars.util.scalars_to_dataframe',
+                        side_effect=self.fake_scalars_to_dataframe) as load:
+            histograms = get_scalar_histograms(self.sorted_index, histogram_path=histogram_path, n_bins=10, n_jobs=1)
+            assert load.call_count == 3
+
+            # unchanged sessions, including the one whose h5 file is missing, are read from the cache file
+            _histogram_cache.clear()
+            cached = get_scalar_histograms(self.sorted_index, histogram_path=histogram_path, n_bins=10, n_jobs=1)
+            assert load.call_count == 3
+            np.testing.assert_array_equal(cached['uuid2']['area_mm'][0], histograms['uuid2']['area_mm'][0])
+
+            # only the modified session is loaded again
+            os.utime(self.sorted_index['files']['uuid0']['path'][0], (2000, 2000))
+            _histogram_cache.clear()
+            get_scalar_histograms(self.sorted_index, histogram_path=histogram_path, n_bins=10, n_jobs=1)
+            assert load.call_count == 4
+            assert load.call_args[0][0]['files'].keys() == {'uuid0'}
+
 if __name__ == '__main__':
     unittest.main()
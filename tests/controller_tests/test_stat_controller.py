@@ -1,12 +1,19 @@
 import os
 import shutil
+import tempfile
 import bokeh.io
+import numpy as np
+import pandas as pd
+import networkx as nx
 from os.path import exists
-from unittest import TestCase
+from collections import OrderedDict
+from unittest import TestCase, mock
 from moseq2_app.main import label_syllables
+from moseq2_viz.model.stat import run_kruskal
 from moseq2_viz.model.util import relabel_by_usage
 from moseq2_viz.model.trans_graph import get_trans_graph_groups
 from moseq2_app.stat.controller import InteractiveSyllableStats, InteractiveTransitionGraph
+from moseq2_app.stat.parallel import rank_columns, run_kruskal_parallel
 
 # class TestSyllableStatController(TestCase):
 
@@ -310,3 +317,191 @@ from moseq2_app.stat.controller import InteractiveSyllableStats, InteractiveTran
 #                                                      self.gui.edge_thresholder.value,
 #                                                      self.gui.usage_thresholder.value,
 #                                                      self.gui.speed_thresholder.value)
+
+class TestParallelKruskal(TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(1)
+        rows = []
+        for g in ['a', 'b', 'c']:
+            for u in range(6):
+                for s in range(8):
+                    usage = np.round(rng.random() + (g == 'b') * (s < 3), 1)
+                    rows.append({'group': g, 'uuid': f'{g}{u}', 'syllable': s, 'usage': usage})
+        self.df = pd.DataFrame(rows)
+
+    def test_rank_columns(self):
+
+        # tied values are assigned their average rank
+        ranks, tie_sums = rank_columns(np.array([[1.], [2.], [2.], [3.]]))
+        assert np.all(ranks[:, 0] == [1, 2.5, 2.5, 4])
+        assert tie_sums[0] == 6
+
+    def test_run_kruskal_parallel(self):
+
+        df_k, dunn_df, sig = run_kruskal_parallel(self.df, max_syllable=8, n_perm=1000, n_jobs=1, batch_size=300)
+        assert len(df_k) == 8
+        assert set(sig) == {('a', 'b'), ('a', 'c'), ('b', 'c')}
+        assert list(sig[('a', 'b')]) == [0, 1, 2]
+
+        # results do not depend on the number of jobs or the batch size
+        df_k2, dunn_df2, _ = run_kruskal_parallel(self.df, max_syllable=8, n_perm=1000, n_jobs=2, batch_size=128)
+        assert df_k.equals(df_k2)
+        assert dunn_df.equals(dunn_df2)
+
+    def test_matches_run_kruskal(self):
+
+        # the parallel test yields the same statistics and significant syllables as moseq2_viz for a fixed seed
+        df_k, _, sig = run_kruskal_parallel(self.df, max_syllable=8, n_perm=1000, seed=0, n_jobs=2, batch_size=300)
+        df_k_ref, _, sig_ref = run_kruskal(self.df, statistic='usage', max_syllable=8, n_perm=1000, seed=0)
+
+        np.testing.assert_allclose(df_k['statistic'], df_k_ref['statistic'])
+        np.testing.assert_allclose(df_k['p_adj'], df_k_ref['p_adj'])
+        assert list(df_k['is_sig']) == list(df_k_ref['is_sig'])
+
+        assert set(sig) == set(sig_ref)
+        for pair in sig_ref:
+            assert list(sig[pair]) == list(sig_ref[pair])
+
+class TestSyllableAggregates(TestCase):
+
+    def test_get_syllable_aggregates(self):
+
+        rng = np.random.default_rng(0)
+        gui = InteractiveSyllableStats.__new__(InteractiveSyllableStats)
+        gui.df = pd.DataFrame({
+            'group': np.repeat(['a', 'b'], 30),
+            'syllable': np.tile(np.repeat([0, 1, 2], 10), 2),
+            'usage': rng.random(60),
+            'duration': rng.random(60),
+        })
+        gui.aggregates = {}
+
+        # confidence intervals are only computed for the selected statistic
+        aggregates = gui.get_syllable_aggregates('group', 'CI 95%', 'usage')
+        assert set(aggregates['a']['err']) == {'usage'}
+
+        # selecting another statistic adds its intervals to the cached aggregates
+        assert gui.get_syllable_aggregates('group', 'CI 95%', 'duration') is aggregates
+        assert set(aggregates['a']['err']) == {'usage', 'duration'}
+
+        # other error bars do not require bootstrapping
+        sem = gui.get_syllable_aggregates('group', 'SEM', 'usage')
+        assert list(sem['a']['err'].columns) == ['usage', 'duration']
+
+class TestHypothesisTestCache(TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.stat_test_path = os.path.join(self.out_dir, 'syll_stat_tests.yaml')
+
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({
+            'group': np.repeat(['a', 'b'], 30),
+            'uuid': np.repeat([f'u{i}' for i in range(6)], 10),
+            'syllable': np.tile(np.repeat([0, 1], 5), 6),
+            'usage': rng.random(60),
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def make_gui(self, df):
+        gui = InteractiveSyllableStats.__new__(InteractiveSyllableStats)
+        gui.df = df
+        gui.max_sylls = 2
+        gui.stat_test_path = self.stat_test_path
+        gui.df_fingerprint = None
+        gui.stat_test_results = {}
+        gui.dropdown_mapping = {'Z-Test': 'z_test', 'T-Test': 't_test'}
+        return gui
+
+    def test_run_selected_hypothesis_test(self):
+
+        stats = pd.DataFrame({'is_sig': [True, False]}, index=[0, 1])
+
+        with mock.patch('moseq2_app.stat.controller.run_pairwise_stats', return_value=stats) as run:
+            gui = self.make_gui(self.df)
+            assert gui.run_selected_hypothesis_test('Z-Test', 'usage', 'a', 'b') == [0]
+            assert run.call_count == 1
+
+            # repeated calls are cache hits
+            assert gui.run_selected_hypothesis_test('Z-Test', 'usage', 'a', 'b') == [0]
+            assert run.call_count == 1
+
+            # other tests or group pairs are computed
+            gui.run_selected_hypothesis_test('T-Test', 'usage', 'a', 'b')
+            assert run.call_count == 2
+
+            # results are saved along with the DataFrame's fingerprint, and reloaded for the same DataFrame
+            assert exists(self.stat_test_path)
+            gui = self.make_gui(self.df.copy())
+            assert gui.run_selected_hypothesis_test('Z-Test', 'usage', 'a', 'b') == [0]
+            assert gui.run_selected_hypothesis_test('T-Test', 'usage', 'a', 'b') == [0]
+            assert run.call_count == 2
+
+            # saved results are ignored once the DataFrame changes
+            gui = self.make_gui(self.df.assign(usage=self.df['usage'] * 2))
+            gui.run_selected_hypothesis_test('Z-Test', 'usage', 'a', 'b')
+            assert run.call_count == 3
+
+class TestTransitionGraphController(TestCase):
+
+    def setUp(self):
+        self.gui = InteractiveTransitionGraph.__new__(InteractiveTransitionGraph)
+        self.gui.layout_cache = OrderedDict()
+        self.gui.max_cached_layouts = 128
+        self.gui.max_sylls = 20
+
+        self.graph = nx.DiGraph()
+        self.graph.add_edges_from((i, (i + 1) % 20) for i in range(20))
+
+    def test_get_layout_positions(self):
+
+        def get_pos(graph, layout, nnodes):
+            return nx.spring_layout(graph, seed=1)
+
+        with mock.patch('moseq2_app.stat.controller.get_pos', side_effect=get_pos) as pos_mock, \
+                mock.patch('moseq2_app.stat.controller.nx.spring_layout', wraps=nx.spring_layout) as spring:
+            pos = self.gui.get_layout_positions(self.graph, 'spring')
+            assert pos_mock.call_count == 1
+
+            # the same node set returns the cached positions
+            cached = self.gui.get_layout_positions(self.graph.copy(), 'spring')
+            assert pos_mock.call_count == 1
+            assert all(np.array_equal(pos[n], cached[n]) for n in self.graph.nodes)
+
+            # removing a node seeds the spring layout from the previous positions
+            spring.reset_mock()
+            subgraph = self.graph.subgraph(range(19)).copy()
+            seeded = self.gui.get_layout_positions(subgraph, 'spring')
+            assert pos_mock.call_count == 1
+            assert spring.call_count == 1
+            init_pos = spring.call_args[1]['pos']
+            assert set(init_pos) == set(range(19))
+            assert all(np.array_equal(init_pos[n], pos[n]) for n in init_pos)
+            assert set(seeded) == set(range(19))
+
+            # node sets that differ too much are laid out from scratch
+            self.gui.get_layout_positions(self.graph.subgraph(range(10)).copy(), 'spring')
+            assert pos_mock.call_count == 2
+
+            # other layouts never reuse the spring positions
+            self.gui.get_layout_positions(self.graph, 'circular')
+            assert pos_mock.call_count == 3
+
+    def test_get_difference_pair_indices(self):
+
+        self.gui.group = ['ctrl', 'ko', 'wt']
+
+        self.gui.difference_pairs = None
+        assert self.gui.get_difference_pair_indices() is None
+
+        self.gui.difference_pairs = [('wt', 'ko'), ('ctrl', 'wt')]
+        assert self.gui.get_difference_pair_indices() == [(2, 1), (0, 2)]
+
+        # unknown groups are reported along with the valid ones
+        self.gui.difference_pairs = [('wt', 'ko'), ('ctrl', 'mutant')]
+        with self.assertRaisesRegex(ValueError, r"\('ctrl', 'mutant'\).*ctrl, ko, wt"):
+            self.gui.get_difference_pair_indices()
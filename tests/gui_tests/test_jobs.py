@@ -0,0 +1,120 @@
+import os
+import sys
+import shutil
+import threading
+from unittest import TestCase
+from moseq2_app.gui.jobs import JobRunner, JobStatusPanel
+
+
+class TestJobRunner(TestCase):
+
+    def setUp(self):
+        self.runner = JobRunner(max_workers=1)
+        self.out_dir = 'data/test_jobs/'
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def tearDown(self):
+        self.runner.executor.shutdown(wait=True)
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_submit(self):
+
+        job = self.runner.submit('add', lambda a, b: a + b, 1, b=2)
+        assert self.runner.wait(job.id, timeout=10) == 3
+        assert job.status == 'done'
+
+        failed = self.runner.submit('fail', lambda: 1 / 0)
+        self.runner.wait(failed.id, timeout=10)
+        assert failed.status == 'failed'
+        assert 'ZeroDivisionError' in failed.error
+
+    def test_cancel_and_resume(self):
+
+        started, proceed = threading.Event(), threading.Event()
+
+        def process(items, job):
+            done = job.state.setdefault('done', [])
+            for i, item in enumerate(items):
+                if item in done:
+                    continue
+                job.report(progress=i / len(items), message=f'processing {item}')
+                done.append(item)
+                started.set()
+                proceed.wait(timeout=10)
+            return list(done)
+
+        panel = JobStatusPanel(self.runner)
+        job = self.runner.submit('process', process, ['a', 'b', 'c'])
+        assert job.id in panel.rows
+
+        started.wait(timeout=10)
+        job.cancel()
+        proceed.set()
+        self.runner.wait(job.id, timeout=10)
+        assert job.status == 'cancelled'
+        assert job.state['done'] == ['a']
+
+        # resumed jobs skip the items they already processed
+        self.runner.resume(job.id)
+        assert self.runner.wait(job.id, timeout=10) == ['a', 'b', 'c']
+        assert job.status == 'done'
+        assert panel.rows[job.id][0].value == 1
+
+    def test_job_output(self):
+
+        def say(text):
+            print(text)
+            sys.stderr.write('warning')
+
+        job = self.runner.submit('say', say, 'hello')
+        self.runner.wait(job.id, timeout=10)
+
+        # text printed from the worker thread is appended to the job's output widget
+        outputs = [(o['name'], o['text']) for o in job.output.outputs]
+        assert ('stdout', 'hello') in outputs
+        assert ('stderr', 'warning') in outputs
+
+        # text printed from other threads is not captured
+        print('main thread')
+        assert ('stdout', 'main thread\n') not in [(o['name'], o['text']) for o in job.output.outputs]
+
+    def test_get_status_panel(self):
+
+        panel = self.runner.get_status_panel()
+        assert self.runner.get_status_panel() is panel
+        assert len(self.runner._listeners) == 1
+
+        job = self.runner.submit('add', lambda a, b: a + b, 1, 2)
+        self.runner.wait(job.id, timeout=10)
+        assert list(panel.rows) == [job.id]
+        assert len(job._callbacks) == 1
+
+    def test_atomic_output(self):
+
+        path = os.path.join(self.out_dir, 'result.txt')
+
+        def write(text, job):
+            with job.atomic_output(path) as tmp_path:
+                with open(tmp_path, 'w') as f:
+                    f.write(text)
+                job.report(message='written')
+            return path
+
+        job = self.runner.submit('write', write, 'result')
+        self.runner.wait(job.id, timeout=10)
+        with open(path) as f:
+            assert f.read() == 'result'
+
+        # failed writes leave the previous output in place
+        def fail(job):
+            with job.atomic_output(path) as tmp_path:
+                with open(tmp_path, 'w') as f:
+                    f.write('partial')
+                raise ValueError('failed')
+
+        job = self.runner.submit('fail', fail)
+        self.runner.wait(job.id, timeout=10)
+        assert job.status == 'failed'
+        with open(path) as f:
+            assert f.read() == 'result'
+        assert os.listdir(self.out_dir) == ['result.txt']
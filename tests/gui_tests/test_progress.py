@@ -6,7 +6,7 @@ from moseq2_viz.util import read_yaml
 from unittest import TestCase
 from os.path import exists, join
 from moseq2_extract.helpers.wrappers import extract_wrapper
-from moseq2_app.gui.progress import generate_missing_metadata, get_session_paths, update_progress, \
+from moseq2_app.gui.progress import generate_missing_metadata, get_session_paths, update_progress, update_progress_vars, \
     restore_progress_vars, get_pca_progress, load_progress, \
     get_extraction_progress, print_progress, check_progress, find_progress, generate_intital_progressfile
 
@@ -72,6 +72,29 @@ class TestNotebookProgress(TestCase):
 
         os.remove(progress_file)
 
+    def test_update_progress_vars(self):
+
+        base_dir = 'data/'
+        progress_file = join(base_dir, 'progress.yaml')
+
+        with open(progress_file, 'w') as f:
+            yaml.safe_dump(self.base_progress_vars, f)
+
+        new_prog = update_progress_vars(progress_file, {'config_file': 'test_path', 'index_file': 'test_index'})
+        assert new_prog['config_file'] == 'test_path'
+        assert new_prog['index_file'] == 'test_index'
+
+        read_progs = read_yaml(progress_file)
+        assert read_progs == new_prog
+
+        # unchanged variables do not rewrite the progress file
+        mtime = os.stat(progress_file).st_mtime_ns
+        same_prog = update_progress_vars(progress_file, {'config_file': 'test_path'})
+        assert same_prog['snapshot'] == new_prog['snapshot']
+        assert os.stat(progress_file).st_mtime_ns == mtime
+
+        os.remove(progress_file)
+
     def test_find_progress(self):
         base_dir = 'data/'
         progress_file = join(base_dir, 'progress.yaml')
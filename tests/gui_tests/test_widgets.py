@@ -0,0 +1,69 @@
+import os
+import shutil
+import ruamel.yaml as yaml
+from unittest import TestCase, mock
+from moseq2_app.gui.widgets import GroupSettingWidgets
+
+
+class TestGroupSettingWidgets(TestCase):
+
+    def setUp(self):
+        self.out_dir = 'data/test_group_setting/'
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.index_path = os.path.join(self.out_dir, 'moseq2-index.yaml')
+
+        files = [{'uuid': f'uuid{i}', 'group': 'default',
+                  'path': [f'session{i}/results_00.h5', f'session{i}/results_00.yaml'],
+                  'metadata': {'SessionName': f'session{i}', 'SubjectName': f'mouse{i}'},
+                  'extra': i} for i in range(4)]
+        with open(self.index_path, 'w') as f:
+            yaml.safe_dump({'files': files, 'pca_path': 'pca.h5', 'other': 'kept'}, f)
+        os.utime(self.index_path, (1000, 1000))
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def read_index(self):
+        with open(self.index_path, 'r') as f:
+            return yaml.safe_load(f)
+
+    def test_update_table(self):
+
+        gui = GroupSettingWidgets(self.index_path)
+
+        gui.qgrid_widget.change_selection([1, 3])
+        gui.group_input.value = 'treatment'
+        gui.update_table()
+
+        assert list(gui.df['group']) == ['default', 'treatment', 'default', 'treatment']
+        assert list(gui.qgrid_widget.get_changed_df()['group']) == list(gui.df['group'])
+
+    def test_update_clicked(self):
+
+        gui = GroupSettingWidgets(self.index_path)
+        before = self.read_index()
+
+        gui.qgrid_widget.change_selection([0, 2])
+        gui.group_input.value = 'treatment'
+        gui.update_table()
+        gui.update_clicked()
+
+        # only the group names of the selected sessions change, the other fields are kept
+        after = self.read_index()
+        assert [f['group'] for f in after['files']] == ['treatment', 'default', 'treatment', 'default']
+        for f in before['files']:
+            f['group'] = 'treatment' if f['uuid'] in ('uuid0', 'uuid2') else f['group']
+        assert after == before
+        assert gui.update_index_button.button_style == 'success'
+
+    def test_update_clicked_unchanged(self):
+
+        gui = GroupSettingWidgets(self.index_path)
+
+        # saving a table without changes does not rewrite the index file
+        with mock.patch('moseq2_app.gui.widgets.os.replace') as replace:
+            gui.update_clicked()
+        replace.assert_not_called()
+        assert os.path.getmtime(self.index_path) == 1000
+        assert not os.path.exists(f'{self.index_path}.tmp')
+        assert gui.update_index_button.button_style == 'success'
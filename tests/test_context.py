@@ -0,0 +1,135 @@
+import os
+import shutil
+import pandas as pd
+import ruamel.yaml as yaml
+from unittest import TestCase, mock
+from moseq2_app.context import get_data_context, clear_data_contexts
+from fastparquet import ParquetFile
+from moseq2_app.gui.jobs import JobCancelled
+from moseq2_app.util import (write_syllable_stats, read_syllable_stats, read_syllable_df,
+                             get_syllable_stats_manifest_path)
+
+
+class TestDataContext(TestCase):
+
+    def setUp(self):
+        self.out_dir = 'data/test_data_context/'
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.info_path = os.path.join(self.out_dir, 'syll_info.yaml')
+        self.progress_paths = {'model_path': os.path.join(self.out_dir, 'model.p'),
+                               'index_file': os.path.join(self.out_dir, 'moseq2-index.yaml')}
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def write_info(self, label, mtime):
+        with open(self.info_path, 'w') as f:
+            yaml.safe_dump({0: {'label': label, 'desc': '', 'crowd_movie_path': ''}}, f)
+        os.utime(self.info_path, (mtime, mtime))
+
+    def test_get_syll_info(self):
+
+        context = get_data_context(self.progress_paths)
+        assert get_data_context(dict(self.progress_paths)) is context
+
+        self.write_info('walk', 1000)
+        syll_info = context.get_syll_info(self.info_path)
+        assert syll_info[0]['label'] == 'walk'
+
+        # returned dicts are copies of the cached one
+        syll_info[0]['label'] = 'run'
+        assert context.get_syll_info(self.info_path)[0]['label'] == 'walk'
+
+        # modifying the file invalidates the cached dict
+        self.write_info('rear', 2000)
+        assert context.get_syll_info(self.info_path)[0]['label'] == 'rear'
+
+    def test_context_eviction(self):
+
+        context = get_data_context(self.progress_paths)
+        self.write_info('walk', 1000)
+        context.get_syll_info(self.info_path)
+        assert len(context._cache) > 0
+
+        # opening another (model, index) pair releases the previous context's artifacts
+        other_paths = {'model_path': os.path.join(self.out_dir, 'other_model.p'),
+                       'index_file': self.progress_paths['index_file']}
+        other = get_data_context(other_paths)
+        assert other is not context
+        assert len(context._cache) == 0
+        assert get_data_context(dict(other_paths)) is other
+        assert get_data_context(self.progress_paths) is not context
+
+        # contexts can be kept side by side
+        other = get_data_context(other_paths, max_contexts=2)
+        assert get_data_context(self.progress_paths, max_contexts=2) is not other
+        assert get_data_context(other_paths, max_contexts=2) is other
+
+        other.get_syll_info(self.info_path)
+        clear_data_contexts()
+        assert len(other._cache) == 0
+        assert get_data_context(other_paths) is not other
+
+    def test_materialized_syllable_stats(self):
+
+        df = pd.DataFrame({'group': ['a', 'b'], 'SessionName': ['s1', 's2'], 'SubjectName': ['m1', 'm2'],
+                           'syllable': [0, 0], 'usage': [.5, .25]})
+        scalar_df = pd.DataFrame({'uuid': ['u1', 'u1', 'u2'], 'velocity_2d_mm': [1., 2., 3.]})
+        df_path = os.path.join(self.out_dir, 'syll_df.parquet')
+
+        assert read_syllable_stats(df_path, 'abc')[0] is None
+
+        write_syllable_stats(df, scalar_df, df_path, 'abc')
+        assert os.path.exists(os.path.join(self.out_dir, 'moseq_scalar_dataframe.parquet'))
+
+        loaded_df, loaded_scalars = read_syllable_stats(df_path, 'abc', load_scalars=True)
+        pd.testing.assert_frame_equal(loaded_df[df.columns].reset_index(drop=True), df)
+        assert len(loaded_scalars) == 3
+
+        # files written from different inputs are not reused
+        assert read_syllable_stats(df_path, 'def')[0] is None
+
+    def test_read_syllable_df(self):
+
+        df = pd.DataFrame({'group': ['a', 'b'] * 4, 'SessionName': ['s1', 's2'] * 4, 'SubjectName': ['m1', 'm2'] * 4,
+                           'syllable': [3, 3, 2, 2, 1, 1, 0, 0], 'usage': range(8), 'duration': range(8)})
+        df_path = os.path.join(self.out_dir, 'syll_df.parquet')
+        write_syllable_stats(df, None, df_path, 'abc')
+
+        # one row group per syllable
+        assert len(ParquetFile(df_path).row_groups) == 4
+
+        selected = read_syllable_df(df_path, columns=['syllable', 'usage'], max_syllable=2, groups=['b'])
+        assert list(selected.columns) == ['syllable', 'usage']
+        assert selected['syllable'].tolist() == [0, 1]
+        assert selected['usage'].tolist() == [7, 5]
+
+    def test_get_syllable_dataframes_report(self):
+
+        df = pd.DataFrame({'group': ['a', 'b'], 'SessionName': ['s1', 's2'], 'SubjectName': ['m1', 'm2'],
+                           'syllable': [0, 0], 'usage': [.5, .25]})
+        scalar_df = pd.DataFrame({'uuid': ['u1', 'u1', 'u2'], 'velocity_2d_mm': [1., 2., 3.]})
+        df_path = os.path.join(self.out_dir, 'syll_df.parquet')
+        messages = []
+
+        def report(progress=None, message=None):
+            messages.append(message)
+            # stop once the statistics are merged, before the frame-level scalars are written
+            if message == 'Writing the frame-level scalars' and messages.count(message) == 1:
+                raise JobCancelled()
+
+        context = get_data_context(self.progress_paths)
+        with mock.patch('moseq2_app.context.merge_labels_with_scalars', return_value=(df, scalar_df)) as merge, \
+                mock.patch('moseq2_app.context.get_syllable_stats_fingerprint', return_value='abc'), \
+                mock.patch.object(context, 'get_sorted_index', return_value={}):
+            with self.assertRaises(JobCancelled):
+                context.get_syllable_dataframes(df_path=df_path, load_scalars=False, report=report)
+            assert merge.call_args[1]['report'] is report
+            # cancelled writes leave no manifest behind
+            assert not os.path.exists(get_syllable_stats_manifest_path(df_path))
+
+            # the next call writes the statistics merged before it was cancelled
+            loaded_df, _ = context.get_syllable_dataframes(df_path=df_path, load_scalars=False, report=report)
+            assert merge.call_count == 1
+            assert os.path.exists(get_syllable_stats_manifest_path(df_path))
+            assert loaded_df['usage'].tolist() == [.5, .25]
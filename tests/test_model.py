@@ -0,0 +1,59 @@
+import os
+import shutil
+import numpy as np
+from unittest import TestCase
+from moseq2_app.model import ModelLabelStore, get_usage_mapping
+
+
+class TestModelLabelStore(TestCase):
+
+    def setUp(self):
+        self.model_fit = {
+            'labels': [np.array([-5, -5, 2, 2, 0, 1, 1, 2]), np.array([-5, 2, 2, 1, 2])],
+            'keys': ['uuid1', 'uuid2'],
+            'metadata': {'uuids': ['uuid1', 'uuid2'], 'groups': {'uuid1': 'a', 'uuid2': 'b'}},
+        }
+        self.out_dir = 'data/test_label_store/'
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_get_usage_mapping(self):
+
+        store = ModelLabelStore.from_model_dict(self.model_fit)
+        np.testing.assert_array_equal(store.offsets, [0, 8, 13])
+
+        # syllable 2 has 4 instances, syllable 1 has 2 and syllable 0 has 1
+        mapping = get_usage_mapping(store.labels, store.offsets)
+        np.testing.assert_array_equal(mapping, [2, 1, 0])
+
+    def test_all_negative_labels(self):
+
+        model_fit = dict(self.model_fit, labels=[np.array([-5, -5, -5]), np.array([-5, -5])])
+        store = ModelLabelStore.from_model_dict(model_fit)
+
+        # padding-only sessions have no syllables, and their labels are left unchanged
+        assert len(get_usage_mapping(store.labels, store.offsets)) == 0
+        np.testing.assert_array_equal(store.relabeled, [-5] * 5)
+        np.testing.assert_array_equal(store.to_model_dict()['labels'][1], [-5, -5])
+
+    def test_to_model_dict(self):
+
+        model_dict = ModelLabelStore.from_model_dict(self.model_fit).to_model_dict()
+
+        np.testing.assert_array_equal(model_dict['labels'][0], [-5, -5, 0, 0, 2, 1, 1, 0])
+        np.testing.assert_array_equal(model_dict['labels'][1], [-5, 0, 0, 1, 0])
+        assert model_dict['metadata']['groups'] == {'uuid1': 'a', 'uuid2': 'b'}
+
+    def test_save_and_load(self):
+
+        store = ModelLabelStore.from_model_dict(self.model_fit)
+        path = os.path.join(self.out_dir, 'model_labels.npz')
+        store.save(path, model_mtime=12.5)
+
+        loaded, model_mtime = ModelLabelStore.load(path)
+        assert model_mtime == 12.5
+        assert isinstance(loaded.labels, np.memmap)
+        assert loaded.keys == store.keys and loaded.groups == store.groups
+        np.testing.assert_array_equal(loaded.get_session_labels('uuid2'), store.get_session_labels('uuid2'))
@@ -0,0 +1,110 @@
+import os
+import json
+import datetime
+import shutil
+import pandas as pd
+import ruamel.yaml as yaml
+from unittest import TestCase
+from moseq2_app.util import load_index, index_to_dataframe, get_index_cache_path, _index_cache, get_df_fingerprint
+
+
+class TestIndexLoader(TestCase):
+
+    def setUp(self):
+        self.out_dir = 'data/test_index_loader/'
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.index_path = os.path.join(self.out_dir, 'moseq2-index.yaml')
+        self.write_index('default', 1000)
+
+        # sidecars are written to the user's cache directory
+        self.cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.abspath(os.path.join(self.out_dir, 'cache'))
+
+    def tearDown(self):
+        if self.cache_home is None:
+            os.environ.pop('XDG_CACHE_HOME', None)
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache_home
+        _index_cache.clear()
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def write_index(self, group, mtime, metadata=None):
+        index = {'files': [{'uuid': 'uuid1', 'group': group, 'path': ['session/results_00.h5', 'session/results_00.yaml'],
+                            'metadata': metadata or {'SessionName': 'session', 'SubjectName': 'mouse'}}],
+                 'pca_path': 'pca.h5'}
+        with open(self.index_path, 'w') as f:
+            yaml.safe_dump(index, f)
+        os.utime(self.index_path, (mtime, mtime))
+
+    def test_load_index(self):
+
+        index_data = load_index(self.index_path)
+        assert index_data['files'][0]['group'] == 'default'
+
+        # the sidecar is a JSON file in the cache directory, nothing is written next to the index
+        cache_path = get_index_cache_path(self.index_path)
+        assert cache_path.startswith(os.environ['XDG_CACHE_HOME'])
+        assert sorted(os.listdir(self.out_dir)) == ['cache', 'moseq2-index.yaml']
+        with open(cache_path, 'r') as f:
+            assert json.load(f)['index']['files'][0]['group'] == 'default'
+
+        # returned dicts are copies of the cached one
+        index_data['files'][0]['group'] = 'changed'
+        assert load_index(self.index_path)['files'][0]['group'] == 'default'
+
+        # the sidecar is reused in a new process, and invalidated once the index is modified
+        _index_cache.clear()
+        assert load_index(self.index_path)['files'][0]['group'] == 'default'
+
+        self.write_index('treatment', 2000)
+        index_data, df = index_to_dataframe(self.index_path)
+        assert index_data['files'][0]['group'] == 'treatment'
+        assert list(df['group']) == ['treatment']
+        assert list(df['filename']) == ['results_00.h5']
+
+    def test_load_index_sidecar(self):
+
+        load_index(self.index_path)
+        cache_path = get_index_cache_path(self.index_path)
+
+        # touching the index without changing its contents reuses the sidecar, matched by its digest
+        _index_cache.clear()
+        os.utime(self.index_path, (3000, 3000))
+        with open(cache_path, 'r') as f:
+            sidecar = json.load(f)
+        sidecar['index']['pca_path'] = 'from_sidecar.h5'
+        with open(cache_path, 'w') as f:
+            json.dump(sidecar, f)
+        assert load_index(self.index_path)['pca_path'] == 'from_sidecar.h5'
+
+        # unreadable sidecars are ignored
+        _index_cache.clear()
+        with open(cache_path, 'w') as f:
+            f.write('not json')
+        assert load_index(self.index_path)['pca_path'] == 'pca.h5'
+
+        # contents that JSON cannot hold are only cached in memory
+        _index_cache.clear()
+        os.remove(cache_path)
+        self.write_index('default', 4000, metadata={'SessionName': 'session', 'SubjectName': 'mouse',
+                                                    'StartDate': datetime.date(2020, 1, 1)})
+        assert load_index(self.index_path)['files'][0]['metadata']['StartDate'] == datetime.date(2020, 1, 1)
+        assert not os.path.exists(cache_path)
+
+
+class TestDfFingerprint(TestCase):
+
+    def test_get_df_fingerprint(self):
+
+        df = pd.DataFrame({'group': ['a', 'b'], 'usage': [0.1, 0.2], 'label': ['x', 'y']})
+        fingerprint = get_df_fingerprint(df)
+        assert fingerprint == get_df_fingerprint(df.copy())
+
+        # changing a value or a column name changes the fingerprint
+        assert get_df_fingerprint(df.assign(usage=[0.1, 0.3])) != fingerprint
+        assert get_df_fingerprint(df.rename(columns={'usage': 'duration'})) != fingerprint
+
+        # columns left out of the fingerprint are ignored
+        columns = ['group', 'usage']
+        assert get_df_fingerprint(df.assign(label=['z', 'z']), columns=columns) == \
+            get_df_fingerprint(df, columns=columns)
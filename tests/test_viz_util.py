@@ -0,0 +1,104 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from moseq2_app.viz.util import (compute_position_heatmaps, save_position_heatmaps, load_position_heatmaps,
+                                 get_mean_position_heatmap, SyllableInfoTable, get_preview_path,
+                                 get_crowd_movie_previews)
+
+
+class TestPositionHeatmaps(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 2000
+        uuids = rng.choice(['uuid1', 'uuid2', 'uuid3'], n)
+        self.scalar_df = pd.DataFrame({'uuid': uuids,
+                                       'group': np.where(uuids == 'uuid3', 'b', 'a'),
+                                       'SessionName': uuids,
+                                       'SubjectName': 'mouse',
+                                       'labels (usage sort)': rng.integers(-5, 4, n),
+                                       'centroid_x_mm': rng.normal(0, 10, n),
+                                       'centroid_y_mm': rng.normal(0, 5, n)})
+        self.out_dir = 'data/test_position_heatmaps/'
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_compute_position_heatmaps(self):
+
+        heatmaps = compute_position_heatmaps(self.scalar_df, 3, bins=10)
+        assert heatmaps['pdfs'].shape == (3, 3, 10, 10)
+
+        # each (syllable, session) heatmap matches its own 2D histogram
+        k = list(heatmaps['sessions']['uuid']).index('uuid2')
+        frames = self.scalar_df[(self.scalar_df['uuid'] == 'uuid2') & (self.scalar_df['labels (usage sort)'] == 1)]
+        expected, _, _ = np.histogram2d(frames['centroid_x_mm'], frames['centroid_y_mm'],
+                                        bins=[heatmaps['xedges'], heatmaps['yedges']], density=True)
+        np.testing.assert_allclose(heatmaps['pdfs'][1, k], expected, rtol=1e-5)
+        assert heatmaps['counts'][1, k] == len(frames)
+
+        mask = (heatmaps['sessions']['group'] == 'a').to_numpy()
+        assert get_mean_position_heatmap(heatmaps, 1, mask).shape == (10, 10)
+
+    def test_save_position_heatmaps(self):
+
+        path = os.path.join(self.out_dir, 'model_position_heatmaps.npz')
+        heatmaps = compute_position_heatmaps(self.scalar_df, 3, bins=10)
+        save_position_heatmaps(path, heatmaps, 'fingerprint')
+
+        loaded = load_position_heatmaps(path, 'fingerprint', 3, bins=10)
+        np.testing.assert_array_equal(loaded['pdfs'], heatmaps['pdfs'])
+        assert loaded['sessions'].equals(heatmaps['sessions'])
+
+        # heatmaps computed from other data or with other parameters are not reused
+        assert load_position_heatmaps(path, 'other', 3, bins=10) is None
+        assert load_position_heatmaps(path, 'fingerprint', 3, bins=20) is None
+
+
+class TestSyllableInfoTable(TestCase):
+
+    def test_get_syllable_info(self):
+
+        df = pd.DataFrame({'group': ['a', 'a', 'b', 'a'],
+                           'SessionName': ['s1', 's2', 's3', 's1'],
+                           'syllable': [0, 0, 0, 1],
+                           'usage': [0.2, 0.4, 0.1, 0.5],
+                           'duration': [1., 2., 3., 4.]})
+
+        table = SyllableInfoTable(df, 'group', max_syllable=2)
+
+        info = table.get_syllable_info(0, ['a', 'b'])
+        assert list(info.columns) == ['a', 'b']
+        assert np.isclose(info.loc['usage', 'a'], 0.3)
+        assert info.loc['duration (s)', 'b'] == 3
+
+        # groupings not expressing the syllable get NaN statistics
+        info = table.get_syllable_info(1, ['a', 'b'])
+        assert np.isnan(info.loc['usage', 'b'])
+        assert table.get_syllable_info(5, ['a']).shape == (2, 1)
+
+
+class TestCrowdMoviePreviews(TestCase):
+
+    def setUp(self):
+        self.out_dir = 'data/test_crowd_movie_previews/'
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_get_crowd_movie_previews(self):
+
+        movie_path = os.path.join(self.out_dir, 'syllable_sorted-id-0 (usage)_original-id-3.mp4')
+        assert get_preview_path(movie_path) == os.path.join(self.out_dir, 'previews', os.path.basename(movie_path))
+
+        # movies that cannot be read fall back to the full quality movie, missing movies are returned unchanged
+        with open(movie_path, 'wb') as f:
+            f.write(b'not a movie')
+        with self.assertWarns(UserWarning):
+            previews = get_crowd_movie_previews([movie_path, '', 'missing.mp4'], n_jobs=1)
+        assert previews == [movie_path, '', 'missing.mp4']
+        assert not os.path.exists(get_preview_path(movie_path) + '.tmp')
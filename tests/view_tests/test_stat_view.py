@@ -1,7 +1,13 @@
 import numpy as np
-from unittest import TestCase
+import pandas as pd
+from unittest import TestCase, mock
 from bokeh.plotting import figure
-from moseq2_app.stat.view import colorscale, format_graphs, get_difference_legend_items
+from moseq2_viz.info.util import transition_entropy
+from moseq2_app.stat.transitions import TransitionGraphModel, get_session_transition_counts, \
+    compute_group_transition_entropies
+from moseq2_app.stat.view import colorscale, format_graphs, get_difference_legend_items, get_bootstrap_cis, \
+    compute_syllable_aggregates, get_aux_stat_dfs, get_ci_vect_batched, add_bootstrap_cis, \
+    plot_transition_graph_model_client_side
 
 class TestStatView(TestCase):
 
@@ -40,6 +46,193 @@ class TestStatView(TestCase):
         assert len(diff_main_items) == 4
         assert len(diff_width_items) == 4
 
+    def test_get_bootstrap_cis(self):
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'group': np.repeat(['a', 'b'], 30),
+            'syllable': np.tile(np.repeat([0, 1, 2], 10), 2),
+            'usage': rng.random(60),
+            'duration': rng.random(60),
+        })
+        df.loc[3, 'duration'] = np.nan
+
+        cis = get_bootstrap_cis(df, stats=['usage', 'duration'], n_boots=1000)
+        assert set(cis) == {'a', 'b'}
+
+        means = df.groupby(['group', 'syllable']).mean()
+        for g in ('a', 'b'):
+            for s in ('usage', 'duration'):
+                assert list(cis[g][s].index) == [0, 1, 2]
+                for syll, (lo, hi) in cis[g][s].items():
+                    assert lo <= means.loc[(g, syll), s] <= hi
+
+        # the same seed yields the same intervals
+        cis2 = get_bootstrap_cis(df, stats=['usage', 'duration'], n_boots=1000)
+        assert all(np.allclose(x, y) for x, y in zip(cis['a']['usage'], cis2['a']['usage']))
+
+    def test_get_ci_vect_batched_chunks(self):
+
+        rng = np.random.default_rng(0)
+        cells = np.repeat(np.arange(40), np.tile([5, 8], 20))
+        values = rng.random((len(cells), 3))
+
+        cell_ids, percentile = get_ci_vect_batched(values, cells, n_boots=2000)
+        assert percentile.shape == (40, 3, 2)
+
+        # chunking rows and bootstraps bounds the intermediate arrays without changing the intervals' coverage
+        chunked_ids, chunked = get_ci_vect_batched(values, cells, n_boots=2000, chunk_size=5000)
+        np.testing.assert_array_equal(cell_ids, chunked_ids)
+        np.testing.assert_allclose(chunked, percentile, atol=0.1)
+
+        means = pd.DataFrame(values).groupby(cells).mean().to_numpy()
+        assert np.all((chunked[..., 0] <= means) & (means <= chunked[..., 1]))
+
+        # cells are resampled identically whichever chunk of cells they are processed in
+        _, small_chunks = get_ci_vect_batched(values, cells, n_boots=2000, chunk_size=18000)
+        np.testing.assert_allclose(small_chunks, get_ci_vect_batched(values, cells, n_boots=2000,
+                                                                     chunk_size=36000)[1])
+
+    def test_compute_syllable_aggregates(self):
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'group': np.repeat(['a', 'b'], 30),
+            'syllable': np.tile(np.repeat([0, 1, 2], 10), 2),
+            'usage': rng.random(60),
+            'duration': rng.random(60),
+        })
+        sorting = [2, 0, 1]
+
+        for errorbar in ('SEM', 'STD', 'CI 95%'):
+            aggregates = compute_syllable_aggregates(df, 'group', errorbar, stats=['usage', 'duration'])
+            assert set(aggregates) == {'a', 'b'}
+
+            for g in ('a', 'b'):
+                aux_df, stat_err, aux_err, errs_x, errs_y = get_aux_stat_dfs(df, g, sorting, 'group', errorbar,
+                                                                             'usage', aggregates=aggregates)
+                df_group = df[df.group == g]
+                expected = df_group.groupby('syllable', as_index=False)[['usage']].mean().reindex(sorting)
+                np.testing.assert_allclose(aux_df['usage'], expected['usage'])
+                assert len(errs_x) == len(errs_y) == len(sorting)
+
+                if errorbar == 'SEM':
+                    np.testing.assert_allclose(stat_err['usage'],
+                                               df_group.groupby('syllable')['usage'].sem().reindex(sorting))
+
+    def test_add_bootstrap_cis(self):
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'group': np.repeat(['a', 'b'], 30),
+            'syllable': np.tile(np.repeat([0, 1, 2], 10), 2),
+            'usage': rng.random(60),
+            'duration': rng.random(60),
+        })
+
+        # intervals are only computed for the selected statistic
+        aggregates = compute_syllable_aggregates(df, 'group', 'CI 95%', stats=['usage'])
+        assert all(set(agg['err']) == {'usage'} for agg in aggregates.values())
+
+        _, _, aux_err, _, _ = get_aux_stat_dfs(df, 'a', [0, 1, 2], 'group', 'CI 95%', 'usage', aggregates=aggregates)
+        assert np.isnan(aux_err['duration'].iloc[0][0])
+
+        # selecting another statistic adds its intervals and keeps the computed ones
+        usage_cis = aggregates['a']['err']['usage']
+        add_bootstrap_cis(aggregates, df, 'group', stats=['duration'])
+        assert all(set(agg['err']) == {'usage', 'duration'} for agg in aggregates.values())
+        assert aggregates['a']['err']['usage'] is usage_cis
+
+        expected = compute_syllable_aggregates(df, 'group', 'CI 95%', stats=['duration'])
+        for g in ('a', 'b'):
+            np.testing.assert_allclose(np.stack(aggregates[g]['err']['duration']),
+                                       np.stack(expected[g]['err']['duration']))
+
+    def test_transition_graph_model(self):
+
+        trans_mats = [np.array([[0, .5, .1], [.3, 0, .02], [.2, .4, 0]]),
+                      np.array([[0, .2, .3], [.1, 0, .6], [.5, .1, 0]])]
+        usages = np.array([[.5, .3, .2], [.2, .2, .6]])
+
+        model = TransitionGraphModel(trans_mats, usages, ['a', 'b'])
+        assert model.graph_names == ['a', 'b', 'b - a']
+        np.testing.assert_allclose(model.get_weights(2), trans_mats[1] - trans_mats[0])
+
+        # thresholds are applied to the anchor group
+        node_mask, edge_mask = model.get_masks((0.05, 1), (0.25, 1))
+        assert list(node_mask) == [True, True, False]
+        assert edge_mask.sum() == 2
+
+        node_data = model.get_node_data(0, node_mask, edge_mask)
+        assert node_data['index'] == [0, 1]
+        assert node_data['next'] == [[1], [0]]
+
+        edge_data = model.get_edge_data(2, edge_mask)
+        assert edge_data['start'] == [0, 1]
+        assert edge_data['edge_color'] == ['red', 'red']
+        assert edge_data['line_color'] == ['green', 'green']
+
+        graph = model.get_anchor_graph(node_mask, edge_mask)
+        assert set(graph.nodes) == {0, 1}
+        assert graph.number_of_edges() == 2
+
+        # sparse storage and a subset of reversed difference pairs
+        sparse_model = TransitionGraphModel(trans_mats, usages, ['a', 'b'], pairs=[(1, 0)], sparse=True)
+        assert sparse_model.graph_names == ['a', 'b', 'a - b']
+        assert len(sparse_model.difference_cache) == 0
+        sparse_edges = sparse_model.get_edge_data(2, edge_mask)
+        np.testing.assert_allclose(sparse_edges['weight'], -np.array(edge_data['weight']))
+        assert sparse_model.get_node_data(2, node_mask, edge_mask)['next'] == [[1], [0]]
+
+    def test_compute_group_transition_entropies(self):
+
+        labels = [np.array([-5, -5, 0, 0, 1, 1, 2, 0, 1, 3, 1, 0, 2]),
+                  np.array([-5, 1, 0, 0, 2, 2, 1, 0])]
+
+        counts, usages = get_session_transition_counts(labels, 3)
+        assert counts.shape == (2, 3, 3)
+        # repeated labels are collapsed, transitions to syllables >= max_sylls are dropped
+        np.testing.assert_array_equal(counts[0], [[0, 2, 1], [1, 0, 1], [1, 0, 0]])
+        np.testing.assert_array_equal(counts[1], [[0, 0, 1], [2, 0, 0], [0, 1, 0]])
+        np.testing.assert_array_equal(usages, [[3, 3, 2], [2, 2, 1]])
+
+        incoming, outgoing = compute_group_transition_entropies(labels, ['a', 'b'], ['a', 'b'], 3,
+                                                                cache_key=('model.p', 0))
+        assert len(incoming) == len(outgoing) == 2
+        # deterministic transitions have no entropy
+        np.testing.assert_allclose(incoming[1], 0, atol=1e-12)
+        np.testing.assert_allclose(outgoing[1], 0, atol=1e-12)
+        assert incoming[0][0] > 0 and outgoing[0][0] > 0
+
+        cached_in, _ = compute_group_transition_entropies([], ['a', 'b'], ['a', 'b'], 3, cache_key=('model.p', 0))
+        np.testing.assert_allclose(cached_in[0], incoming[0])
+
+        # regrouping the sessions updates the cached results
+        regrouped_in, regrouped_out = compute_group_transition_entropies([], ['a', 'a'], ['a', 'b'], 3,
+                                                                         cache_key=('model.p', 0))
+        np.testing.assert_allclose(regrouped_in[0], (incoming[0] + incoming[1]) / 2)
+        np.testing.assert_allclose(regrouped_out[0], (outgoing[0] + outgoing[1]) / 2)
+        assert np.all(np.isnan(regrouped_in[1]))
+
+    def test_compute_group_transition_entropies_matches_transition_entropy(self):
+
+        rng = np.random.default_rng(0)
+        labels = [np.concatenate([[-5, -5], np.repeat(rng.integers(0, 6, size=60), rng.integers(1, 4, size=60))])
+                  for _ in range(4)]
+        label_group = ['a', 'b', 'a', 'b']
+
+        incoming, outgoing = compute_group_transition_entropies(labels, label_group, ['a', 'b'], 5)
+
+        # entropies are computed on the given labels, so each node's entropy belongs to the same syllable in every group
+        for i, g in enumerate(['a', 'b']):
+            use_labels = [lbl for lbl, grp in zip(labels, label_group) if grp == g]
+            expected_in = np.mean(transition_entropy(use_labels, tm_smoothing=0, truncate_syllable=5,
+                                                     transition_type='incoming', relabel_by=None), axis=0)
+            expected_out = np.mean(transition_entropy(use_labels, tm_smoothing=0, truncate_syllable=5,
+                                                      transition_type='outgoing', relabel_by=None), axis=0)
+            np.testing.assert_allclose(incoming[i], expected_in)
+            np.testing.assert_allclose(outgoing[i], expected_out)
+
     def test_bokeh_plotting(self):
         pass
 
@@ -50,4 +243,34 @@ class TestStatView(TestCase):
         pass
 
     def test_plot_interactive_transition_graph(self):
-        pass
\ No newline at end of file
+        pass
+
+    def test_plot_transition_graph_model_client_side(self):
+
+        trans_mats = [np.array([[0, .5, .1], [.3, 0, .02], [.2, .4, 0]]),
+                      np.array([[0, .2, .3], [.1, 0, .6], [.5, .1, 0]])]
+        usages = np.array([[.5, .3, .2], [.2, .2, .6]])
+        model = TransitionGraphModel(trans_mats, usages, ['a', 'b'])
+        pos = {0: (0, 1), 1: (1, 0), 2: (-1, 0)}
+
+        with mock.patch('moseq2_app.stat.view.show'):
+            layout = plot_transition_graph_model_client_side(model, pos, (0.05, 1), (0.25, 1))
+
+        edge_slider, usage_slider = layout.children[:2]
+        callback = edge_slider.js_property_callbacks['change:value'][0]
+        assert callback is usage_slider.js_property_callbacks['change:value'][0]
+        args = callback.args
+
+        # every node and non-zero transition is shipped, the initial sources are thresholded
+        assert all(nodes['index'] == [0, 1, 2] for nodes in args['full_nodes'])
+        assert all(len(edges['start']) == 6 for edges in args['full_edges'])
+        assert args['full_nodes'][0]['anchor_usage'] == usages[0].tolist()
+        assert [s.data['index'] for s in args['node_sources']] == [[0, 1]] * 3
+        assert [len(s.data['start']) for s in args['edge_sources']] == [2] * 3
+
+        # the legends are updated along with the sources
+        assert len(args['info_legends']) == 3
+        assert args['is_difference'] == [False, False, True]
+        assert [len(legend.items) for legend in args['info_legends']] == [2, 2, 4]
+        assert args['info_legends'][0].items[1].label['value'] == 'Max P(transition): {:.4f}'.format(.5 * 250 / 200)
+        assert 'info_legends[k].items' in callback.code